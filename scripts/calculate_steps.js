@@ -54,6 +54,11 @@ async function calculateSteps() {
 
     console.log(`Updated ${updatedCount} entries with step counts.`);
 
+    if (updatedCount === 0) {
+        console.log('index.json unchanged.');
+        return;
+    }
+
     fs.writeFileSync(INDEX_FILE, JSON.stringify(indexData, null, 4));
     console.log('index.json updated successfully.');
 }
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""Benchmarks for the ORD parse / map / search / index hot paths.
+
+Synthetic Dataset files are built straight on the wire from the reactions
+in the checked-in ord_dataset-01dbb772....pb.gz: its reactions are
+repeated cyclically, each copy with a fresh reaction_id appended (for a
+singular protobuf field the last occurrence wins), so synthetic shards
+have real chemistry at any size without needing ord_schema to build them.
+The checked-in shard itself is benchmarked as the "real" size. Everything
+runs offline.
+
+Each stage runs in its own fresh process so its peak RSS can be measured:
+
+  read_bytes       ord_reader.iter_reaction_bytes (wire walk only)
+  extract          fetch_real_ord_data.extract_reactions (parse + map)
+  map_schema       fetch_ord.map_ord_to_app_schema on dict reactions
+  search           search_ord_prostaglandin.search_dataset
+  index_rewrite    IndexStore upsert of every entry, save, then a
+                   one-entry change and save again
+
+Stages whose dependencies are missing (ord_schema for extract/search) are
+reported as skipped. Each stage runs --repeat times and the fastest run
+is kept, which takes most of the scheduling noise out. With --baseline,
+per-reaction time and peak RSS are compared against a stored baseline
+and the run fails if any stage got slower or bigger than the thresholds
+allow.
+
+Usage:
+    python bench_ord.py [--sizes 1000,10000,100000] [--stages extract,search]
+    python bench_ord.py --save-baseline bench_baseline.json
+    python bench_ord.py --baseline bench_baseline.json [--max-slowdown 1.25]
+"""
+
+import os
+import io
+import sys
+import gzip
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import platform
+import resource
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from ord_reader import iter_reaction_bytes, DATASET_REACTIONS_FIELD, WIRE_LENGTH_DELIMITED
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE = os.path.join(SCRIPT_DIR, "ord_dataset-01dbb772c5e249108f0b191ed17a2c0c.pb.gz")
+REACTION_ID_FIELD = 10
+STAGES = ['read_bytes', 'extract', 'map_schema', 'search', 'index_rewrite']
+DEFAULT_SIZES = [1000, 10000]
+MAX_SIZE = 1000000
+DEFAULT_REPEAT = 3
+DEFAULT_MAX_SLOWDOWN = 1.25
+DEFAULT_MAX_RSS_GROWTH = 1.25
+# Fastest gzip level: building the input isn't what's being measured
+SYNTHETIC_COMPRESSLEVEL = 1
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        b = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+
+def _length_delimited(field_number, payload):
+    return _varint((field_number << 3) | WIRE_LENGTH_DELIMITED) + _varint(len(payload)) + payload
+
+
+def write_synthetic_dataset(path, size, fixture=FIXTURE):
+    """Write a Dataset with `size` reactions cycled from `fixture`, each with a unique reaction_id."""
+    templates = list(iter_reaction_bytes(fixture))
+    with gzip.open(path, 'wb', compresslevel=SYNTHETIC_COMPRESSLEVEL) as out:
+        for i in range(size):
+            reaction_id = f"ord-bench{i:08d}".encode('ascii')
+            reaction = templates[i % len(templates)] + _length_delimited(REACTION_ID_FIELD, reaction_id)
+            out.write(_length_delimited(DATASET_REACTIONS_FIELD, reaction))
+    return path
+
+
+def synthetic_dict_reactions(size):
+    """Reactions in the JSON-ish shape fetch_ord.map_ord_to_app_schema reads."""
+    for i in range(size):
+        yield {
+            "identifiers": [{"type": "NAME", "value": f"Benchmark Molecule {i}"}],
+            "inputs": {
+                "input1": {"components": [{"identifiers": [{"type": "SMILES", "value": "C1=CC=C(C=C1)O"}]}]},
+            },
+            "outcomes": [{"products": [{"identifiers": [{"type": "SMILES", "value": "COC1=CC=CC=C1O"}]}]}],
+        }
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+# -- stages (each runs in a fresh child process) -------------------------
+
+def _stage_read_bytes(path, size):
+    count = 0
+    for _ in iter_reaction_bytes(path):
+        count += 1
+    return count
+
+
+def _stage_extract(path, size):
+    from fetch_real_ord_data import extract_reactions
+    return len(extract_reactions(limit=size, path=path))
+
+
+def _stage_map_schema(path, size):
+    from fetch_ord import map_ord_to_app_schema
+    count = 0
+    for i, reaction in enumerate(synthetic_dict_reactions(size), start=1):
+        map_ord_to_app_schema(reaction, i)
+        count += 1
+    return count
+
+
+def _stage_search(path, size):
+    from search_ord_prostaglandin import search_dataset
+    search_dataset(path)
+    return size
+
+
+def _stage_index_rewrite(path, size):
+    from index_store import IndexStore
+    work_dir = tempfile.mkdtemp(prefix='bench-index-')
+    try:
+        store = IndexStore(os.path.join(work_dir, 'index.json'), os.path.join(work_dir, 'manifest.json'))
+        for i in range(size):
+            store.upsert({
+                "id": f"bench-{i}", "molecule_name": f"Benchmark Molecule {i}", "class": "Benchmark",
+                "author": "ORD", "year": 2024, "path": f"/data/bench/bench-{i}.json", "step_count": 1,
+            })
+        store.save()
+        store.upsert(dict(store.entries["bench-0"], step_count=2))
+        store.save()
+        return size
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+STAGE_FUNCTIONS = {
+    'read_bytes': _stage_read_bytes,
+    'extract': _stage_extract,
+    'map_schema': _stage_map_schema,
+    'search': _stage_search,
+    'index_rewrite': _stage_index_rewrite,
+}
+
+
+def _run_in_child(stage, path, size):
+    function = STAGE_FUNCTIONS[stage]
+    # Stage functions print progress; keep it out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        try:
+            items = function(path, size)
+        except ImportError as e:
+            return {"skipped": f"missing dependency: {e.name or e}"}
+        seconds = time.perf_counter() - start
+    return {"seconds": seconds, "items": items, "peak_rss": peak_rss_bytes()}
+
+
+def run_stage(stage, path, size, repeat=1):
+    """Run a stage `repeat` times, each in a fresh process, and keep the fastest run."""
+    # spawn, not fork: a forked child would inherit this process's peak RSS
+    context = multiprocessing.get_context('spawn')
+    result = None
+    for _ in range(max(repeat, 1)):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            run = pool.submit(_run_in_child, stage, path, size).result()
+        if 'skipped' in run:
+            return run
+        if result is None or run['seconds'] < result['seconds']:
+            result = run
+    result['per_second'] = result['items'] / result['seconds'] if result['seconds'] else float('inf')
+    return result
+
+
+# -- reporting -------------------------------------------------------------
+
+def run_benchmarks(sizes, stages, work_dir, repeat=1):
+    results = {}
+    datasets = [('real', FIXTURE, None)]
+    for size in sizes:
+        datasets.append((str(size), os.path.join(work_dir, f"bench-{size}.pb.gz"), size))
+
+    for label, path, size in datasets:
+        if size is not None and not os.path.exists(path):
+            start = time.perf_counter()
+            write_synthetic_dataset(path, size)
+            print(f"Built {size} synthetic reactions in {time.perf_counter() - start:.1f}s "
+                  f"({os.path.getsize(path)} bytes)")
+        if size is None:
+            size = sum(1 for _ in iter_reaction_bytes(path))
+        for stage in stages:
+            result = run_stage(stage, path, size, repeat)
+            results.setdefault(label, {})[stage] = result
+            if 'skipped' in result:
+                print(f"  {label:>8} {stage:<14} skipped ({result['skipped']})")
+            else:
+                print(f"  {label:>8} {stage:<14} {result['seconds']:9.3f}s {result['per_second']:12.0f}/s "
+                      f"{result['peak_rss'] / 2**20:9.1f} MiB peak")
+    return results
+
+
+def compare(results, baseline, max_slowdown, max_rss_growth):
+    """Return a list of regression messages (empty if none)."""
+    regressions = []
+    for label, stages in results.items():
+        for stage, result in stages.items():
+            base = baseline.get('results', {}).get(label, {}).get(stage)
+            if not base or 'seconds' not in base or 'seconds' not in result:
+                continue
+            # Per-item time, so a baseline taken at one size still means something
+            now = result['seconds'] / max(result['items'], 1)
+            then = base['seconds'] / max(base['items'], 1)
+            if then and now / then > max_slowdown:
+                regressions.append(f"{label}/{stage}: {now / then:.2f}x slower per reaction "
+                                   f"(limit {max_slowdown:.2f}x)")
+            if base['peak_rss'] and result['peak_rss'] / base['peak_rss'] > max_rss_growth:
+                regressions.append(f"{label}/{stage}: peak RSS {result['peak_rss'] / base['peak_rss']:.2f}x "
+                                   f"baseline (limit {max_rss_growth:.2f}x)")
+    return regressions
+
+
+def parse_sizes(text):
+    sizes = [int(s) for s in text.split(',') if s.strip()]
+    for size in sizes:
+        if not 1 <= size <= MAX_SIZE:
+            raise argparse.ArgumentTypeError(f"sizes must be between 1 and {MAX_SIZE}")
+    return sizes
+
+
+def parse_stages(text):
+    stages = [s.strip() for s in text.split(',') if s.strip()]
+    unknown = [s for s in stages if s not in STAGE_FUNCTIONS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown stages: {', '.join(unknown)} (choose from {', '.join(STAGES)})")
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ORD parse/map/search/index stages.")
+    parser.add_argument("--sizes", type=parse_sizes, default=DEFAULT_SIZES,
+                        help=f"Comma-separated synthetic dataset sizes (up to {MAX_SIZE})")
+    parser.add_argument("--stages", type=parse_stages, default=STAGES, help="Comma-separated stages to run")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help="Runs per stage; the fastest is reported")
+    parser.add_argument("--work-dir", help="Keep synthetic datasets here (default: a temp dir)")
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--baseline", help="Compare against this baseline JSON")
+    parser.add_argument("--save-baseline", help="Write results as a new baseline JSON")
+    parser.add_argument("--max-slowdown", type=float, default=DEFAULT_MAX_SLOWDOWN,
+                        help="Allowed per-reaction time ratio against the baseline")
+    parser.add_argument("--max-rss-growth", type=float, default=DEFAULT_MAX_RSS_GROWTH,
+                        help="Allowed peak RSS ratio against the baseline")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='bench-ord-')
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        results = run_benchmarks(args.sizes, args.stages, work_dir, args.repeat)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    for target in (args.output, args.save_baseline):
+        if target:
+            with open(target, 'w') as f:
+                json.dump(report, f, indent=4)
+            print(f"Wrote {target}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.max_slowdown, args.max_rss_growth)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            raise SystemExit(1)
+        print("No regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Pack every synthesis file into a few precompressed pack files.
+
+Each synthesis is compressed as its own gzip member and the members are
+concatenated into packs of roughly --pack-size bytes. packs/manifest.json
+records, for every synthesis path in index.json, which pack it lives in,
+the byte offset/length of its member and the sha256 of the file it was
+packed from. A client can then either
+
+  - fetch one route with an HTTP Range request and gunzip just that slice, or
+  - fetch a whole pack in one request (e.g. to cache the library offline)
+    and slice members out of it locally. The app does this through its
+    service worker (see vite.config.js), which then answers the range
+    requests from the cached pack.
+
+The per-file layout under public/data/ is left untouched as a fallback.
+When a synthesis file changes afterwards, the importers (IndexStore.save),
+ord_matcher.py and watch_data.py drop its entry from the manifest, so the
+client fetches the file itself instead of an outdated packed copy.
+Packs use a .pack extension so static servers don't add a
+Content-Encoding header (which would break byte ranges).
+
+Usage:
+    python build_bundles.py [--pack-size BYTES]
+"""
+
+import os
+import json
+import gzip
+import hashlib
+import argparse
+
+from index_store import DATA_DIR, INDEX_FILE, atomic_write_bytes, public_path, sha256_bytes
+
+PACKS_DIR = os.path.join(DATA_DIR, 'packs')
+PACKS_URL = '/data/packs'
+MANIFEST_VERSION = 2
+DEFAULT_PACK_SIZE = 4 * 1024 * 1024
+
+
+def build_bundles(pack_size=DEFAULT_PACK_SIZE, index_file=INDEX_FILE, packs_dir=PACKS_DIR):
+    """Write packs and their manifest. Returns the manifest dict."""
+    with open(index_file, 'r') as f:
+        index = json.load(f)
+
+    packs = []
+    entries = {}
+    current = bytearray()
+
+    def flush():
+        if not current:
+            return
+        data = bytes(current)
+        digest = hashlib.sha256(data).hexdigest()
+        # Named by content, so the service worker's cached copy of a pack
+        # is never mistaken for a rebuilt one
+        name = f"pack-{len(packs):03d}-{digest[:12]}.pack"
+        atomic_write_bytes(os.path.join(packs_dir, name), data)
+        packs.append({
+            "url": f"{PACKS_URL}/{name}",
+            "size": len(data),
+            "sha256": digest,
+        })
+        current.clear()
+
+    # Sorted so identical inputs always produce byte-identical packs
+    for relative_path in sorted({e['path'] for e in index if e.get('path')}):
+        path = public_path(relative_path)
+        if not os.path.exists(path):
+            print(f"Skipping missing file: {relative_path}")
+            continue
+        with open(path, 'rb') as f:
+            raw = f.read()
+        # mtime=0 keeps the gzip header (and so the pack) deterministic
+        member = gzip.compress(raw, compresslevel=9, mtime=0)
+        if current and len(current) + len(member) > pack_size:
+            flush()
+        entries[relative_path] = {
+            "pack": len(packs),
+            "offset": len(current),
+            "length": len(member),
+            "sha256": sha256_bytes(raw),
+        }
+        current.extend(member)
+    flush()
+
+    manifest = {"version": MANIFEST_VERSION, "packs": packs, "entries": entries}
+    atomic_write_bytes(os.path.join(packs_dir, 'manifest.json'), json.dumps(manifest, indent=4).encode('utf-8'))
+
+    # Drop packs left over from a previous, larger build
+    current_names = {p['url'].rsplit('/', 1)[1] for p in packs}
+    for name in os.listdir(packs_dir):
+        if name.endswith('.pack') and name not in current_names:
+            os.remove(os.path.join(packs_dir, name))
+
+    total = sum(p['size'] for p in packs)
+    print(f"Packed {len(entries)} syntheses into {len(packs)} packs ({total} bytes compressed)")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build precompressed synthesis packs for offline use.")
+    parser.add_argument("--pack-size", type=int, default=DEFAULT_PACK_SIZE,
+                        help="Target compressed size of each pack in bytes")
+    args = parser.parse_args()
+    build_bundles(args.pack_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""Build the shared molecule table and, optionally, compact routes.
+
+The same molecules appear all over the library: each step's product_smiles
+is usually the next step's reactant_smiles, and common reagents and
+intermediates recur across routes. This pass gives each distinct `*_smiles`
+field value of every step an id, and groups the ids by canonical form
+(RDKit when installed, smiles_utils.normalize_smiles otherwise, memoized
+with an LRU cache).
+
+  molecules/molecules.json  {id: SMILES as written} for the whole library,
+                            plus {id: canonical SMILES} under "canonical"
+                            for the ids whose text isn't already canonical;
+                            ids with the same canonical form are the same
+                            molecule spelled differently
+  molecules/manifest.json   where the table is and, with --compact, which
+                            compact route replaces which synthesis file
+
+Fragments of a multi-component field ("A.B") are canonicalized one by one
+and kept in order, since the viewer draws them left to right. Values RDKit
+can't parse keep their text; "" and "???" are not molecules and are left
+in place.
+
+Ids are the first ID_LENGTH hex digits of the SHA-256 of the text, so a
+molecule keeps its id across rebuilds no matter what else is added or
+removed, or whether RDKit is installed.
+
+With --compact, every synthesis is also written to molecules/routes/ with
+each `X_smiles` field replaced by an `X_mol` id. The client expands those
+against the table, so each molecule is downloaded, and drawn, once per
+spelling, and always as the author wrote it. The manifest records the sha256
+of the file each compact route was built from; when the file changes, the
+importers (IndexStore.save), ord_matcher.py and watch_data.py drop the
+route and the client falls back to the file itself.
+The per-file layout under public/data/ is left untouched as a fallback.
+
+Usage:
+    python build_molecule_table.py [--compact]
+"""
+
+import os
+import json
+import hashlib
+import argparse
+
+from index_store import DATA_DIR, INDEX_FILE, atomic_write_bytes, public_path, sha256_bytes
+from smiles_utils import normalize_smiles, cached_canonical_smiles, canonical_method
+
+MOLECULES_DIR = os.path.join(DATA_DIR, 'molecules')
+MOLECULES_URL = '/data/molecules'
+TABLE_VERSION = 3
+ID_LENGTH = 16
+SMILES_SUFFIX = '_smiles'
+MOLECULE_SUFFIX = '_mol'
+# Field values that are not molecules
+PLACEHOLDER_SMILES = {'', '???'}
+
+
+def canonical_field(value):
+    """Canonical form of a SMILES field: every '.'-fragment canonicalized, order kept."""
+    fragments = []
+    for fragment in value.split('.'):
+        if not fragment.strip():
+            continue
+        canonical = cached_canonical_smiles(fragment)
+        fragments.append(canonical if canonical is not None else normalize_smiles(fragment))
+    return '.'.join(fragments)
+
+
+def molecule_id(value):
+    return 'm' + hashlib.sha256(value.encode('utf-8')).hexdigest()[:ID_LENGTH]
+
+
+def is_molecule_field(key, value):
+    return key.endswith(SMILES_SUFFIX) and isinstance(value, str) and value.strip() not in PLACEHOLDER_SMILES
+
+
+class MoleculeTable:
+    def __init__(self):
+        self.molecules = {}   # id -> field value as written
+        self.canonical = {}   # id -> canonical SMILES
+        self.fields = 0
+
+    def intern(self, value):
+        """The id for a SMILES field value, adding it to the table if new."""
+        self.fields += 1
+        mol_id = molecule_id(value)
+        existing = self.molecules.get(mol_id)
+        if existing is None:
+            self.molecules[mol_id] = value
+            self.canonical[mol_id] = canonical_field(value)
+        elif existing != value:
+            raise ValueError(f"Molecule id collision: {existing!r} and {value!r} are both {mol_id}")
+        return mol_id
+
+
+def compact_route(synthesis, table):
+    """A copy of `synthesis` with X_smiles fields replaced by X_mol ids.
+
+    The table holds each field's text as written, so expanding the route
+    gives back the file's SMILES unchanged.
+    """
+    sequence = []
+    for step in synthesis.get('sequence') or ():
+        if not isinstance(step, dict):
+            sequence.append(step)
+            continue
+        compact_step = {}
+        for key, value in step.items():
+            if is_molecule_field(key, value):
+                compact_step[key[:-len(SMILES_SUFFIX)] + MOLECULE_SUFFIX] = table.intern(value)
+            else:
+                compact_step[key] = value
+        sequence.append(compact_step)
+    return dict(synthesis, sequence=sequence)
+
+
+def expand_route(compact, molecules):
+    """Inverse of compact_route, given the {id: SMILES} table."""
+    sequence = []
+    for step in compact.get('sequence') or ():
+        if not isinstance(step, dict):
+            sequence.append(step)
+            continue
+        sequence.append({
+            (key[:-len(MOLECULE_SUFFIX)] + SMILES_SUFFIX if key.endswith(MOLECULE_SUFFIX) else key):
+            (molecules[value] if key.endswith(MOLECULE_SUFFIX) else value)
+            for key, value in step.items()
+        })
+    return dict(compact, sequence=sequence)
+
+
+def _route_name(relative_path):
+    # /data/terpenes/x.json -> terpenes/x.json
+    return relative_path.lstrip('/').split('/', 1)[-1]
+
+
+def route_bytes(route):
+    return json.dumps(route, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def compact_route_path(relative_path, molecules_dir=MOLECULES_DIR):
+    return os.path.join(molecules_dir, 'routes', _route_name(relative_path))
+
+
+def compact_route_url(relative_path):
+    return f"{MOLECULES_URL}/routes/{_route_name(relative_path)}"
+
+
+def route_entry(relative_path, raw):
+    """Manifest entry for a compact route built from the file bytes `raw`."""
+    return {"url": compact_route_url(relative_path), "sha256": sha256_bytes(raw)}
+
+
+def write_table(molecules, canonical, routes, molecules_dir=MOLECULES_DIR):
+    """Write molecules.json and manifest.json. Returns (table bytes, manifest).
+
+    `molecules` is {id: SMILES as written} and `canonical` {id: canonical
+    SMILES} for (at least) the same ids.
+    """
+    table_data = json.dumps({
+        "version": TABLE_VERSION,
+        "method": canonical_method(),
+        "molecules": dict(sorted(molecules.items())),
+        "canonical": {mol_id: canonical[mol_id] for mol_id, value in sorted(molecules.items())
+                      if canonical[mol_id] != value},
+    }, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    atomic_write_bytes(os.path.join(molecules_dir, 'molecules.json'), table_data)
+
+    manifest = {
+        "version": TABLE_VERSION,
+        "method": canonical_method(),
+        "table": f"{MOLECULES_URL}/molecules.json",
+        "molecules": len(molecules),
+        "routes": routes,
+    }
+    atomic_write_bytes(os.path.join(molecules_dir, 'manifest.json'), json.dumps(manifest, indent=4).encode('utf-8'))
+    return table_data, manifest
+
+
+def build_molecule_table(compact=False, index_file=INDEX_FILE, molecules_dir=MOLECULES_DIR):
+    """Write the molecule table (and compact routes). Returns the manifest dict."""
+    with open(index_file, 'r') as f:
+        index = json.load(f)
+
+    table = MoleculeTable()
+    routes = {}
+    original_bytes = 0
+    compact_bytes = 0
+    written = set()
+    # Sorted so identical inputs always produce identical output
+    for relative_path in sorted({e['path'] for e in index if e.get('path')}):
+        path = public_path(relative_path)
+        if not os.path.exists(path):
+            print(f"Skipping missing file: {relative_path}")
+            continue
+        with open(path, 'rb') as f:
+            raw = f.read()
+        route = compact_route(json.loads(raw), table)
+        if not compact:
+            continue
+        path = compact_route_path(relative_path, molecules_dir)
+        data = route_bytes(route)
+        atomic_write_bytes(path, data)
+        written.add(path)
+        routes[relative_path] = route_entry(relative_path, raw)
+        original_bytes += len(raw)
+        compact_bytes += len(data)
+
+    table_data, manifest = write_table(table.molecules, table.canonical, routes, molecules_dir)
+
+    # Drop compact routes whose synthesis is gone (or all of them without --compact)
+    routes_dir = os.path.join(molecules_dir, 'routes')
+    for root, _, files in os.walk(routes_dir):
+        for name in files:
+            if os.path.join(root, name) not in written:
+                os.remove(os.path.join(root, name))
+
+    print(f"{table.fields} SMILES fields -> {len(table.molecules)} spellings of "
+          f"{len(set(table.canonical.values()))} molecules ({len(table_data)} bytes, "
+          f"{canonical_method()} canonical form)")
+    if compact:
+        print(f"Compact routes: {compact_bytes + len(table_data)} bytes including the table, "
+              f"down from {original_bytes}")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the shared molecule table for the client.")
+    parser.add_argument("--compact", action="store_true",
+                        help="Also write compact routes that reference molecule ids")
+    args = parser.parse_args()
+    build_molecule_table(args.compact)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""Build the compact, sharded search index the client searches with.
+
+The PRD's answer to search once the library passes ~500 files: instead of
+loading every synthesis, the client downloads a small inverted index.
+
+Indexed text is molecule_name, author and class from index.json plus the
+reaction_type and reagents of every step. Text is NFKD-normalized,
+lowercased and split into [a-z0-9] tokens (so "ZnCl₂" becomes "zncl2").
+Each token contributes
+
+  - every trigram ("taxol" -> tax, axo, xol), for substring queries, and
+  - its 1- and 2-character prefixes ("^t", "^ta"), for queries too short
+    to have a trigram.
+
+A posting list is the sorted list of document numbers containing a term,
+delta-encoded (first number, then gaps) as a JSON array. Terms are
+sharded by their first character into search/shard-<c>.json, so a query
+only fetches the shards its terms live in. search/docs.json maps document
+numbers to index.json ids; search/manifest.json lists the shards.
+
+Intersecting trigrams can over-match: "abcd" needs abc and bcd, which a
+document with "abcx" and "bcdy" also has. So each document's distinct
+tokens are written too, TOKEN_CHUNK documents per search/tokens-<n>.json
+(one space-separated string per document), and the client checks a query
+token longer than a trigram against the tokens of the candidates, fetching
+only the chunks they fall in.
+
+Regeneration is incremental: the terms of each document are cached in
+.search_index_cache.json and only recomputed when its index entry or
+synthesis file changed, and shard files are only rewritten when their
+bytes change.
+
+Usage:
+    python build_search_index.py
+"""
+
+import os
+import re
+import json
+import hashlib
+import unicodedata
+
+from index_store import DATA_DIR, INDEX_FILE, atomic_write_bytes, public_path
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SEARCH_DIR = os.path.join(DATA_DIR, 'search')
+SEARCH_URL = '/data/search'
+CACHE_FILE = os.path.join(SCRIPT_DIR, '.search_index_cache.json')
+# Bump when tokenizing or the file layout changes
+INDEX_VERSION = 2
+PREFIX_LENGTH = 2
+TOKEN_CHUNK = 512
+ENTRY_FIELDS = ('molecule_name', 'author', 'class')
+STEP_FIELDS = ('reaction_type', 'reagents')
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    decomposed = unicodedata.normalize('NFKD', text)
+    # Same accent range the client strips (DataManager.js searchTokens)
+    stripped = ''.join(c for c in decomposed if not '\u0300' <= c <= '\u036f')
+    return TOKEN_PATTERN.findall(stripped.lower())
+
+
+def token_terms(token):
+    terms = {'^' + token[:n] for n in range(1, min(PREFIX_LENGTH, len(token)) + 1)}
+    terms.update(token[i:i + 3] for i in range(len(token) - 2))
+    return terms
+
+
+def document_tokens(entry, synthesis):
+    texts = [entry.get(field) for field in ENTRY_FIELDS]
+    if synthesis:
+        for step in synthesis.get('sequence') or ():
+            if isinstance(step, dict):
+                texts.extend(step.get(field) for field in STEP_FIELDS)
+    tokens = set()
+    for text in texts:
+        if isinstance(text, str):
+            tokens.update(tokenize(text))
+    return tokens
+
+
+def document_terms(tokens):
+    terms = set()
+    for token in tokens:
+        terms.update(token_terms(token))
+    return terms
+
+
+def shard_key(term):
+    c = term.lstrip('^')[:1]
+    return c if c.isascii() and c.isalnum() else '_'
+
+
+def delta_encode(numbers):
+    previous = 0
+    gaps = []
+    for n in numbers:
+        gaps.append(n - previous)
+        previous = n
+    return gaps
+
+
+def _entry_fingerprint(entry):
+    """Changes whenever the entry or its synthesis file does."""
+    fingerprint = json.dumps([entry.get(f) for f in ENTRY_FIELDS + ('path',)])
+    relative_path = entry.get('path')
+    if relative_path:
+        try:
+            st = os.stat(public_path(relative_path))
+            fingerprint += f"|{st.st_size}|{st.st_mtime_ns}"
+        except OSError:
+            fingerprint += "|missing"
+    return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+
+
+def load_cache(cache_file=CACHE_FILE):
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'r') as f:
+                cache = json.load(f)
+            if cache.get('version') == INDEX_VERSION:
+                return cache
+        except (OSError, ValueError):
+            pass
+    return {"version": INDEX_VERSION, "docs": {}}
+
+
+def _write_if_changed(path, data):
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    atomic_write_bytes(path, data)
+    return True
+
+
+def _dump(data):
+    return json.dumps(data, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+
+def build_search_index(index_file=INDEX_FILE, search_dir=SEARCH_DIR, cache_file=CACHE_FILE,
+                       entries=None, cache=None):
+    """Regenerate the search index. Returns the manifest dict.
+
+    A long-running caller (watch_data.py) passes the index `entries` it
+    already holds and keeps `cache` in memory between calls.
+    """
+    if entries is None:
+        with open(index_file, 'r') as f:
+            entries = json.load(f)
+
+    if cache is None:
+        cache = load_cache(cache_file)
+    cached_docs = cache['docs']
+    docs = {}
+    recomputed = 0
+    for entry in entries:
+        fingerprint = _entry_fingerprint(entry)
+        cached = cached_docs.get(entry['id'])
+        if cached and cached['fingerprint'] == fingerprint:
+            docs[entry['id']] = cached
+            continue
+        synthesis = None
+        if entry.get('path') and os.path.exists(public_path(entry['path'])):
+            try:
+                with open(public_path(entry['path']), 'r', encoding='utf-8') as f:
+                    synthesis = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Error reading {entry['path']}: {e}")
+        tokens = document_tokens(entry, synthesis)
+        docs[entry['id']] = {"fingerprint": fingerprint, "tokens": sorted(tokens),
+                             "terms": sorted(document_terms(tokens))}
+        recomputed += 1
+
+    # Document numbers follow index.json order
+    doc_ids = [entry['id'] for entry in entries]
+    postings = {}
+    for number, doc_id in enumerate(doc_ids):
+        for term in docs[doc_id]['terms']:
+            postings.setdefault(term, []).append(number)
+
+    shards = {}
+    for term, numbers in postings.items():
+        shards.setdefault(shard_key(term), {})[term] = delta_encode(numbers)
+
+    written = 0
+    manifest_shards = {}
+    for key, terms in sorted(shards.items()):
+        name = f"shard-{key}.json"
+        data = _dump(terms)
+        written += _write_if_changed(os.path.join(search_dir, name), data)
+        manifest_shards[key] = {
+            "url": f"{SEARCH_URL}/{name}",
+            "terms": len(terms),
+            "sha256": hashlib.sha256(data).hexdigest(),
+        }
+    written += _write_if_changed(os.path.join(search_dir, 'docs.json'), _dump(doc_ids))
+
+    token_urls = []
+    for start in range(0, len(doc_ids), TOKEN_CHUNK):
+        name = f"tokens-{start // TOKEN_CHUNK}.json"
+        chunk = [' '.join(docs[doc_id]['tokens']) for doc_id in doc_ids[start:start + TOKEN_CHUNK]]
+        written += _write_if_changed(os.path.join(search_dir, name), _dump(chunk))
+        token_urls.append(f"{SEARCH_URL}/{name}")
+
+    manifest = {
+        "version": INDEX_VERSION,
+        "prefix_length": PREFIX_LENGTH,
+        "docs": f"{SEARCH_URL}/docs.json",
+        "shards": manifest_shards,
+        "tokens": {"chunk_size": TOKEN_CHUNK, "urls": token_urls},
+    }
+    written += _write_if_changed(os.path.join(search_dir, 'manifest.json'), json.dumps(manifest, indent=4).encode('utf-8'))
+
+    # Drop shards whose prefix no longer has any terms, and surplus token chunks
+    current_names = {f"shard-{key}.json" for key in shards}
+    current_names.update(url.rsplit('/', 1)[1] for url in token_urls)
+    for name in os.listdir(search_dir):
+        if name.startswith(('shard-', 'tokens-')) and name not in current_names:
+            os.remove(os.path.join(search_dir, name))
+
+    cache['docs'] = docs
+    atomic_write_bytes(cache_file, json.dumps(cache).encode('utf-8'))
+    print(f"Indexed {len(doc_ids)} syntheses ({recomputed} re-tokenized), {len(postings)} terms "
+          f"in {len(shards)} shards; {written} files written")
+    return manifest
+
+
+def main():
+    build_search_index()
+
+
+if __name__ == "__main__":
+    main()
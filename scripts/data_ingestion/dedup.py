@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""Near-duplicate detection for routes before they are written to public/data.
+
+Exact-id dedup in the index updaters misses the same transformation
+imported twice under different ids (ORD shards repeat reactions) or the
+same route listed twice. Here every route is reduced to a set of shingles:
+
+  - reagent and condition words and molecule-name words,
+  - the normalized SMILES of every reactant/product fragment, plus its
+    character 4-grams so a slightly different SMILES still overlaps,
+
+and each set to a MinHash signature of NUM_PERM 32-bit minima. LSH
+banding (BANDS bands of ROWS rows) puts routes whose signatures agree on
+a whole band in the same bucket, so candidate pairs are found in roughly
+linear time instead of comparing every pair. Candidates are confirmed
+with the exact Jaccard similarity of their shingle sets and grouped into
+clusters with union-find.
+
+`dedup_routes` either only reports the clusters or merges them, keeping
+the first route of each cluster (the importers' own order) and dropping
+the rest.
+
+Uses NumPy for the signatures when installed; the pure Python fallback
+gives identical signatures.
+
+Usage:
+    python dedup.py [DIR_OR_FILE ...] [--threshold 0.8]
+"""
+
+import os
+import re
+import json
+import zlib
+import random
+import argparse
+
+from smiles_utils import normalize_smiles
+from reaction_record import as_synthesis
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# With 16 bands of 8 rows, pairs above ~0.7 Jaccard almost always share a band
+DEFAULT_THRESHOLD = 0.8
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+SEED = 1
+SMILES_GRAM = 4
+WORD_PATTERN = re.compile(r'[a-z0-9]+')
+DEDUP_MODES = ('report', 'merge', 'off')
+
+
+def _permutations(num_perm=NUM_PERM, seed=SEED):
+    rng = random.Random(seed)
+    a = [rng.randrange(1, MERSENNE_PRIME) for _ in range(num_perm)]
+    b = [rng.randrange(0, MERSENNE_PRIME) for _ in range(num_perm)]
+    return a, b
+
+
+PERM_A, PERM_B = _permutations()
+
+
+def _words(text):
+    return WORD_PATTERN.findall(text.lower()) if isinstance(text, str) else []
+
+
+def route_shingles(synthesis):
+    """The shingle set for a synthesis dict or ReactionRecord (ids and free-text notes are ignored)."""
+    synthesis = as_synthesis(synthesis)
+    shingles = set()
+    meta = synthesis.get('meta') or {}
+    shingles.update(f"n:{w}" for w in _words(meta.get('molecule_name')))
+    for step in synthesis.get('sequence') or ():
+        if not isinstance(step, dict):
+            continue
+        shingles.update(f"r:{w}" for w in _words(step.get('reagents')))
+        shingles.update(f"c:{w}" for w in _words(step.get('conditions')))
+        shingles.update(f"t:{w}" for w in _words(step.get('reaction_type')))
+        for field in ('reactant_smiles', 'product_smiles', 'reagent_smiles'):
+            value = step.get(field)
+            if not isinstance(value, str) or value.strip() in ('', '???'):
+                continue
+            for fragment in value.split('.'):
+                smiles = normalize_smiles(fragment)
+                if not smiles:
+                    continue
+                shingles.add(f"s:{smiles}")
+                shingles.update(f"g:{smiles[i:i + SMILES_GRAM]}"
+                                for i in range(max(len(smiles) - SMILES_GRAM + 1, 1)))
+    return shingles
+
+
+def _shingle_hashes(shingles):
+    return [zlib.crc32(s.encode('utf-8')) for s in sorted(shingles)]
+
+
+def minhash(shingles):
+    """MinHash signature (list of NUM_PERM ints), or None for an empty set."""
+    hashes = _shingle_hashes(shingles)
+    if not hashes:
+        return None
+    if np is not None:
+        x = np.array(hashes, dtype=np.uint64)
+        a = np.array(PERM_A, dtype=np.uint64)[:, None]
+        b = np.array(PERM_B, dtype=np.uint64)[:, None]
+        # uint64 arithmetic wraps, exactly like the & mask below
+        values = ((a * x + b) % np.uint64(MERSENNE_PRIME)) & np.uint64(MAX_HASH)
+        return values.min(axis=1).tolist()
+    mask = (1 << 64) - 1
+    return [min((((a * h + b) & mask) % MERSENNE_PRIME) & MAX_HASH for h in hashes)
+            for a, b in zip(PERM_A, PERM_B)]
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+class _UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i, j):
+        ri, rj = self.find(i), self.find(j)
+        if ri != rj:
+            # Lower index wins so the first route stays the representative
+            self.parent[max(ri, rj)] = min(ri, rj)
+
+
+def find_clusters(routes, threshold=DEFAULT_THRESHOLD):
+    """Group near-duplicate routes. Returns clusters as sorted lists of indexes (size >= 2)."""
+    shingle_sets = [route_shingles(r) for r in routes]
+    buckets = {}
+    for i, shingles in enumerate(shingle_sets):
+        signature = minhash(shingles)
+        if signature is None:
+            continue
+        for band in range(BANDS):
+            key = (band, tuple(signature[band * ROWS:(band + 1) * ROWS]))
+            buckets.setdefault(key, []).append(i)
+
+    union_find = _UnionFind(len(routes))
+    checked = set()
+    for members in buckets.values():
+        # Compare each member with one head per group already found in this
+        # bucket, so a bucket of n identical routes costs n comparisons, not n^2
+        heads = []
+        for i in members:
+            for head in heads:
+                if union_find.find(head) == union_find.find(i):
+                    break
+                pair = (head, i)
+                if pair in checked:
+                    continue
+                checked.add(pair)
+                if jaccard(shingle_sets[head], shingle_sets[i]) >= threshold:
+                    union_find.union(head, i)
+                    break
+            else:
+                heads.append(i)
+
+    clusters = {}
+    for i in range(len(routes)):
+        clusters.setdefault(union_find.find(i), []).append(i)
+    return [members for members in clusters.values() if len(members) > 1]
+
+
+def _route_label(route):
+    meta = as_synthesis(route).get('meta') or {}
+    return f"{meta.get('id', '?')} ({meta.get('molecule_name', '?')})"
+
+
+def dedup_routes(routes, mode='report', threshold=DEFAULT_THRESHOLD):
+    """Report or merge near-duplicate routes. Returns the routes to write.
+
+    In 'merge' mode only the first route of each cluster is kept; in
+    'report' (and 'off') every route is returned unchanged.
+    """
+    if mode == 'off' or len(routes) < 2:
+        return list(routes)
+    clusters = find_clusters(routes, threshold)
+    duplicates = sum(len(c) - 1 for c in clusters)
+    print(f"Dedup: {len(clusters)} near-duplicate clusters ({duplicates} redundant routes) "
+          f"at Jaccard >= {threshold}")
+    for cluster in clusters:
+        keep, rest = cluster[0], cluster[1:]
+        print(f"  {_route_label(routes[keep])} ~ {', '.join(_route_label(routes[i]) for i in rest)}")
+    if mode != 'merge':
+        return list(routes)
+    dropped = {i for cluster in clusters for i in cluster[1:]}
+    return [route for i, route in enumerate(routes) if i not in dropped]
+
+
+def add_dedup_arguments(parser, default_mode='report'):
+    parser.add_argument("--dedup", choices=DEDUP_MODES, default=default_mode,
+                        help="Near-duplicate routes: only report them, merge them (keep the first), or skip the check")
+    parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Jaccard similarity at which two routes count as duplicates")
+
+
+def main():
+    from index_store import DATA_DIR, find_synthesis_files
+
+    parser = argparse.ArgumentParser(description="Report near-duplicate synthesis files.")
+    parser.add_argument("paths", nargs="*", default=[DATA_DIR], help="Synthesis files or directories")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    files = []
+    for path in args.paths:
+        files.extend(find_synthesis_files(path) if os.path.isdir(path) else [path])
+    routes = []
+    for path in files:
+        with open(path, 'r', encoding='utf-8') as f:
+            routes.append(json.load(f))
+    print(f"Checking {len(routes)} routes...")
+    dedup_routes(routes, 'report', args.threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
-import json
 import os
 import sys
+import argparse
 import urllib.request
 import urllib.error
+from index_store import IndexStore
+from instrumentation import stage, count, add_profile_arguments, start_profiling, finish_profiling
 
 # Configuration
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'public', 'data')
@@ -82,6 +84,11 @@ def map_ord_to_app_schema(ord_reaction, index):
     }, reaction_id
 
 def main():
+    parser = argparse.ArgumentParser(description="Import ORD reactions into public/data/imported.")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    start_profiling(args)
+
     print("Starting ORD Data Ingestion...")
     ensure_directories()
     
@@ -103,15 +110,19 @@ def main():
         }
     ]
     
+    store = IndexStore()
     new_entries = []
     
     for i, rxn in enumerate(mock_ord_reactions):
-        app_data, rxn_id = map_ord_to_app_schema(rxn, i+1)
+        count('reactions_seen')
+        with stage('map'):
+            app_data, rxn_id = map_ord_to_app_schema(rxn, i+1)
+        count('reactions_kept')
         filename = f"{rxn_id}.json"
+        relative_path = f"/data/imported/{filename}"
         
-        output_path = os.path.join(IMPORTED_DIR, filename)
-        with open(output_path, 'w') as f:
-            json.dump(app_data, f, indent=4)
+        with stage('write'):
+            stats = store.write_synthesis(relative_path, app_data)
         print(f"Saved {filename}")
         
         new_entries.append({
@@ -120,26 +131,22 @@ def main():
             "class": "Imported",
             "author": "ORD",
             "year": 2024,
-            "path": f"/data/imported/{filename}"
+            "path": relative_path,
+            **stats
         })
         
     # Update Index
     try:
-        with open(INDEX_FILE, 'r+') as f:
-            index_data = json.load(f)
-            
-            # Remove existing entries with same IDs to avoid duplicates
-            existing_ids = {e['id'] for e in new_entries}
-            index_data = [e for e in index_data if e['id'] not in existing_ids]
-            
-            index_data.extend(new_entries)
-            
-            f.seek(0)
-            json.dump(index_data, f, indent=4)
-            f.truncate()
+        # Upsert by id so existing entries are replaced rather than duplicated
+        with stage('index'):
+            for entry in new_entries:
+                store.upsert(entry)
+            store.save()
         print("Updated index.json")
     except Exception as e:
         print(f"Error updating index: {e}")
 
+    finish_profiling(args)
+
 if __name__ == "__main__":
     main()
@@ -1,15 +1,16 @@
 import os
-import json
-import urllib.request
-import ord_schema
-from ord_schema import message_helpers
-from ord_schema.proto import dataset_pb2
-from ord_schema.proto import reaction_pb2
+import argparse
+from contextlib import closing
+from ord_wire import reaction_stream, IDENTIFIER_NAME, IDENTIFIER_SMILES, MEASUREMENT_YIELD
+from ord_index import OrdIndex
+from index_store import IndexStore
+from ord_downloader import Downloader
+from instrumentation import stage, count, add_profile_arguments, start_profiling, finish_profiling
+from dedup import add_dedup_arguments, dedup_routes
+from reaction_record import ReactionRecord
 
 # Configuration
 DATASET_ID = "ord_dataset-01dbb772c5e249108f0b191ed17a2c0c"
-# GitHub Raw URL
-DATASET_URL = f"https://github.com/Open-Reaction-Database/ord-data/raw/main/data/01/{DATASET_ID}.pb.gz"
 
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'public', 'data')
 IMPORTED_DIR = os.path.join(DATA_DIR, 'imported')
@@ -22,170 +23,201 @@ def ensure_directories():
 
 def download_dataset():
     print(f"Downloading dataset {DATASET_ID}...")
-    if not os.path.exists(DOWNLOAD_PATH):
-        try:
-            urllib.request.urlretrieve(DATASET_URL, DOWNLOAD_PATH)
-            print("Download complete.")
-        except Exception as e:
-            print(f"Failed to download: {e}")
-            return False
-    else:
-        print("File already exists.")
+    try:
+        # Resumes partial downloads and verifies against ord_manifest.json;
+        # an existing, verified copy is reused without touching the network.
+        with stage('download'):
+            Downloader().fetch(DATASET_ID, os.path.dirname(DOWNLOAD_PATH))
+        print("Dataset ready.")
+    except Exception as e:
+        print(f"Failed to download: {e}")
+        return False
     return True
 
-def extract_reactions(limit=100):
+def extract_reactions(limit=100, path=DOWNLOAD_PATH, full=False):
+    """Mapped reactions from the shard, as ReactionRecords (see reaction_record.py).
+
+    Reactions are wire-decoded (ord_wire.py) unless `full` asks for
+    complete ord_schema messages.
+    """
     print("Parsing dataset...")
+    reactions = []
     try:
-        # Load the dataset
-        dataset = message_helpers.load_message(DOWNLOAD_PATH, dataset_pb2.Dataset)
+        # Stream reactions one at a time; closing the generator once we hit
+        # the limit stops decompression of the rest of the shard.
+        with closing(reaction_stream(path, full=full)) as stream:
+            for reaction in stream:
+                with stage('map'):
+                    mapped_rxn = map_reaction_record(reaction)
+                # Only add if we have some valid data
+                if mapped_rxn is not None:
+                    count('reactions_kept')
+                    reactions.append(mapped_rxn)
+                    if len(reactions) >= limit:
+                        break
+                else:
+                    count('reactions_dropped')
     except Exception as e:
         print(f"Error parsing PB file: {e}")
-        return []
 
-    reactions = []
-    count = 0
+    return reactions
+
+def map_reaction(reaction):
+    """Map a single ORD Reaction (or ord_wire LightReaction) to our schema.
+
+    Returns None if it has no product SMILES.
+    """
+    record = map_reaction_record(reaction)
+    return record.to_synthesis() if record is not None else None
+
+def map_reaction_record(reaction):
+    """Like map_reaction, but returns a compact ReactionRecord."""
+    # Extract basic info
+    rxn_id = reaction.reaction_id
     
-    for reaction in dataset.reactions:
-        if count >= limit:
-            break
-            
-        # Extract basic info
-        rxn_id = reaction.reaction_id
-        
-        # Try to find a product name
-        molecule_name = "Unknown Product"
-        product_smiles = ""
-        measured_yield = "N/A"
-        
-        if reaction.outcomes:
-            outcome = reaction.outcomes[0]
-            if outcome.products:
-                prod = outcome.products[0]
-                if prod.identifiers:
-                    for ident in prod.identifiers:
-                        if ident.type == reaction_pb2.CompoundIdentifier.NAME:
-                            molecule_name = ident.value
-                            break
-                # If no name, try SMILES
+    # Try to find a product name
+    molecule_name = "Unknown Product"
+    product_smiles = ""
+    measured_yield = "N/A"
+    
+    if reaction.outcomes:
+        outcome = reaction.outcomes[0]
+        if outcome.products:
+            prod = outcome.products[0]
+            if prod.identifiers:
                 for ident in prod.identifiers:
-                    if ident.type == reaction_pb2.CompoundIdentifier.SMILES:
-                        product_smiles = ident.value
-                        if molecule_name == "Unknown Product":
-                             molecule_name = "Chemical Product" # Fallback
+                    if ident.type == IDENTIFIER_NAME:
+                        molecule_name = ident.value
                         break
-                
-                # Yield
-                if prod.measurements:
-                    for m in prod.measurements:
-                        if m.type == reaction_pb2.ProductMeasurement.YIELD:
-                            measured_yield = f"{m.percentage.value:.1f}%"
-                            break
-
-        # Extract Reactants
-        reactant_smiles = []
-        reagent_names = []
-        for input_key in reaction.inputs:
-            inp = reaction.inputs[input_key]
-            for comp in inp.components:
-                # Name
-                comp_name = ""
-                for ident in comp.identifiers:
-                    if ident.type == reaction_pb2.CompoundIdentifier.NAME:
-                        comp_name = ident.value
-                        break
-                if comp_name:
-                    reagent_names.append(comp_name)
-                
-                # SMILES
-                for ident in comp.identifiers:
-                    if ident.type == reaction_pb2.CompoundIdentifier.SMILES:
-                        reactant_smiles.append(ident.value)
+            # If no name, try SMILES
+            for ident in prod.identifiers:
+                if ident.type == IDENTIFIER_SMILES:
+                    product_smiles = ident.value
+                    if molecule_name == "Unknown Product":
+                         molecule_name = "Chemical Product" # Fallback
+                    break
+            
+            # Yield
+            if prod.measurements:
+                for m in prod.measurements:
+                    if m.type == MEASUREMENT_YIELD:
+                        measured_yield = f"{m.percentage.value:.1f}%"
                         break
 
-        # Extract Conditions (Simplified)
-        conditions_str = "Standard Conditions"
-        if reaction.conditions.temperature.setpoint.value:
-            conditions_str = f"{reaction.conditions.temperature.setpoint.value}°C"
-        
-        # Meta info
-        author = "ORD Contributor"
-        year = 2020
-        if reaction.provenance.record_created.time.value:
-            # simple parsing or default
-            pass
-
-        # Construct our JSON object
-        mapped_rxn = {
-            "$schema": "../schema.json",
-            "meta": {
-                "id": rxn_id,
-                "molecule_name": molecule_name,
-                "class": "ORD Import",
-                "author": author,
-                "year": year,
-                "source_url": f"https://open-reaction-database.org/client/id/{rxn_id}"
-            },
-            "sequence": [
-                {
-                    "step_id": 1,
-                    "reaction_type": "Synthesis",
-                    "reagents": ", ".join(reagent_names[:3]), # First 3 reagents
-                    "conditions": conditions_str,
-                    "yield": measured_yield,
-                    "reactant_smiles": reactant_smiles[0] if reactant_smiles else "",
-                    "product_smiles": product_smiles,
-                    "notes": "Imported from Open Reaction Database"
-                }
-            ]
-        }
-        
-        # Only add if we have some valid data
-        if product_smiles:
-            reactions.append(mapped_rxn)
-            count += 1
+    # Extract Reactants
+    reactant_smiles = []
+    reagent_names = []
+    for input_key in reaction.inputs:
+        inp = reaction.inputs[input_key]
+        for comp in inp.components:
+            # Name
+            comp_name = ""
+            for ident in comp.identifiers:
+                if ident.type == IDENTIFIER_NAME:
+                    comp_name = ident.value
+                    break
+            if comp_name:
+                reagent_names.append(comp_name)
             
+            # SMILES
+            for ident in comp.identifiers:
+                if ident.type == IDENTIFIER_SMILES:
+                    reactant_smiles.append(ident.value)
+                    break
+
+    # Extract Conditions (Simplified)
+    conditions_str = "Standard Conditions"
+    if reaction.conditions.temperature.setpoint.value:
+        conditions_str = f"{reaction.conditions.temperature.setpoint.value}°C"
+    
+    if not product_smiles:
+        return None
+    return ReactionRecord(rxn_id, molecule_name, product_smiles, measured_yield,
+                          reagent_names, reactant_smiles, conditions_str)
+
+def extract_reactions_from_index(index_dir, limit=100):
+    """Same records as extract_reactions, answered from a prebuilt ord_index.
+
+    The index keeps every product/reactant identifier rather than only the
+    first one per compound, so names and SMILES are taken in index order.
+    """
+    print(f"Reading ORD index {index_dir}...")
+    index = OrdIndex(index_dir)
+    reactions = []
+    for row in range(len(index)):
+        if len(reactions) >= limit:
+            break
+        record = index.record(row)
+        if not record['product_smiles']:
+            continue
+        molecule_name = record['product_name'][0] if record['product_name'] else "Chemical Product"
+        measured_yield = "N/A" if record['yield'] is None else f"{record['yield']:.1f}%"
+        conditions_str = "Standard Conditions"
+        if record['temperature']:
+            conditions_str = f"{record['temperature']}°C"
+        reactions.append(ReactionRecord(
+            record['reaction_id'], molecule_name, record['product_smiles'][0], measured_yield,
+            record['reactant_name'], record['reactant_smiles'], conditions_str))
     return reactions
 
 def main():
+    parser = argparse.ArgumentParser(description="Import real ORD reactions into public/data/imported.")
+    parser.add_argument("--index", help="Read from a prebuilt ord_index directory instead of the .pb.gz file")
+    parser.add_argument("--full-parse", action="store_true",
+                        help="Parse complete ord_schema Reactions instead of wire-decoding only the mapped fields")
+    add_profile_arguments(parser)
+    add_dedup_arguments(parser)
+    args = parser.parse_args()
+    start_profiling(args)
+
     ensure_directories()
-    if download_dataset():
-        reactions = extract_reactions(105) # Fetch a few more to filter bad ones
-        
+    if args.index or download_dataset():
+        with stage('extract'):
+            if args.index:
+                reactions = extract_reactions_from_index(args.index, 105)
+            else:
+                reactions = extract_reactions(105, full=args.full_parse) # Fetch a few more to filter bad ones
+        # ORD shards repeat the same transformation under different reaction ids
+        with stage('dedup'):
+            reactions = dedup_routes(reactions, args.dedup, args.dedup_threshold)
+
+        store = IndexStore()
         new_entries = []
         for i, rxn in enumerate(reactions):
             if i >= 100: break
             
             filename = f"ord-{i+1}.json"
-            filepath = os.path.join(IMPORTED_DIR, filename)
+            relative_path = f"/data/imported/{filename}"
             
+            # Records become schema dicts only here, one at a time
+            synthesis = rxn.to_synthesis()
             # Override ID to be simple
-            rxn['meta']['id'] = f"ord-real-{i+1}"
+            synthesis['meta']['id'] = f"ord-real-{i+1}"
             
-            with open(filepath, 'w') as f:
-                json.dump(rxn, f, indent=4)
+            with stage('write'):
+                stats = store.write_synthesis(relative_path, synthesis)
                 
             new_entries.append({
                 "id": f"ord-real-{i+1}",
-                "molecule_name": rxn['meta']['molecule_name'],
+                "molecule_name": rxn.molecule_name,
                 "class": "ORD Real Data",
                 "author": "ORD",
                 "year": 2024,
-                "path": f"/data/imported/{filename}",
-                "step_count": len(rxn['sequence'])
+                "path": relative_path,
+                **stats
             })
             
         # Update Index
         try:
-            with open(INDEX_FILE, 'r+') as f:
-                current_index = json.load(f)
-                cleaned_index = [e for e in current_index if not e['path'].startswith('/data/imported/')]
-                cleaned_index.extend(new_entries)
-                f.seek(0)
-                json.dump(cleaned_index, f, indent=4)
-                f.truncate()
-            print(f"Successfully imported {len(new_entries)} real ORD reactions.")
+            with stage('index'):
+                store.replace_under('/data/imported/', new_entries)
+                store.save()
+            print(f"Successfully imported {len(new_entries)} real ORD reactions "
+                  f"({store.files_written} files written, {store.files_skipped} unchanged).")
         except Exception as e:
             print(f"Error updating index: {e}")
 
+    finish_profiling(args)
+
 if __name__ == "__main__":
     main()
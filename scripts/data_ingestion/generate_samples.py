@@ -1,11 +1,55 @@
-import json
+"""Generate sample reactions.
+
+By default, writes the curated REACTIONS_LIST into public/data/imported and
+updates index.json.
+
+With --count N it instead writes a synthetic catalog of N routes for load
+testing (index.json loading, DataManager, the importers) under a separate
+output root laid out like public/:
+
+    <output-root>/data/index.json
+    <output-root>/data/schema.json  (copied, for the routes' $schema)
+    <output-root>/data/synthetic/<chunk>/syn-<n>.json
+    <output-root>/catalog.json     (seed, count, SMILES source)
+
+The real public/data is never touched. Routes are chains of SMILES drawn
+from the checked-in ORD shard (each step's product is the next step's
+reactant, as in real routes) with log-normally distributed step counts:
+long for natural-product total syntheses, short for drug process routes.
+Route n is generated from its own RNG seeded with (seed, n), so chunks
+can be written by a process pool in any order and identical seeds give
+byte-identical output.
+
+Usage:
+    python generate_samples.py [--seed S]
+    python generate_samples.py --count 1000000 --seed 1 [--output-root DIR] [--workers N]
+"""
+
 import os
+import math
+import json
 import random
+import shutil
+import hashlib
+import argparse
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor
+from index_store import IndexStore, PUBLIC_DIR, dump_json_bytes, synthesis_stats
+from instrumentation import stage, count, add_profile_arguments, start_profiling, finish_profiling
+from dedup import add_dedup_arguments, dedup_routes
 
 # Configuration
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'public', 'data')
 IMPORTED_DIR = os.path.join(DATA_DIR, 'imported')
 INDEX_FILE = os.path.join(DATA_DIR, 'index.json')
+SCHEMA_FILE = os.path.join(DATA_DIR, 'schema.json')
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ORD_SHARD = os.path.join(SCRIPT_DIR, "ord_dataset-01dbb772c5e249108f0b191ed17a2c0c.pb.gz")
+DEFAULT_OUTPUT_ROOT = os.path.join(SCRIPT_DIR, '.synthetic_catalog')
+CATALOG_VERSION = 1
+MAX_COUNT = 1_000_000
+# Routes per task and per output directory
+CHUNK_SIZE = 1000
 
 # The Specific List of 100 Reactions
 # Format: (Name, Description/Reaction Name, Class, Year, Author)
@@ -118,12 +162,21 @@ REACTIONS_LIST = [
 REAGENTS = ["H2SO4", "NaOH", "Pd/C", "LiAlH4", "NaBH4", "KMnO4", "O3", "SOCl2", "NH3", "HCl", "n-BuLi", "LDA", "Grignard"]
 SOLVENTS = ["THF", "DCM", "EtOH", "MeOH", "H2O", "DMSO", "DMF", "Ether", "Toluene", "Acetone", "Benzene"]
 CONDITIONS = ["Reflux, 2h", "RT, 12h", "0°C, 30min", "100°C, 5h", "-78°C, 1h", "High Pressure", "Microwave"]
+REACTION_TYPES = ["Oxidation", "Reduction", "Esterification", "Hydrolysis", "Coupling", "Aldol", "Diels-Alder", "Cyclization"]
+
+# Total syntheses of natural products run long (Woodward's strychnine took
+# 29 steps); process routes to drugs are short.
+# (median steps, log-normal sigma, min, max)
+LONG_ROUTE_CLASSES = {"Alkaloid", "Terpene", "Macrolide", "Polyether", "Steroid", "Polyketide", "Limonoid",
+                      "Marine Natural Product", "Vitamin", "Porphyrin", "Peptide", "Aziridine"}
+LONG_ROUTE_STEPS = (18, 0.45, 4, 60)
+SHORT_ROUTE_STEPS = (6, 0.5, 1, 20)
 
 def ensure_directories():
     if not os.path.exists(IMPORTED_DIR):
         os.makedirs(IMPORTED_DIR)
 
-def generate_reaction(index, item):
+def generate_reaction(index, item, rng=random):
     name, desc, cls, year, author = item
     
     # Create a safe ID
@@ -131,18 +184,18 @@ def generate_reaction(index, item):
     rxn_id = f"rxn-{safe_name}-{index+1}"
     
     # Generate 1-5 random pseudo-steps to simulate the synthesis
-    num_steps = random.randint(3, 8) if cls in ["Alkaloid", "Terpene", "Macrolide"] else random.randint(1, 4)
+    num_steps = rng.randint(3, 8) if cls in ["Alkaloid", "Terpene", "Macrolide"] else rng.randint(1, 4)
     steps = []
     
     for i in range(1, num_steps + 1):
         steps.append({
             "step_id": i,
-            "reaction_type": random.choice(["Oxidation", "Reduction", "Esterification", "Hydrolysis", "Coupling", "Aldol", "Diels-Alder", "Cyclization"]),
-            "reagents": f"{random.choice(REAGENTS)}, {random.choice(REAGENTS)}",
-            "conditions": f"{random.choice(CONDITIONS)}, {random.choice(SOLVENTS)}",
-            "yield": f"{random.randint(40, 99)}%",
-            "reactant_smiles": "C" * random.randint(3, 15), # Mock SMILES
-            "product_smiles": "C" * random.randint(5, 20) + "O", # Mock SMILES
+            "reaction_type": rng.choice(REACTION_TYPES),
+            "reagents": f"{rng.choice(REAGENTS)}, {rng.choice(REAGENTS)}",
+            "conditions": f"{rng.choice(CONDITIONS)}, {rng.choice(SOLVENTS)}",
+            "yield": f"{rng.randint(40, 99)}%",
+            "reactant_smiles": "C" * rng.randint(3, 15), # Mock SMILES
+            "product_smiles": "C" * rng.randint(5, 20) + "O", # Mock SMILES
             "notes": f"Step {i} of {name} synthesis ({desc})."
         })
 
@@ -161,19 +214,209 @@ def generate_reaction(index, item):
     
     return data, rxn_id
 
+# -- synthetic catalog ----------------------------------------------------
+
+def load_smiles_pool(path=ORD_SHARD):
+    """Distinct product and reactant SMILES from an ORD shard, in file order."""
+    from ord_schema.proto import reaction_pb2
+    from ord_reader import iter_reactions
+
+    smiles_type = reaction_pb2.CompoundIdentifier.SMILES
+    pool = {}
+    with closing(iter_reactions(path)) as stream:
+        for reaction in stream:
+            compounds = [product for outcome in reaction.outcomes for product in outcome.products]
+            # Map iteration order isn't defined; sort so the pool is reproducible
+            for key in sorted(reaction.inputs):
+                compounds.extend(reaction.inputs[key].components)
+            for compound in compounds:
+                for identifier in compound.identifiers:
+                    if identifier.type == smiles_type and identifier.value:
+                        pool.setdefault(identifier.value, None)
+    return list(pool)
+
+
+def sample_step_count(rng, cls):
+    median, sigma, low, high = LONG_ROUTE_STEPS if cls in LONG_ROUTE_CLASSES else SHORT_ROUTE_STEPS
+    return min(max(round(rng.lognormvariate(math.log(median), sigma)), low), high)
+
+
+def synthetic_route(index, seed, pool):
+    """Route number `index` of the catalog for `seed`; depends on nothing else."""
+    # String seeds are hashed with SHA-512, independent of PYTHONHASHSEED
+    rng = random.Random(f"{seed}:{index}")
+    name, desc, cls, year, author = rng.choice(REACTIONS_LIST)
+    num_steps = sample_step_count(rng, cls)
+    molecules = [rng.choice(pool) for _ in range(num_steps + 1)]
+    steps = []
+    for i in range(1, num_steps + 1):
+        steps.append({
+            "step_id": i,
+            "reaction_type": rng.choice(REACTION_TYPES),
+            "reagents": f"{rng.choice(REAGENTS)}, {rng.choice(SOLVENTS)}",
+            "conditions": rng.choice(CONDITIONS),
+            "yield": f"{rng.randint(40, 99)}%",
+            "reactant_smiles": molecules[i - 1],
+            "product_smiles": molecules[i],
+            "notes": f"Step {i} of a synthetic {name} route ({desc})."
+        })
+    return {
+        "$schema": "../../schema.json",
+        "meta": {
+            "id": f"syn-{index + 1:07d}",
+            "molecule_name": f"{name} (synthetic {index + 1})",
+            "class": cls,
+            "author": author,
+            "year": year,
+            "source_url": "https://example.com/synthesis"
+        },
+        "sequence": steps
+    }
+
+
+WORKER_STATE = None
+
+
+def _init_worker(seed, pool, data_dir):
+    global WORKER_STATE
+    WORKER_STATE = (seed, pool, data_dir)
+
+
+def _indent(data, prefix=b'    '):
+    return b'\n'.join(prefix + line for line in data.split(b'\n'))
+
+
+def write_chunk(task):
+    """Write routes [start, end). Returns their index entries, already serialized."""
+    start, end = task
+    seed, pool, data_dir = WORKER_STATE
+    directory = f"synthetic/{start // CHUNK_SIZE:04d}"
+    os.makedirs(os.path.join(data_dir, directory), exist_ok=True)
+    entries = []
+    for index in range(start, end):
+        route = synthetic_route(index, seed, pool)
+        meta = route['meta']
+        relative_path = f"/data/{directory}/{meta['id']}.json"
+        with open(os.path.join(data_dir, directory, f"{meta['id']}.json"), 'wb') as f:
+            f.write(dump_json_bytes(route))
+        entry = {
+            "id": meta['id'],
+            "molecule_name": meta['molecule_name'],
+            "class": meta['class'],
+            "author": meta['author'],
+            "year": meta['year'],
+            "path": relative_path,
+            **synthesis_stats(route)
+        }
+        # Exactly how json.dumps(entries, indent=4) lays out a list item
+        entries.append(_indent(dump_json_bytes(entry)))
+    return b',\n'.join(entries)
+
+
+def generate_catalog(size, seed, output_root=DEFAULT_OUTPUT_ROOT, workers=None, smiles_source=ORD_SHARD):
+    """Write a synthetic catalog of `size` routes under `output_root`. Returns the index.json path."""
+    output_root = os.path.realpath(output_root)
+    public_dir = os.path.realpath(PUBLIC_DIR)
+    if output_root == public_dir or output_root.startswith(public_dir + os.sep):
+        raise SystemExit(f"Refusing to write a synthetic catalog into {PUBLIC_DIR}")
+    if not 0 < size <= MAX_COUNT:
+        raise SystemExit(f"--count must be between 1 and {MAX_COUNT}")
+
+    with stage('load_smiles'):
+        pool = load_smiles_pool(smiles_source)
+    if not pool:
+        raise SystemExit(f"No SMILES found in {smiles_source}")
+    print(f"Generating {size} synthetic routes (seed {seed}) from {len(pool)} ORD SMILES into {output_root}...")
+
+    data_dir = os.path.join(output_root, 'data')
+    # Leftovers from a larger earlier run would break byte-identical output
+    shutil.rmtree(os.path.join(data_dir, 'synthetic'), ignore_errors=True)
+    os.makedirs(data_dir, exist_ok=True)
+    # Routes point at ../../schema.json, as curated files do at theirs
+    shutil.copyfile(SCHEMA_FILE, os.path.join(data_dir, 'schema.json'))
+
+    tasks = [(start, min(start + CHUNK_SIZE, size)) for start in range(0, size, CHUNK_SIZE)]
+    index_path = os.path.join(data_dir, 'index.json')
+    part_path = index_path + '.part'
+    workers = workers or os.cpu_count() or 1
+    with stage('generate'), open(part_path, 'wb') as out:
+        out.write(b'[\n')
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(seed, pool, data_dir)) as executor:
+                chunks = executor.map(write_chunk, tasks)
+                _write_index_chunks(out, chunks)
+        else:
+            _init_worker(seed, pool, data_dir)
+            _write_index_chunks(out, map(write_chunk, tasks))
+        out.write(b'\n]')
+    os.replace(part_path, index_path)
+    count('reactions_kept', size)
+
+    with open(smiles_source, 'rb') as f:
+        source_sha = hashlib.sha256(f.read()).hexdigest()
+    catalog = {
+        "version": CATALOG_VERSION,
+        "seed": seed,
+        "count": size,
+        "smiles_source": os.path.basename(smiles_source),
+        "smiles_source_sha256": source_sha,
+        "smiles_pool": len(pool),
+    }
+    with open(os.path.join(output_root, 'catalog.json'), 'wb') as f:
+        f.write(json.dumps(catalog, indent=4).encode('utf-8'))
+    print(f"Wrote {size} routes and {index_path}")
+    return index_path
+
+
+def _write_index_chunks(out, chunks):
+    # executor.map yields in task order, so the index is in route order
+    for i, chunk in enumerate(chunks):
+        if i:
+            out.write(b',\n')
+        out.write(chunk)
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Generate the curated sample reactions into public/data/imported, "
+                                                 "or a large synthetic catalog for load testing (--count).")
+    parser.add_argument("--seed", type=int, help="RNG seed (the catalog defaults to 0)")
+    parser.add_argument("--count", type=int, help=f"Write a synthetic catalog of this many routes (up to {MAX_COUNT})")
+    parser.add_argument("--output-root", default=DEFAULT_OUTPUT_ROOT,
+                        help="Where the synthetic catalog goes (never public/)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--smiles-source", default=ORD_SHARD, help="ORD shard to draw SMILES from")
+    add_profile_arguments(parser)
+    add_dedup_arguments(parser)
+    args = parser.parse_args()
+    start_profiling(args)
+
+    if args.count is not None:
+        generate_catalog(args.count, args.seed or 0, args.output_root, args.workers, args.smiles_source)
+        finish_profiling(args)
+        return
+
+    rng = random.Random(args.seed) if args.seed is not None else random
     print(f"Generating {len(REACTIONS_LIST)} specific curated reactions...")
     ensure_directories()
     
+    store = IndexStore()
     new_entries = []
     
-    for i, item in enumerate(REACTIONS_LIST):
-        data, rxn_id = generate_reaction(i, item)
+    with stage('generate'):
+        generated = [generate_reaction(i, item, rng)[0] for i, item in enumerate(REACTIONS_LIST)]
+    with stage('dedup'):
+        routes = dedup_routes(generated, args.dedup, args.dedup_threshold)
+    count('reactions_dropped', len(generated) - len(routes))
+
+    for data in routes:
+        rxn_id = data['meta']['id']
+        count('reactions_kept')
         filename = f"{rxn_id}.json"
-        filepath = os.path.join(IMPORTED_DIR, filename)
+        relative_path = f"/data/imported/{filename}"
         
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=4)
+        with stage('write'):
+            stats = store.write_synthesis(relative_path, data)
             
         new_entries.append({
             "id": rxn_id,
@@ -181,26 +424,22 @@ def main():
             "class": data['meta']['class'],
             "author": data['meta']['author'],
             "year": data['meta']['year'],
-            "path": f"/data/imported/{filename}"
+            "path": relative_path,
+            **stats
         })
         
     # Update Index
     try:
-        with open(INDEX_FILE, 'r+') as f:
-            current_index = json.load(f)
-            
-            # Remove previous "custom-rxn" mock entries to keep it clean, but keep original static ones
-            # Filter out anything from the /imported/ folder to do a fresh import of this batch
-            cleaned_index = [e for e in current_index if not e['path'].startswith('/data/imported/')]
-            
-            cleaned_index.extend(new_entries)
-            
-            f.seek(0)
-            json.dump(cleaned_index, f, indent=4)
-            f.truncate()
-        print("Successfully generated 100 reactions and updated index.json")
+        # Replace everything under /imported/ with this batch, but keep original static ones
+        with stage('index'):
+            store.replace_under('/data/imported/', new_entries)
+            store.save()
+        print(f"Successfully generated {len(new_entries)} reactions and updated index.json "
+              f"({store.files_written} files written, {store.files_skipped} unchanged)")
     except Exception as e:
         print(f"Error updating index: {e}")
 
+    finish_profiling(args)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""Incremental maintenance of public/data/index.json.
+
+The importers share this instead of each rewriting index.json (and every
+synthesis file) from scratch. A manifest next to this script records, for
+every synthesis file, its size, mtime, SHA-256 and derived stats
+(step_count), so:
+
+  - synthesis files are only written when their bytes actually change,
+  - step counts are only recomputed for files whose contents changed,
+  - index.json is upserted by id and written atomically, and only when the
+    serialized bytes differ from what is on disk.
+
+Run directly to refresh step counts for hand-edited files:
+    python index_store.py
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+from contextlib import contextmanager
+
+from instrumentation import count
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'public', 'data')
+PUBLIC_DIR = os.path.dirname(DATA_DIR)
+INDEX_FILE = os.path.join(DATA_DIR, 'index.json')
+MANIFEST_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.index_manifest.json')
+MANIFEST_VERSION = 1
+# Under DATA_DIR but not synthesis files
+NON_SYNTHESIS_DIRS = {'packs', 'search', 'molecules'}
+NON_SYNTHESIS_FILES = {'index.json', 'schema.json', 'stats.json'}
+# Derived outputs the client reads instead of a synthesis file: the manifest
+# under DATA_DIR and the key of its per-file entries. Each entry records the
+# sha256 of the file it was built from.
+SERVED_COPIES = (('packs/manifest.json', 'entries'), ('molecules/manifest.json', 'routes'))
+
+
+def dump_json_bytes(data):
+    """Serialize exactly the way the importers always have (indent=4)."""
+    return json.dumps(data, indent=4).encode('utf-8')
+
+
+def _file_mode(path):
+    """Mode for a rewritten file: the existing file's, or what open() would give a new one."""
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+@contextmanager
+def atomic_open(path):
+    """Open a temp file in `path`'s directory for writing; rename it over `path` on success.
+
+    Readers never see a half-written file, and a reader that has the old
+    file open or mmapped keeps its copy, since the old inode is left alone.
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            # mkstemp creates files 0600, and os.replace would keep that
+            os.fchmod(f.fileno(), _file_mode(path))
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_bytes(path, data):
+    """Write via a temp file in the same directory and rename it into place."""
+    with atomic_open(path) as f:
+        f.write(data)
+    count('bytes_out', len(data))
+
+
+def sha256_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_digest(relative_path, public_dir=PUBLIC_DIR):
+    """SHA-256 of a synthesis file, or None if it doesn't exist."""
+    try:
+        with open(public_path(relative_path, public_dir), 'rb') as f:
+            return sha256_bytes(f.read())
+    except OSError:
+        return None
+
+
+def drop_stale_copies(digest=None, data_dir=DATA_DIR):
+    """Remove pack entries and compact routes whose synthesis file has changed.
+
+    `digest(relative_path)` gives the file's current SHA-256 (by default,
+    file_digest() of the file under `data_dir`'s parent). Entries without
+    a recorded sha256 (built by older versions) are dropped too. The client
+    fetches those files directly until build_bundles.py or
+    build_molecule_table.py is run again. Returns the number dropped.
+    """
+    if digest is None:
+        public_dir = os.path.dirname(os.path.abspath(data_dir))
+
+        def digest(relative_path):
+            return file_digest(relative_path, public_dir)
+    dropped = 0
+    for manifest_name, key in SERVED_COPIES:
+        manifest_file = os.path.join(data_dir, manifest_name)
+        if not os.path.exists(manifest_file):
+            continue
+        with open(manifest_file, 'r') as f:
+            manifest = json.load(f)
+        entries = manifest.get(key) or {}
+        stale = [relative_path for relative_path, entry in entries.items()
+                 if not isinstance(entry, dict) or entry.get('sha256') != digest(relative_path)]
+        if stale:
+            for relative_path in stale:
+                del entries[relative_path]
+            atomic_write_bytes(manifest_file, json.dumps(manifest, indent=4).encode('utf-8'))
+            dropped += len(stale)
+    return dropped
+
+
+def synthesis_stats(synthesis):
+    """Derived values kept in index.json for a synthesis file."""
+    sequence = synthesis.get('sequence')
+    return {"step_count": len(sequence) if isinstance(sequence, list) else 0}
+
+
+def public_path(relative_path, public_dir=PUBLIC_DIR):
+    """Map an index path like /data/imported/x.json to a filesystem path under `public_dir`."""
+    return os.path.join(public_dir, relative_path.lstrip('/'))
+
+
+def find_synthesis_files(data_dir=DATA_DIR):
+    """Every synthesis .json under `data_dir`, whether or not index.json lists it.
+
+    Hidden files and directories are skipped, including the .tmp-* files
+    atomic_open leaves behind if the process dies mid-write.
+    """
+    paths = []
+    for root, dirs, files in os.walk(data_dir):
+        dirs[:] = sorted(d for d in dirs if d not in NON_SYNTHESIS_DIRS and not d.startswith('.'))
+        for name in sorted(files):
+            if name.startswith('.'):
+                continue
+            if name.endswith('.json') and not (root == data_dir and name in NON_SYNTHESIS_FILES):
+                paths.append(os.path.join(root, name))
+    return paths
+
+
+class IndexStore:
+    """index.json plus its manifest, loaded once and saved once."""
+
+    def __init__(self, index_file=INDEX_FILE, manifest_file=MANIFEST_FILE):
+        self.index_file = index_file
+        # Index paths (/data/...) are relative to the directory above index.json's
+        self.public_dir = os.path.dirname(os.path.dirname(os.path.abspath(index_file)))
+        self.manifest_file = manifest_file
+        self.files_written = 0
+        self.files_skipped = 0
+        self.stats_recomputed = 0
+        self.copies_dropped = 0
+
+        self._index_bytes = b''
+        entries = []
+        if os.path.exists(index_file):
+            with open(index_file, 'rb') as f:
+                self._index_bytes = f.read()
+            entries = json.loads(self._index_bytes)
+        # dicts keep insertion order, so the index order is preserved
+        self.entries = {e['id']: e for e in entries}
+
+        self.manifest = {"version": MANIFEST_VERSION, "files": {}}
+        if os.path.exists(manifest_file):
+            try:
+                with open(manifest_file, 'r') as f:
+                    manifest = json.load(f)
+                if manifest.get('version') == MANIFEST_VERSION:
+                    self.manifest = manifest
+            except (OSError, ValueError):
+                pass  # A broken manifest just means everything is rechecked
+        self._manifest_dirty = False
+
+    # -- synthesis files -------------------------------------------------
+
+    def path(self, relative_path):
+        """Filesystem path of an index path, next to this store's index.json."""
+        return public_path(relative_path, self.public_dir)
+
+    def _stat_matches(self, path, record):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        return record.get('size') == st.st_size and record.get('mtime_ns') == st.st_mtime_ns
+
+    def _remember(self, relative_path, path, digest, stats):
+        st = os.stat(path)
+        self.manifest['files'][relative_path] = {
+            "sha256": digest,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "stats": stats,
+        }
+        self._manifest_dirty = True
+
+    def write_synthesis(self, relative_path, synthesis):
+        """Write a synthesis file unless its bytes are unchanged. Returns its stats."""
+        path = self.path(relative_path)
+        data = dump_json_bytes(synthesis)
+        digest = sha256_bytes(data)
+        record = self.manifest['files'].get(relative_path)
+
+        if record and record['sha256'] == digest and self._stat_matches(path, record):
+            self.files_skipped += 1
+            return record['stats']
+
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                unchanged = f.read() == data
+        else:
+            unchanged = False
+
+        if unchanged:
+            self.files_skipped += 1
+        else:
+            atomic_write_bytes(path, data)
+            self.files_written += 1
+        stats = synthesis_stats(synthesis)
+        self._remember(relative_path, path, digest, stats)
+        return stats
+
+    def file_stats(self, relative_path):
+        """Stats for a synthesis file, recomputed only if its contents changed."""
+        path = self.path(relative_path)
+        record = self.manifest['files'].get(relative_path)
+        if record and self._stat_matches(path, record):
+            return record['stats']
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = sha256_bytes(data)
+        if record and record['sha256'] == digest:
+            # Touched but not modified: just refresh the stat fingerprint
+            stats = record['stats']
+        else:
+            stats = synthesis_stats(json.loads(data))
+            self.stats_recomputed += 1
+        self._remember(relative_path, path, digest, stats)
+        return stats
+
+    def file_digest(self, relative_path):
+        """SHA-256 of a synthesis file, from the manifest while its size and mtime match."""
+        record = self.manifest['files'].get(relative_path)
+        if record and self._stat_matches(self.path(relative_path), record):
+            return record['sha256']
+        return file_digest(relative_path, self.public_dir)
+
+    def forget(self, relative_path):
+        """Drop the manifest record of a synthesis file that was deleted."""
+        if self.manifest['files'].pop(relative_path, None) is not None:
+            self._manifest_dirty = True
+
+    # -- index entries ---------------------------------------------------
+
+    def upsert(self, entry, stats=None):
+        """Insert or replace an entry by id, keeping its position if it already exists."""
+        entry = dict(entry)
+        if stats is not None:
+            entry.update(stats)
+        self.entries[entry['id']] = entry
+
+    def remove_where(self, predicate):
+        for entry_id in [i for i, e in self.entries.items() if predicate(e)]:
+            del self.entries[entry_id]
+
+    def replace_under(self, path_prefix, entries):
+        """Make `entries` the complete set of index entries whose path starts with `path_prefix`."""
+        keep = {e['id'] for e in entries}
+        self.remove_where(lambda e: e.get('path', '').startswith(path_prefix) and e['id'] not in keep)
+        for entry in entries:
+            self.upsert(entry)
+
+    def refresh_stats(self):
+        """Bring step_count (and other stats) up to date for every entry with a file."""
+        updated = 0
+        for entry in self.entries.values():
+            relative_path = entry.get('path')
+            if not relative_path or not os.path.exists(self.path(relative_path)):
+                continue
+            try:
+                stats = self.file_stats(relative_path)
+            except (OSError, ValueError) as e:
+                print(f"Error processing {relative_path}: {e}")
+                continue
+            for key, value in stats.items():
+                if entry.get(key) != value:
+                    entry[key] = value
+                    updated += 1
+        return updated
+
+    def index_changed_on_disk(self):
+        """True if index.json was edited by someone else since it was loaded or saved."""
+        data = b''
+        if os.path.exists(self.index_file):
+            with open(self.index_file, 'rb') as f:
+                data = f.read()
+        return data.rstrip(b'\n') != self._index_bytes.rstrip(b'\n')
+
+    def save(self):
+        """Write index.json (only if changed) and the manifest. Returns True if the index changed.
+
+        Packed and compact copies of files that changed are dropped as
+        well, so the client never serves an outdated route.
+        """
+        data = dump_json_bytes(list(self.entries.values()))
+        # Hand-edited copies often end with a newline; that alone isn't a change
+        changed = data != self._index_bytes.rstrip(b'\n')
+        if changed:
+            atomic_write_bytes(self.index_file, data)
+            self._index_bytes = data
+        if self._manifest_dirty:
+            atomic_write_bytes(self.manifest_file, json.dumps(self.manifest).encode('utf-8'))
+            self._manifest_dirty = False
+        self.copies_dropped = drop_stale_copies(self.file_digest, os.path.dirname(self.index_file))
+        return changed
+
+
+def main():
+    store = IndexStore()
+    updated = store.refresh_stats()
+    changed = store.save()
+    print(f"Recomputed stats for {store.stats_recomputed} changed files; "
+          f"updated {updated} index fields; index.json {'written' if changed else 'unchanged'}.")
+    if store.copies_dropped:
+        print(f"Dropped {store.copies_dropped} outdated packed/compact copies; "
+              f"re-run data:bundle / data:molecules to restore them.")
+
+
+if __name__ == "__main__":
+    main()
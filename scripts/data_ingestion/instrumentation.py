@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""Stage timers, counters and peak memory for the ingestion scripts.
+
+Scripts record into the module-level PROFILER:
+
+    with stage('map'):
+        ...
+    count('reactions_kept')
+
+Recording is always on (a perf_counter call per stage entry is noise next
+to protobuf parsing); it is only reported when a script is run with
+--profile, which prints a JSON report to stderr (so it doesn't mix with the
+scripts' progress output on stdout) or writes it to a file:
+
+    python fetch_real_ord_data.py --profile run.json
+    python fetch_real_ord_data.py --profile --profile-stage parse --profile-dump parse.prof
+
+--profile-stage runs cProfile only while the named (hot) stage is active
+and --profile-dump writes the stats for `python -m pstats` / snakeviz.
+
+Stage times are inclusive: time in a stage nested inside another counts
+towards both. Work done in pool workers is merged into the parent's
+report (so stage times there are summed over workers), but cProfile only
+sees the parent process; use --workers 1 when profiling a search.
+"""
+
+import sys
+import json
+import time
+import cProfile
+import resource
+import contextlib
+
+REPORT_VERSION = 1
+
+
+def _rss_bytes(who):
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Profiler:
+    def __init__(self):
+        self.stages = {}      # name -> [seconds, calls]
+        self.counters = {}    # name -> int
+        self.started = time.perf_counter()
+        self.profile_stage = None
+        self._cprofile = None
+        self._cprofile_depth = 0
+
+    def enable_cprofile(self, stage_name):
+        self.profile_stage = stage_name
+        self._cprofile = cProfile.Profile()
+
+    def dump_cprofile(self, path):
+        """Write the stats cProfile collected to `path`. Returns False if it wasn't enabled."""
+        if self._cprofile is None:
+            return False
+        self._cprofile.dump_stats(path)
+        return True
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        profiling = self._cprofile is not None and name == self.profile_stage
+        if profiling:
+            if self._cprofile_depth == 0:
+                self._cprofile.enable()
+            self._cprofile_depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            record = self.stages.get(name)
+            if record is None:
+                self.stages[name] = [elapsed, 1]
+            else:
+                record[0] += elapsed
+                record[1] += 1
+            if profiling:
+                self._cprofile_depth -= 1
+                if self._cprofile_depth == 0:
+                    self._cprofile.disable()
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def checkpoint(self):
+        """Snapshot to pass to `since`, e.g. around one unit of work in a pool worker."""
+        return {name: list(record) for name, record in self.stages.items()}, dict(self.counters)
+
+    def since(self, checkpoint):
+        """Stages and counters recorded after `checkpoint`, in a form `merge` accepts."""
+        stages, counters = checkpoint
+        delta_stages = {}
+        for name, (seconds, calls) in self.stages.items():
+            old_seconds, old_calls = stages.get(name, (0.0, 0))
+            if calls != old_calls:
+                delta_stages[name] = [seconds - old_seconds, calls - old_calls]
+        delta_counters = {name: value - counters.get(name, 0)
+                          for name, value in self.counters.items() if value != counters.get(name, 0)}
+        return {"stages": delta_stages, "counters": delta_counters}
+
+    def merge(self, delta):
+        """Fold in stages/counters recorded by another process."""
+        for name, (seconds, calls) in delta.get('stages', {}).items():
+            record = self.stages.setdefault(name, [0.0, 0])
+            record[0] += seconds
+            record[1] += calls
+        for name, value in delta.get('counters', {}).items():
+            self.count(name, value)
+
+    def report(self):
+        return {
+            "version": REPORT_VERSION,
+            "wall_seconds": time.perf_counter() - self.started,
+            "stages": {name: {"seconds": seconds, "calls": calls}
+                       for name, (seconds, calls) in self.stages.items()},
+            "counters": dict(self.counters),
+            "peak_rss_bytes": _rss_bytes(resource.RUSAGE_SELF),
+            "peak_rss_children_bytes": _rss_bytes(resource.RUSAGE_CHILDREN),
+        }
+
+
+PROFILER = Profiler()
+
+
+def stage(name):
+    return PROFILER.stage(name)
+
+
+def count(name, n=1):
+    PROFILER.count(name, n)
+
+
+def add_profile_arguments(parser):
+    parser.add_argument("--profile", nargs="?", const="-", metavar="PATH",
+                        help="Emit stage timings, counters and peak memory as JSON (stderr if no PATH)")
+    parser.add_argument("--profile-stage", metavar="STAGE",
+                        help="Run cProfile while this stage is active")
+    parser.add_argument("--profile-dump", metavar="PATH",
+                        help="Where to write the cProfile stats (default: <stage>.prof)")
+
+
+def start_profiling(args):
+    """Call after parse_args()."""
+    if args.profile_stage:
+        PROFILER.enable_cprofile(args.profile_stage)
+
+
+def finish_profiling(args):
+    """Call at the end of main(): writes whatever --profile options asked for."""
+    if args.profile_stage:
+        dump_path = args.profile_dump or f"{args.profile_stage}.prof"
+        if PROFILER.dump_cprofile(dump_path):
+            print(f"Wrote cProfile stats for stage '{args.profile_stage}' to {dump_path}")
+    if args.profile:
+        report = json.dumps(PROFILER.report(), indent=4)
+        if args.profile == '-':
+            print(report, file=sys.stderr)
+        else:
+            with open(args.profile, 'w') as f:
+                f.write(report)
+            print(f"Wrote profile to {args.profile}")
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""Resumable, checksum-verified downloads of ORD dataset shards.
+
+Every download goes through a content-addressed cache:
+
+  1. bytes stream into <cache>/partial/<dataset_id>.pb.gz.part; an
+     interrupted transfer is resumed with an HTTP Range request. A transfer
+     only counts as finished when the .part file has the full length
+     (Content-Length of a 200, the total of a 206's Content-Range, or the
+     size in ord_manifest.json); a connection that closes early leaves
+     the .part file to be resumed,
+  2. the finished file is checked against the SHA-256 recorded in
+     ord_manifest.json (first downloads are recorded there instead),
+  3. it is renamed atomically to <cache>/sha256/<ab>/<digest>.pb.gz,
+  4. and linked (or copied) atomically to <dest>/<dataset_id>.pb.gz.
+
+A dataset whose verified object is already in the cache is never fetched
+again, and a truncated file at the destination is no longer mistaken for
+a finished download.
+
+Usage:
+    python ord_downloader.py DATASET_ID [DATASET_ID ...] [--jobs 4] [--dest DIR]
+    python ord_downloader.py --ids-file ids.txt --base-url http://localhost:8000
+"""
+
+import os
+import json
+import re
+import shutil
+import hashlib
+import argparse
+import threading
+import http.client
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MANIFEST_FILE = os.path.join(SCRIPT_DIR, 'ord_manifest.json')
+CACHE_DIR = os.path.join(SCRIPT_DIR, '.ord_cache')
+# ord-data keeps each dataset under data/<first two hex digits of its id>/
+BASE_URL = "https://github.com/Open-Reaction-Database/ord-data/raw/main/data"
+CHUNK_SIZE = 1 << 20
+DEFAULT_JOBS = 4
+DEFAULT_RETRIES = 3
+TIMEOUT = 60
+CONTENT_RANGE_PATTERN = re.compile(r'bytes\s+(?:\d+-\d+|\*)/(\d+)')
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+class IncompleteDownload(Exception):
+    """The transfer ended before the whole file arrived (or its length is unknown)."""
+
+
+def dataset_url(dataset_id, base_url=BASE_URL):
+    shard = dataset_id.split('-', 1)[-1][:2]
+    return f"{base_url.rstrip('/')}/{shard}/{dataset_id}.pb.gz"
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _place(src, dest):
+    """Atomically make `dest` a copy of `src`, hard-linking when possible."""
+    os.makedirs(os.path.dirname(dest) or '.', exist_ok=True)
+    tmp = f"{dest}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dest)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class Downloader:
+    """Downloads datasets into a content-addressed cache, verified by SHA-256."""
+
+    def __init__(self, manifest_file=MANIFEST_FILE, cache_dir=CACHE_DIR, base_url=BASE_URL,
+                 retries=DEFAULT_RETRIES, timeout=TIMEOUT):
+        self.manifest_file = manifest_file
+        self.cache_dir = cache_dir
+        self.base_url = base_url
+        self.retries = retries
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.manifest = {}
+        if os.path.exists(manifest_file):
+            with open(manifest_file, 'r') as f:
+                self.manifest = json.load(f)
+
+    def object_path(self, digest):
+        return os.path.join(self.cache_dir, 'sha256', digest[:2], f"{digest}.pb.gz")
+
+    def _partial_path(self, dataset_id):
+        return os.path.join(self.cache_dir, 'partial', f"{dataset_id}.pb.gz.part")
+
+    def _record(self, dataset_id, digest, size):
+        with self._lock:
+            self.manifest[dataset_id] = {"sha256": digest, "size": size}
+            data = json.dumps(self.manifest, indent=4, sort_keys=True).encode('utf-8')
+            tmp = f"{self.manifest_file}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self.manifest_file)
+
+    def _transfer(self, url, part_path):
+        """Fetch `url` into `part_path`, resuming from whatever is already there.
+
+        Returns the full size of the file as the server reported it, or None
+        if it didn't say (a chunked response is complete when it returns,
+        since http.client raises on a truncated one).
+        """
+        os.makedirs(os.path.dirname(part_path), exist_ok=True)
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {'Range': f"bytes={offset}-"} if offset else {}
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 416 and offset:
+                # Range starts at EOF: the partial file may already be complete
+                match = CONTENT_RANGE_PATTERN.match(e.headers.get('Content-Range', ''))
+                return int(match.group(1)) if match else None
+            raise
+        with response:
+            # A server that ignores Range sends the whole file with a 200
+            resumed = offset and response.status == 206
+            if resumed:
+                match = CONTENT_RANGE_PATTERN.match(response.headers.get('Content-Range', ''))
+                total = int(match.group(1)) if match else None
+            else:
+                length = response.headers.get('Content-Length')
+                total = int(length) if length is not None else None
+            with open(part_path, 'ab' if resumed else 'wb') as f:
+                shutil.copyfileobj(response, f, CHUNK_SIZE)
+            if total is None and response.chunked:
+                total = os.path.getsize(part_path)
+        return total
+
+    def _check_length(self, dataset_id, part_path, total):
+        """Make sure the .part file is exactly as long as the file. Returns its size."""
+        size = os.path.getsize(part_path)
+        recorded = self.manifest.get(dataset_id, {}).get('size')
+        expected = recorded if recorded is not None else total
+        if expected is None:
+            raise IncompleteDownload(f"{dataset_id}: the server didn't report the file's length")
+        if size > expected:
+            # Can't be resumed from; start over
+            os.remove(part_path)
+            raise ChecksumMismatch(f"{dataset_id}: expected {expected} bytes, got {size}")
+        if size < expected:
+            raise IncompleteDownload(f"{dataset_id}: got {size} of {expected} bytes")
+        return size
+
+    def _adopt(self, dataset_id, path, expected, size):
+        """Verify `path` (`size` bytes, already confirmed) and move it into the cache.
+
+        Returns the cache object path.
+        """
+        digest = sha256_file(path)
+        if expected and digest != expected:
+            raise ChecksumMismatch(f"{dataset_id}: expected sha256 {expected}, got {digest}")
+        if not expected:
+            self._record(dataset_id, digest, size)
+        obj = self.object_path(digest)
+        os.makedirs(os.path.dirname(obj), exist_ok=True)
+        os.replace(path, obj)
+        return obj
+
+    def fetch(self, dataset_id, dest_dir):
+        """Make sure `dest_dir/<dataset_id>.pb.gz` exists and is verified. Returns its path."""
+        dest = os.path.join(dest_dir, f"{dataset_id}.pb.gz")
+        expected = self.manifest.get(dataset_id, {}).get('sha256')
+
+        # 1. Already cached and verified
+        if expected and os.path.exists(self.object_path(expected)):
+            if not (os.path.exists(dest) and os.path.samefile(dest, self.object_path(expected))):
+                _place(self.object_path(expected), dest)
+            return dest
+
+        # 2. A complete copy already sits at the destination
+        if os.path.exists(dest) and expected and sha256_file(dest) == expected:
+            obj = self.object_path(expected)
+            os.makedirs(os.path.dirname(obj), exist_ok=True)
+            _place(dest, obj)
+            return dest
+
+        # 3. Download (resuming), verify, cache, place
+        part_path = self._partial_path(dataset_id)
+        url = dataset_url(dataset_id, self.base_url)
+        last_error = None
+        for _ in range(self.retries):
+            try:
+                total = self._transfer(url, part_path)
+                size = self._check_length(dataset_id, part_path, total)
+                obj = self._adopt(dataset_id, part_path, expected, size)
+                _place(obj, dest)
+                return dest
+            except ChecksumMismatch:
+                # Corrupt bytes can't be resumed from; start over next time
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+                raise
+            except (OSError, urllib.error.URLError, http.client.HTTPException, IncompleteDownload) as e:
+                # The .part file is kept, so the next attempt resumes with Range
+                last_error = e
+        raise last_error
+
+    def fetch_all(self, dataset_ids, dest_dir, jobs=DEFAULT_JOBS):
+        """Download many datasets with at most `jobs` transfers at once.
+
+        Returns {dataset_id: path or Exception}.
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = {pool.submit(self.fetch, dataset_id, dest_dir): dataset_id for dataset_id in dataset_ids}
+            for done, future in enumerate(as_completed(futures), start=1):
+                dataset_id = futures[future]
+                try:
+                    results[dataset_id] = future.result()
+                    status = "ok"
+                except Exception as e:
+                    results[dataset_id] = e
+                    status = f"failed: {e}"
+                print(f"  [{done}/{len(futures)}] {dataset_id}: {status}")
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download ORD dataset shards with resume and SHA-256 checks.")
+    parser.add_argument("dataset_ids", nargs="*")
+    parser.add_argument("--ids-file", help="File with one dataset id per line")
+    parser.add_argument("--dest", default=SCRIPT_DIR)
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help="Concurrent transfers")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--manifest", default=MANIFEST_FILE)
+    args = parser.parse_args()
+
+    dataset_ids = list(args.dataset_ids)
+    if args.ids_file:
+        with open(args.ids_file, 'r') as f:
+            dataset_ids.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    if not dataset_ids:
+        parser.error("no dataset ids given")
+
+    downloader = Downloader(args.manifest, args.cache_dir, args.base_url)
+    results = downloader.fetch_all(dataset_ids, args.dest, jobs=args.jobs)
+    failed = [d for d, r in results.items() if isinstance(r, Exception)]
+    print(f"Downloaded {len(results) - len(failed)} of {len(results)} datasets")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
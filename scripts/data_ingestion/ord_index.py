@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""Columnar identifier index over ORD .pb.gz datasets.
+
+Building the index parses each shard once and keeps only the fields the
+ingestion scripts look at. Every column is a flat file that loads with a
+single read:
+
+    meta.json                  row count, shard list, byte order
+    <column>.txt               '\\n'-joined string values (UTF-8)
+    <column>.values            start offset of each value in the decoded text
+    <column>.rows              index of each row's first value
+    yield.f64, temperature.f64 one float per row, NaN when missing
+    shard.u32, position.u32    where each reaction lives in its shard
+
+String columns hold any number of values per row, so substring queries
+are a str.find over one big string followed by two bisects to map each hit
+back to its row.
+
+Usage:
+    python ord_index.py build [DATASET ...] [--out DIR]
+    python ord_index.py query [--index DIR] [--name TEXT] [--smiles TEXT] ...
+"""
+
+import os
+import sys
+import json
+import math
+import argparse
+from array import array
+from bisect import bisect_right
+from contextlib import closing
+
+from ord_reader import iter_reactions, find_dataset_files
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INDEX_DIR = os.path.join(SCRIPT_DIR, 'ord_index')
+INDEX_VERSION = 1
+
+STRING_COLUMNS = ['reaction_id', 'product_name', 'product_smiles', 'reactant_name', 'reactant_smiles']
+FLOAT_COLUMNS = ['yield', 'temperature']
+NAME_COLUMNS = {'product': 'product_name', 'reactant': 'reactant_name'}
+SMILES_COLUMNS = {'product': 'product_smiles', 'reactant': 'reactant_smiles'}
+
+# 'L' is 4 or 8 bytes depending on platform; 'Q'/'I' are 8/4 bytes everywhere we run
+OFFSET_TYPE = 'Q'
+U32_TYPE = 'I'
+
+
+class _StringColumnWriter:
+    def __init__(self, directory, name):
+        self.text = open(os.path.join(directory, f"{name}.txt"), 'w', encoding='utf-8', newline='\n')
+        self.directory = directory
+        self.name = name
+        self.value_starts = array(OFFSET_TYPE, [0])
+        self.row_starts = array(OFFSET_TYPE, [0])
+        self.position = 0
+
+    def add_row(self, values):
+        for value in values:
+            value = value.replace('\n', ' ')
+            self.text.write(value)
+            self.text.write('\n')
+            self.position += len(value) + 1
+            self.value_starts.append(self.position)
+        self.row_starts.append(len(self.value_starts) - 1)
+
+    def close(self):
+        self.text.close()
+        with open(os.path.join(self.directory, f"{self.name}.values"), 'wb') as f:
+            self.value_starts.tofile(f)
+        with open(os.path.join(self.directory, f"{self.name}.rows"), 'wb') as f:
+            self.row_starts.tofile(f)
+
+
+def _read_array(path, typecode, swap):
+    values = array(typecode)
+    with open(path, 'rb') as f:
+        values.frombytes(f.read())
+    if swap:
+        values.byteswap()
+    return values
+
+
+def extract_index_row(reaction):
+    """Pull the indexed fields out of one ORD Reaction."""
+    from ord_schema.proto import reaction_pb2
+    NAME = reaction_pb2.CompoundIdentifier.NAME
+    SMILES = reaction_pb2.CompoundIdentifier.SMILES
+
+    row = {column: [] for column in STRING_COLUMNS}
+    row['reaction_id'] = [reaction.reaction_id]
+    row['yield'] = math.nan
+    row['temperature'] = math.nan
+
+    for outcome_index, outcome in enumerate(reaction.outcomes):
+        for product_index, product in enumerate(outcome.products):
+            for ident in product.identifiers:
+                if ident.type == NAME:
+                    row['product_name'].append(ident.value)
+                elif ident.type == SMILES:
+                    row['product_smiles'].append(ident.value)
+            # Same yield the importer uses: first YIELD on the first product
+            if outcome_index == 0 and product_index == 0:
+                for m in product.measurements:
+                    if m.type == reaction_pb2.ProductMeasurement.YIELD:
+                        row['yield'] = m.percentage.value
+                        break
+
+    for input_key in reaction.inputs:
+        for comp in reaction.inputs[input_key].components:
+            for ident in comp.identifiers:
+                if ident.type == NAME:
+                    row['reactant_name'].append(ident.value)
+                elif ident.type == SMILES:
+                    row['reactant_smiles'].append(ident.value)
+
+    if reaction.conditions.temperature.HasField('setpoint'):
+        row['temperature'] = reaction.conditions.temperature.setpoint.value
+    return row
+
+
+def build_index(pb_files, out_dir=DEFAULT_INDEX_DIR):
+    """Parse every shard once and write the columnar index to `out_dir`."""
+    os.makedirs(out_dir, exist_ok=True)
+    writers = {column: _StringColumnWriter(out_dir, column) for column in STRING_COLUMNS}
+    floats = {column: array('d') for column in FLOAT_COLUMNS}
+    shard_col = array(U32_TYPE)
+    position_col = array(U32_TYPE)
+
+    try:
+        for shard_index, pb_file in enumerate(pb_files):
+            print(f"Indexing {os.path.basename(pb_file)}...")
+            with closing(iter_reactions(pb_file)) as stream:
+                for position, reaction in enumerate(stream):
+                    row = extract_index_row(reaction)
+                    for column in STRING_COLUMNS:
+                        writers[column].add_row(row[column])
+                    for column in FLOAT_COLUMNS:
+                        floats[column].append(row[column])
+                    shard_col.append(shard_index)
+                    position_col.append(position)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    for column, values in floats.items():
+        with open(os.path.join(out_dir, f"{column}.f64"), 'wb') as f:
+            values.tofile(f)
+    for name, values in (('shard', shard_col), ('position', position_col)):
+        with open(os.path.join(out_dir, f"{name}.u32"), 'wb') as f:
+            values.tofile(f)
+
+    meta = {
+        "version": INDEX_VERSION,
+        "byteorder": sys.byteorder,
+        "rows": len(shard_col),
+        "shards": [os.path.basename(p) for p in pb_files],
+    }
+    with open(os.path.join(out_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=4)
+    print(f"Indexed {meta['rows']} reactions from {len(pb_files)} datasets into {out_dir}")
+    return meta
+
+
+class _StringColumn:
+    def __init__(self, directory, name, swap):
+        with open(os.path.join(directory, f"{name}.txt"), 'r', encoding='utf-8', newline='\n') as f:
+            self.text = f.read()
+        self.value_starts = _read_array(os.path.join(directory, f"{name}.values"), OFFSET_TYPE, swap)
+        self.row_starts = _read_array(os.path.join(directory, f"{name}.rows"), OFFSET_TYPE, swap)
+        self._folded = None
+
+    def values(self, row):
+        first, last = self.row_starts[row], self.row_starts[row + 1]
+        return [self.text[self.value_starts[i]:self.value_starts[i + 1] - 1] for i in range(first, last)]
+
+    def find(self, needle, ignore_case=False):
+        """Yield (row, value) for every value containing `needle`."""
+        if not needle or '\n' in needle:
+            return
+        haystack = self.text
+        if ignore_case:
+            if self._folded is None:
+                self._folded = self.text.lower()
+            haystack, needle = self._folded, needle.lower()
+            if len(haystack) != len(self.text):
+                # Some characters change length when lowercased, so offsets
+                # no longer line up; fall back to checking value by value.
+                yield from self._find_slow(needle)
+                return
+        pos = haystack.find(needle)
+        while pos != -1:
+            value_index = bisect_right(self.value_starts, pos) - 1
+            start, end = self.value_starts[value_index], self.value_starts[value_index + 1] - 1
+            row = bisect_right(self.row_starts, value_index) - 1
+            yield row, self.text[start:end]
+            # Values only match once each; jump to the next one
+            pos = haystack.find(needle, end + 1)
+
+    def items(self):
+        """Yield (row, value) for every value, in row order."""
+        row = 0
+        for value_index in range(len(self.value_starts) - 1):
+            while self.row_starts[row + 1] <= value_index:
+                row += 1
+            yield row, self.text[self.value_starts[value_index]:self.value_starts[value_index + 1] - 1]
+
+    def _find_slow(self, folded_needle):
+        for row, value in self.items():
+            if folded_needle in value.lower():
+                yield row, value
+
+
+class OrdIndex:
+    """Read-only view over an index directory written by build_index()."""
+
+    def __init__(self, directory=DEFAULT_INDEX_DIR):
+        with open(os.path.join(directory, 'meta.json'), 'r') as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != INDEX_VERSION:
+            raise ValueError(f"Unsupported index version in {directory}; rebuild it")
+        swap = self.meta['byteorder'] != sys.byteorder
+        self.directory = directory
+        self.rows = self.meta['rows']
+        self.shards = self.meta['shards']
+        self.strings = {name: _StringColumn(directory, name, swap) for name in STRING_COLUMNS}
+        self.floats = {name: _read_array(os.path.join(directory, f"{name}.f64"), 'd', swap)
+                       for name in FLOAT_COLUMNS}
+        self.shard = _read_array(os.path.join(directory, 'shard.u32'), U32_TYPE, swap)
+        self.position = _read_array(os.path.join(directory, 'position.u32'), U32_TYPE, swap)
+
+    def __len__(self):
+        return self.rows
+
+    def reaction_id(self, row):
+        return self.strings['reaction_id'].values(row)[0]
+
+    def record(self, row):
+        """Return the indexed fields for one row as a dict."""
+        rec = {name: col.values(row) for name, col in self.strings.items()}
+        rec['reaction_id'] = rec['reaction_id'][0]
+        for name, values in self.floats.items():
+            value = values[row]
+            rec[name] = None if math.isnan(value) else value
+        rec['dataset'] = self.shards[self.shard[row]]
+        rec['position'] = self.position[row]
+        return rec
+
+    def find_values(self, column, needle, ignore_case=False):
+        """Yield (row, value) pairs where a value of `column` contains `needle`."""
+        return self.strings[column].find(needle, ignore_case=ignore_case)
+
+    def column_values(self, column):
+        """Yield (row, value) for every value of `column`, in row order."""
+        return self.strings[column].items()
+
+    def _rows_containing(self, columns, needle, ignore_case):
+        rows = set()
+        for column in columns:
+            rows.update(row for row, _ in self.find_values(column, needle, ignore_case))
+        return rows
+
+    def _rows_in_range(self, column, bounds, candidates):
+        low, high = bounds
+        low = -math.inf if low is None else low
+        high = math.inf if high is None else high
+        values = self.floats[column]
+        # NaN (missing) never satisfies a comparison, so it is excluded
+        return [row for row in candidates if low <= values[row] <= high]
+
+    def query(self, name_contains=None, smiles_contains=None, role=None,
+              yield_range=None, temperature_range=None, limit=None):
+        """Return matching records, in index order.
+
+        name_contains is case-insensitive; smiles_contains is exact. `role`
+        restricts text filters to 'product' or 'reactant' identifiers.
+        Ranges are (low, high) tuples, inclusive, with None for an open end.
+        """
+        roles = [role] if role else ['product', 'reactant']
+        candidates = None
+        if name_contains:
+            candidates = self._rows_containing([NAME_COLUMNS[r] for r in roles], name_contains, True)
+        if smiles_contains:
+            rows = self._rows_containing([SMILES_COLUMNS[r] for r in roles], smiles_contains, False)
+            candidates = rows if candidates is None else candidates & rows
+        candidates = range(self.rows) if candidates is None else sorted(candidates)
+
+        if yield_range:
+            candidates = self._rows_in_range('yield', yield_range, candidates)
+        if temperature_range:
+            candidates = self._rows_in_range('temperature', temperature_range, candidates)
+
+        records = []
+        for row in candidates:
+            if limit is not None and len(records) >= limit:
+                break
+            records.append(self.record(row))
+        return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the ORD identifier index.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help="Index ORD .pb.gz datasets")
+    build.add_argument('paths', nargs='*', default=[SCRIPT_DIR],
+                       help="Dataset files or directories (searched recursively)")
+    build.add_argument('--out', default=DEFAULT_INDEX_DIR)
+
+    query = sub.add_parser('query', help="Query an existing index")
+    query.add_argument('--index', default=DEFAULT_INDEX_DIR)
+    query.add_argument('--name', help="Case-insensitive substring of a NAME identifier")
+    query.add_argument('--smiles', help="Substring of a SMILES identifier")
+    query.add_argument('--role', choices=['product', 'reactant'])
+    query.add_argument('--yield-min', type=float)
+    query.add_argument('--yield-max', type=float)
+    query.add_argument('--temp-min', type=float)
+    query.add_argument('--temp-max', type=float)
+    query.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build_index(find_dataset_files(args.paths), args.out)
+        return
+
+    index = OrdIndex(args.index)
+    yield_range = (args.yield_min, args.yield_max) if args.yield_min is not None or args.yield_max is not None else None
+    temp_range = (args.temp_min, args.temp_max) if args.temp_min is not None or args.temp_max is not None else None
+    records = index.query(name_contains=args.name, smiles_contains=args.smiles, role=args.role,
+                          yield_range=yield_range, temperature_range=temp_range, limit=args.limit)
+    for rec in records:
+        print(json.dumps(rec))
+    print(f"{len(records)} reactions", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""Fill in missing yields/conditions of curated steps from matching ORD reactions.
+
+Planned in SYNTHESIS_IMPORT_STRATEGY.md (Phase 3). Rather than scanning
+the ORD data once per step, every step in public/data/**/*.json is
+matched in a single pass:
+
+  1. collect the steps whose `yield` or `conditions` is missing, empty or
+     "???" and key them by (reactant, product) canonical SMILES pairs, one
+     pair per dot-separated fragment on each side. Only the main product
+     is keyed: the product fragments that aren't also reactants (or the
+     largest one), and spectators -- fragments of at most
+     SPECTATOR_MAX_ATOMS heavy atoms such as water, HCl or counter-ions --
+     are never keyed, since every other reaction shares them,
+  2. stream the ORD shards once; a reaction whose main product hits the
+     wanted product keys has its reactant fragments checked against the
+     same pairs, so only candidate reactions are mapped,
+  3. join: each step takes the best matching ORD reaction (one reporting
+     a yield first, then one reporting conditions) and gets only the
+     fields that were missing.
+
+Curated files keep their formatting (indent=4, unescaped unicode) and are
+only rewritten when a step actually changed.
+
+Usage:
+    python ord_matcher.py [DATASET ...] [--dry-run]
+"""
+
+import os
+import json
+import argparse
+from contextlib import closing
+
+from ord_reader import iter_reactions, find_dataset_files
+from smiles_utils import canonical_smiles, heavy_atom_count
+from index_store import DATA_DIR, atomic_write_bytes, drop_stale_copies, find_synthesis_files
+from route_builder import _role_smiles
+from fetch_real_ord_data import map_reaction
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MISSING_VALUES = {'', '???'}
+# What map_reaction reports when ORD has nothing for a field
+ORD_NO_YIELD = "N/A"
+ORD_NO_CONDITIONS = "Standard Conditions"
+# Fragments this small (water, HCl, Na+, MeOH, ...) don't tell reactions apart
+SPECTATOR_MAX_ATOMS = 3
+
+
+def is_missing(value):
+    return value is None or (isinstance(value, str) and value.strip() in MISSING_VALUES)
+
+
+def fragment_keys(smiles):
+    """Canonical keys for each dot-separated fragment of a SMILES string."""
+    if is_missing(smiles):
+        return set()
+    keys = set()
+    for fragment in smiles.split('.'):
+        key = canonical_smiles(fragment) if fragment.strip() else None
+        if key:
+            keys.add(key)
+    return keys
+
+
+def fragment_size(key):
+    try:
+        return heavy_atom_count(key)
+    except ValueError:
+        return 0
+
+
+def significant_keys(keys):
+    """`keys` without the spectator fragments."""
+    return {key for key in keys if fragment_size(key) > SPECTATOR_MAX_ATOMS}
+
+
+def main_product_keys(product_keys, reactant_keys):
+    """The product fragments that identify a reaction: the new ones, else the largest."""
+    formed = significant_keys(product_keys - reactant_keys)
+    if formed:
+        return formed
+    return significant_keys({max(product_keys, key=fragment_size)}) if product_keys else set()
+
+
+class StepTable:
+    """Curated steps that need data, keyed by (reactant key, product key)."""
+
+    def __init__(self):
+        self.documents = {}     # path -> parsed synthesis
+        self.pairs = {}         # (reactant key, product key) -> [(path, step index), ...]
+        self.products = set()   # every product key in `pairs`
+        self.steps_total = 0
+        self.steps_wanting = 0
+        self.steps_unkeyed = 0
+
+    def add_file(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            synthesis = json.load(f)
+        sequence = synthesis.get('sequence') if isinstance(synthesis, dict) else None
+        if not isinstance(sequence, list):
+            return
+        self.documents[path] = synthesis
+        for step_index, step in enumerate(sequence):
+            self.steps_total += 1
+            if not (is_missing(step.get('yield')) or is_missing(step.get('conditions'))):
+                continue
+            self.steps_wanting += 1
+            all_reactants = fragment_keys(step.get('reactant_smiles'))
+            reactants = significant_keys(all_reactants)
+            products = main_product_keys(fragment_keys(step.get('product_smiles')), all_reactants)
+            if not reactants or not products:
+                self.steps_unkeyed += 1
+                continue
+            for product in products:
+                self.products.add(product)
+                for reactant in reactants:
+                    self.pairs.setdefault((reactant, product), []).append((path, step_index))
+
+
+def match_score(mapped_step):
+    return (mapped_step['yield'] != ORD_NO_YIELD, mapped_step['conditions'] != ORD_NO_CONDITIONS)
+
+
+def scan_ord(pb_files, table):
+    """One pass over the shards. Returns {(path, step index): (reaction_id, mapped step)}."""
+    best = {}
+    reactions_seen = 0
+    candidates = 0
+    for pb_file in pb_files:
+        print(f"Scanning {os.path.basename(pb_file)}...")
+        with closing(iter_reactions(pb_file)) as stream:
+            for reaction in stream:
+                reactions_seen += 1
+                reactants, products = _role_smiles(reaction)
+                all_reactant_keys = {k for s in reactants for k in fragment_keys(s)}
+                product_keys = {k for s in products for k in fragment_keys(s)}
+                product_keys = main_product_keys(product_keys, all_reactant_keys) & table.products
+                if not product_keys:
+                    continue
+                reactant_keys = significant_keys(all_reactant_keys)
+                steps = {ref for r in reactant_keys for p in product_keys
+                         for ref in table.pairs.get((r, p), ())}
+                if not steps:
+                    continue
+                candidates += 1
+                mapped = map_reaction(reaction)
+                if mapped is None:
+                    continue
+                mapped_step = mapped['sequence'][0]
+                for ref in steps:
+                    current = best.get(ref)
+                    if current is None or match_score(mapped_step) > match_score(current[1]):
+                        best[ref] = (reaction.reaction_id, mapped_step)
+    print(f"Scanned {reactions_seen} ORD reactions; {candidates} matched a curated step")
+    return best
+
+
+def apply_matches(table, best):
+    """Copy ORD values into missing fields. Returns (changed paths, counts)."""
+    counts = {"yield": 0, "conditions": 0}
+    changed = set()
+    for (path, step_index), (reaction_id, mapped_step) in sorted(best.items()):
+        step = table.documents[path]['sequence'][step_index]
+        filled = []
+        if is_missing(step.get('yield')) and mapped_step['yield'] != ORD_NO_YIELD:
+            step['yield'] = mapped_step['yield']
+            filled.append('yield')
+        if is_missing(step.get('conditions')) and mapped_step['conditions'] != ORD_NO_CONDITIONS:
+            step['conditions'] = mapped_step['conditions']
+            filled.append('conditions')
+        if not filled:
+            continue
+        for field in filled:
+            counts[field] += 1
+        note = f"{' and '.join(filled).capitalize()} from ORD {reaction_id}"
+        step['notes'] = f"{step['notes']} ({note})" if step.get('notes') else note
+        changed.add(path)
+    return changed, counts
+
+
+def write_curated(path, synthesis):
+    # Same layout as the hand-curated files: indent=4, unicode kept
+    data = json.dumps(synthesis, indent=4, ensure_ascii=False).encode('utf-8')
+    atomic_write_bytes(path, data)
+
+
+def enrich(pb_files, data_dir=DATA_DIR, dry_run=False):
+    table = StepTable()
+    for path in find_synthesis_files(data_dir):
+        try:
+            table.add_file(path)
+        except (OSError, ValueError) as e:
+            print(f"Error reading {path}: {e}")
+    print(f"{table.steps_total} steps in {len(table.documents)} files; {table.steps_wanting} missing "
+          f"yield or conditions ({table.steps_unkeyed} without usable SMILES)")
+    if not table.pairs:
+        return {}
+
+    best = scan_ord(pb_files, table)
+    changed, counts = apply_matches(table, best)
+    if not dry_run:
+        for path in sorted(changed):
+            write_curated(path, table.documents[path])
+        if changed:
+            drop_stale_copies(data_dir=data_dir)
+
+    stats = {
+        "steps": table.steps_total,
+        "steps_missing_data": table.steps_wanting,
+        "steps_matched": len(best),
+        "yields_filled": counts['yield'],
+        "conditions_filled": counts['conditions'],
+        "files_changed": len(changed),
+    }
+    print(f"Matched {stats['steps_matched']} of {table.steps_wanting} steps; filled "
+          f"{counts['yield']} yields and {counts['conditions']} conditions in {len(changed)} files"
+          f"{' (dry run, nothing written)' if dry_run else ''}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill missing yields/conditions from matching ORD reactions.")
+    parser.add_argument("paths", nargs="*", default=[SCRIPT_DIR],
+                        help="Dataset files or directories (searched recursively)")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--dry-run", action="store_true", help="Report matches without writing files")
+    args = parser.parse_args()
+
+    enrich(find_dataset_files(args.paths), args.data_dir, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""Random access to ORD reactions by reaction_id, through mmap.
+
+Looking at one reaction in a .pb.gz shard means gunzipping and walking
+everything before it. `convert` does that once per shard and keeps the
+result uncompressed next to a sorted id index:
+
+    <store>/<dataset>/meta.json      reaction count, byte order, source size/mtime
+    <store>/<dataset>/reactions.bin  the serialized Reactions, back to back
+    <store>/<dataset>/records.u64    start of each reaction in reactions.bin
+                                     (shard order, plus the end offset)
+    <store>/<dataset>/ids.txt        reaction_ids, sorted, '\\n'-terminated
+    <store>/<dataset>/ids.u64        start of each id in ids.txt (plus the end)
+    <store>/<dataset>/order.u32      shard position of each sorted id
+
+Every file is opened with mmap, so a lookup is two binary searches' worth
+of page touches and a parse of the reaction's bytes straight out of the
+mapping. Nothing is read up front, and any number of processes reading
+the same store share one copy in the page cache.
+
+Usage:
+    python ord_store.py convert [DATASET ...] [--store DIR]
+    python ord_store.py get REACTION_ID [...] [--store DIR] [--full-parse]
+"""
+
+import os
+import sys
+import json
+import mmap
+import argparse
+from array import array
+from contextlib import closing
+
+from ord_reader import iter_reaction_bytes, find_dataset_files
+from ord_wire import decode_reaction, read_reaction_id
+from ord_index import OFFSET_TYPE, U32_TYPE
+from index_store import atomic_open
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_STORE_DIR = os.path.join(SCRIPT_DIR, 'ord_store')
+STORE_VERSION = 1
+DATASET_SUFFIX = '.pb.gz'
+
+
+def dataset_name(pb_file):
+    name = os.path.basename(pb_file)
+    return name[:-len(DATASET_SUFFIX)] if name.endswith(DATASET_SUFFIX) else name
+
+
+def _source_stamp(pb_file):
+    st = os.stat(pb_file)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _write_array(path, values):
+    with atomic_open(path) as f:
+        values.tofile(f)
+
+
+def is_converted(pb_file, store_dir=DEFAULT_STORE_DIR):
+    """True if `pb_file` already has an up-to-date store."""
+    meta_path = os.path.join(store_dir, dataset_name(pb_file), 'meta.json')
+    if not os.path.exists(meta_path):
+        return False
+    with open(meta_path, 'r') as f:
+        meta = json.load(f)
+    return (meta.get('version') == STORE_VERSION and meta.get('byteorder') == sys.byteorder
+            and meta.get('source') == _source_stamp(pb_file))
+
+
+def convert_shard(pb_file, store_dir=DEFAULT_STORE_DIR):
+    """Decompress one shard into a store directory. Returns the meta dict.
+
+    Every file is written to a temp name and renamed into place, so
+    processes that have the previous conversion mapped keep reading it.
+    meta.json is removed first and written last, so a conversion that
+    dies half way is never mistaken for a finished one.
+    """
+    out_dir = os.path.join(store_dir, dataset_name(pb_file))
+    os.makedirs(out_dir, exist_ok=True)
+    meta_path = os.path.join(out_dir, 'meta.json')
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    records = array(OFFSET_TYPE, [0])
+    ids = []
+    with atomic_open(os.path.join(out_dir, 'reactions.bin')) as out:
+        with closing(iter_reaction_bytes(pb_file)) as stream:
+            for raw in stream:
+                out.write(raw)
+                records.append(records[-1] + len(raw))
+                ids.append(read_reaction_id(raw))
+
+    order = array(U32_TYPE, sorted(range(len(ids)), key=ids.__getitem__))
+    id_starts = array(OFFSET_TYPE, [0])
+    with atomic_open(os.path.join(out_dir, 'ids.txt')) as f:
+        for position in order:
+            encoded = ids[position].encode('utf-8') + b'\n'
+            f.write(encoded)
+            id_starts.append(id_starts[-1] + len(encoded))
+
+    _write_array(os.path.join(out_dir, 'records.u64'), records)
+    _write_array(os.path.join(out_dir, 'ids.u64'), id_starts)
+    _write_array(os.path.join(out_dir, 'order.u32'), order)
+
+    meta = {
+        "version": STORE_VERSION,
+        "byteorder": sys.byteorder,
+        "reactions": len(ids),
+        "dataset": os.path.basename(pb_file),
+        "source": _source_stamp(pb_file),
+    }
+    with atomic_open(meta_path) as f:
+        f.write(json.dumps(meta, indent=4).encode('utf-8'))
+    return meta
+
+
+def _map_file(path):
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # mmap can't map an empty file (a shard with no reactions)
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _map_array(path, typecode):
+    mapped = _map_file(path)
+    return mapped, memoryview(mapped).cast(typecode)
+
+
+class _SortedIds:
+    """The sorted ids as a read-only sequence of bytes, for bisect."""
+
+    def __init__(self, text, starts):
+        self.text = text
+        self.starts = starts
+
+    def __len__(self):
+        return len(self.starts) - 1
+
+    def __getitem__(self, i):
+        return self.text[self.starts[i]:self.starts[i + 1] - 1]
+
+
+class ShardStore:
+    """Read-only, memory-mapped view of one converted shard."""
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, 'meta.json'), 'r') as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != STORE_VERSION:
+            raise ValueError(f"Unsupported store version in {directory}; convert it again")
+        if self.meta['byteorder'] != sys.byteorder:
+            # The offset arrays are read in place, so they must be native
+            raise ValueError(f"{directory} was written on a {self.meta['byteorder']}-endian machine; convert it again")
+        self.directory = directory
+        self.dataset = self.meta['dataset']
+        self.reactions = _map_file(os.path.join(directory, 'reactions.bin'))
+        self._maps = [self.reactions]
+        self.records = self._array('records.u64', OFFSET_TYPE)
+        self.order = self._array('order.u32', U32_TYPE)
+        id_text = _map_file(os.path.join(directory, 'ids.txt'))
+        self._maps.append(id_text)
+        self.ids = _SortedIds(id_text, self._array('ids.u64', OFFSET_TYPE))
+
+    def _array(self, name, typecode):
+        mapped, view = _map_array(os.path.join(self.directory, name), typecode)
+        self._maps.append(mapped)
+        return view
+
+    def __len__(self):
+        return self.meta['reactions']
+
+    def position(self, reaction_id):
+        """Shard position of `reaction_id`, or None if it isn't in this shard."""
+        key = reaction_id.encode('utf-8')
+        ids = self.ids
+        lo, hi = 0, len(ids)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ids[mid] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(ids) and ids[lo] == key:
+            return self.order[lo]
+        return None
+
+    def span(self, position):
+        """(start, end) of the reaction at `position` in reactions.bin."""
+        return self.records[position], self.records[position + 1]
+
+    def raw(self, position):
+        """The serialized reaction at `position`, as a zero-copy memoryview."""
+        start, end = self.span(position)
+        return memoryview(self.reactions)[start:end]
+
+    def reaction(self, position, full=False):
+        """The reaction at `position`: a LightReaction, or an ord_schema Reaction if `full`."""
+        start, end = self.span(position)
+        if full:
+            from ord_schema.proto import reaction_pb2
+            return reaction_pb2.Reaction.FromString(self.reactions[start:end])
+        return decode_reaction(self.reactions, start, end)
+
+    def get(self, reaction_id, full=False):
+        position = self.position(reaction_id)
+        return None if position is None else self.reaction(position, full)
+
+    def close(self):
+        # Views into a mapping have to go before the mapping itself
+        self.records.release()
+        self.order.release()
+        self.ids.starts.release()
+        for mapped in self._maps:
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+
+
+class ReactionStore:
+    """Every converted shard under a store directory, looked up by reaction_id."""
+
+    def __init__(self, store_dir=DEFAULT_STORE_DIR):
+        self.store_dir = store_dir
+        self.shards = []
+        if os.path.isdir(store_dir):
+            for name in sorted(os.listdir(store_dir)):
+                directory = os.path.join(store_dir, name)
+                if os.path.exists(os.path.join(directory, 'meta.json')):
+                    self.shards.append(ShardStore(directory))
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
+
+    def locate(self, reaction_id):
+        """(shard, position) holding `reaction_id`, or None."""
+        for shard in self.shards:
+            position = shard.position(reaction_id)
+            if position is not None:
+                return shard, position
+        return None
+
+    def get(self, reaction_id, full=False):
+        """The reaction with this id, or None if no converted shard has it."""
+        found = self.locate(reaction_id)
+        if found is None:
+            return None
+        shard, position = found
+        return shard.reaction(position, full)
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+        self.shards = []
+
+
+def convert_datasets(pb_files, store_dir=DEFAULT_STORE_DIR, force=False):
+    """Convert every shard that doesn't have an up-to-date store yet."""
+    for pb_file in pb_files:
+        if not force and is_converted(pb_file, store_dir):
+            print(f"Up to date: {os.path.basename(pb_file)}")
+            continue
+        meta = convert_shard(pb_file, store_dir)
+        size = os.path.getsize(os.path.join(store_dir, dataset_name(pb_file), 'reactions.bin'))
+        print(f"Converted {meta['dataset']}: {meta['reactions']} reactions, {size} bytes")
+
+
+def describe(reaction):
+    """One-line summary of a reaction for the `get` command."""
+    products = [ident.value for outcome in reaction.outcomes for product in outcome.products
+                for ident in product.identifiers]
+    reactants = [ident.value for key in reaction.inputs
+                 for comp in reaction.inputs[key].components for ident in comp.identifiers]
+    return {"reaction_id": reaction.reaction_id, "products": products, "inputs": reactants}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert ORD shards for random access, or read reactions by id.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    convert = sub.add_parser('convert', help="Decompress .pb.gz datasets into the store")
+    convert.add_argument('paths', nargs='*', default=[SCRIPT_DIR],
+                         help="Dataset files or directories (searched recursively)")
+    convert.add_argument('--store', default=DEFAULT_STORE_DIR)
+    convert.add_argument('--force', action='store_true', help="Convert even if the store is up to date")
+
+    get = sub.add_parser('get', help="Print reactions by reaction_id")
+    get.add_argument('reaction_ids', nargs='+')
+    get.add_argument('--store', default=DEFAULT_STORE_DIR)
+    get.add_argument('--full-parse', action='store_true',
+                     help="Parse with ord_schema and print the whole Reaction as text")
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        convert_datasets(find_dataset_files(args.paths), args.store, args.force)
+        return
+
+    store = ReactionStore(args.store)
+    if not store.shards:
+        sys.exit(f"No converted datasets in {args.store}; run `ord_store.py convert` first")
+    missing = 0
+    for reaction_id in args.reaction_ids:
+        reaction = store.get(reaction_id, full=args.full_parse)
+        if reaction is None:
+            print(f"{reaction_id}: not found", file=sys.stderr)
+            missing += 1
+        elif args.full_parse:
+            print(reaction)
+        else:
+            print(json.dumps(describe(reaction)))
+    store.close()
+    if missing:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
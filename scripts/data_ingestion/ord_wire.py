@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+"""Selective protobuf decoding of ORD Reactions, without ord_schema.
+
+The importers and the search only look at a handful of Reaction fields:
+reaction_id, input and product identifiers, the input components' roles,
+product measurements (type and percentage) and the temperature setpoint.
+This module walks the protobuf wire format of a serialized Reaction and
+decodes just those. Every other field (notes, observations, workups,
+provenance, setup, amounts, analyses, ...) is skipped by its length
+prefix without being looked at.
+
+The result is a LightReaction: small __slots__ objects whose attribute
+names match the ord_schema messages for the fields they keep, so code
+written against `reaction_pb2.Reaction` (map_reaction, match_reaction)
+works on either. Fields that were not decoded simply don't exist. Enum
+values are the same integers as in reaction.proto; the constants below
+stand in for `reaction_pb2.CompoundIdentifier.NAME` and friends so callers
+don't need ord_schema at all.
+
+Unlike a full parse, a singular message field that occurs more than once
+is not merged: the last occurrence wins. ORD writers never do this.
+The inputs map is kept in the order it was written; the C protobuf
+backend iterates map fields in an unspecified (hash) order, so "first
+reactant" and the reagent list can differ from a --full-parse run for
+reactions with several inputs. Wire order is the order the author
+entered them, and it is stable across runs and backends.
+"""
+
+import struct
+from contextlib import closing
+
+from ord_reader import iter_reaction_bytes
+from instrumentation import PROFILER
+
+# Enum values (ord_schema/proto/reaction.proto)
+IDENTIFIER_SMILES = 2
+IDENTIFIER_NAME = 6
+ROLE_UNSPECIFIED = 0
+ROLE_REACTANT = 1
+ROLE_SOLVENT = 3
+MEASUREMENT_YIELD = 3
+
+# Field numbers of the fields we decode
+REACTION_INPUTS = 2
+REACTION_CONDITIONS = 4
+REACTION_OUTCOMES = 8
+REACTION_ID = 10
+MAP_KEY = 1
+MAP_VALUE = 2
+INPUT_COMPONENTS = 1
+COMPOUND_IDENTIFIERS = 1
+COMPOUND_ROLE = 3
+IDENTIFIER_TYPE = 1
+IDENTIFIER_VALUE = 3
+CONDITIONS_TEMPERATURE = 1
+TEMPERATURE_SETPOINT = 2
+TEMPERATURE_VALUE = 1
+TEMPERATURE_UNITS = 3
+OUTCOME_PRODUCTS = 3
+PRODUCT_IDENTIFIERS = 1
+PRODUCT_MEASUREMENTS = 3
+PRODUCT_ROLE = 7
+MEASUREMENT_TYPE = 2
+MEASUREMENT_PERCENTAGE = 8
+PERCENTAGE_VALUE = 1
+
+# Wire-format keys ((field number << 3) | wire type) for the fields above
+_LEN = 2
+_FIXED32 = 5
+_KEY_REACTION_INPUTS = REACTION_INPUTS << 3 | _LEN
+_KEY_REACTION_CONDITIONS = REACTION_CONDITIONS << 3 | _LEN
+_KEY_REACTION_OUTCOMES = REACTION_OUTCOMES << 3 | _LEN
+_KEY_REACTION_ID = REACTION_ID << 3 | _LEN
+_KEY_MAP_KEY = MAP_KEY << 3 | _LEN
+_KEY_MAP_VALUE = MAP_VALUE << 3 | _LEN
+_KEY_INPUT_COMPONENTS = INPUT_COMPONENTS << 3 | _LEN
+_KEY_COMPOUND_IDENTIFIERS = COMPOUND_IDENTIFIERS << 3 | _LEN
+_KEY_COMPOUND_ROLE = COMPOUND_ROLE << 3
+_KEY_IDENTIFIER_TYPE = IDENTIFIER_TYPE << 3
+_KEY_IDENTIFIER_VALUE = IDENTIFIER_VALUE << 3 | _LEN
+_KEY_CONDITIONS_TEMPERATURE = CONDITIONS_TEMPERATURE << 3 | _LEN
+_KEY_TEMPERATURE_SETPOINT = TEMPERATURE_SETPOINT << 3 | _LEN
+_KEY_TEMPERATURE_VALUE = TEMPERATURE_VALUE << 3 | _FIXED32
+_KEY_TEMPERATURE_UNITS = TEMPERATURE_UNITS << 3
+_KEY_OUTCOME_PRODUCTS = OUTCOME_PRODUCTS << 3 | _LEN
+_KEY_PRODUCT_IDENTIFIERS = PRODUCT_IDENTIFIERS << 3 | _LEN
+_KEY_PRODUCT_MEASUREMENTS = PRODUCT_MEASUREMENTS << 3 | _LEN
+_KEY_PRODUCT_ROLE = PRODUCT_ROLE << 3
+_KEY_MEASUREMENT_TYPE = MEASUREMENT_TYPE << 3
+_KEY_MEASUREMENT_PERCENTAGE = MEASUREMENT_PERCENTAGE << 3 | _LEN
+_KEY_PERCENTAGE_VALUE = PERCENTAGE_VALUE << 3 | _FIXED32
+
+_unpack_float = struct.Struct('<f').unpack_from
+
+
+class LightIdentifier:
+    __slots__ = ('type', 'value')
+
+    def __init__(self):
+        self.type = 0
+        self.value = ''
+
+
+class LightCompound:
+    """A Compound (as an input component) or ProductCompound (as a product)."""
+    __slots__ = ('identifiers', 'reaction_role', 'measurements')
+
+    def __init__(self):
+        self.identifiers = []
+        self.reaction_role = ROLE_UNSPECIFIED
+        self.measurements = []
+
+
+class LightInput:
+    __slots__ = ('components',)
+
+    def __init__(self):
+        self.components = []
+
+
+class LightPercentage:
+    __slots__ = ('value',)
+
+    def __init__(self, value=0.0):
+        self.value = value
+
+
+class LightMeasurement:
+    __slots__ = ('type', 'percentage')
+
+    def __init__(self):
+        self.type = 0
+        self.percentage = _NO_PERCENTAGE
+
+
+class LightTemperature:
+    __slots__ = ('value', 'units')
+
+    def __init__(self):
+        self.value = 0.0
+        self.units = 0
+
+
+class LightTemperatureConditions:
+    __slots__ = ('setpoint',)
+
+    def __init__(self, setpoint=None):
+        self.setpoint = setpoint
+
+
+class LightConditions:
+    __slots__ = ('temperature',)
+
+    def __init__(self, temperature=None):
+        self.temperature = temperature
+
+
+class LightOutcome:
+    __slots__ = ('products',)
+
+    def __init__(self):
+        self.products = []
+
+
+class LightReaction:
+    __slots__ = ('reaction_id', 'inputs', 'conditions', 'outcomes')
+
+    def __init__(self):
+        self.reaction_id = ''
+        self.inputs = {}          # input name -> LightInput, in wire order
+        self.conditions = _NO_CONDITIONS
+        self.outcomes = []
+
+    def __repr__(self):
+        return f"LightReaction({self.reaction_id!r})"
+
+
+# Shared read-only defaults, like an unset submessage in ord_schema
+_NO_PERCENTAGE = LightPercentage()
+_NO_CONDITIONS = LightConditions(LightTemperatureConditions(LightTemperature()))
+
+
+def _varint(buf, pos):
+    b = buf[pos]
+    if b < 0x80:
+        return b, pos + 1
+    result = b & 0x7F
+    shift = 7
+    pos += 1
+    while True:
+        b = buf[pos]
+        result |= (b & 0x7F) << shift
+        pos += 1
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _skip(buf, pos, key):
+    """Position just past the value of a field we don't decode."""
+    wire_type = key & 7
+    if wire_type == 0:
+        while buf[pos] & 0x80:
+            pos += 1
+        return pos + 1
+    if wire_type == 2:
+        size = buf[pos]
+        pos += 1
+        if size >= 0x80:
+            size, pos = _varint(buf, pos - 1)
+        return pos + size
+    if wire_type == 5:
+        return pos + 4
+    if wire_type == 1:
+        return pos + 8
+    raise ValueError(f"Unsupported wire type {wire_type} in Reaction")
+
+
+def _identifier(buf, pos, end):
+    identifier = LightIdentifier()
+    while pos < end:
+        key = buf[pos]
+        pos += 1
+        if key >= 0x80:
+            key, pos = _varint(buf, pos - 1)
+        if key == _KEY_IDENTIFIER_TYPE:
+            identifier.type, pos = _varint(buf, pos)
+        elif key == _KEY_IDENTIFIER_VALUE:
+            size = buf[pos]
+            pos += 1
+            if size >= 0x80:
+                size, pos = _varint(buf, pos - 1)
+            identifier.value = buf[pos:pos + size].decode('utf-8')
+            pos += size
+        else:
+            pos = _skip(buf, pos, key)
+    return identifier
+
+
+def _component(buf, pos, end):
+    compound = LightCompound()
+    while pos < end:
+        key = buf[pos]
+        pos += 1
+        if key >= 0x80:
+            key, pos = _varint(buf, pos - 1)
+        if key == _KEY_COMPOUND_IDENTIFIERS:
+            size = buf[pos]
+            pos += 1
+            if size >= 0x80:
+                size, pos = _varint(buf, pos - 1)
+            compound.identifiers.append(_identifier(buf, pos, pos + size))
+            pos += size
+        elif key == _KEY_COMPOUND_ROLE:
+            compound.reaction_role, pos = _varint(buf, pos)
+        else:
+            pos = _skip(buf, pos, key)
+    return compound
+
+
+def _input(buf, pos, end):
+    reaction_input = LightInput()
+    while pos < end:
+        key = buf[pos]
+        pos += 1
+        if key >= 0x80:
+            key, pos = _varint(buf, pos - 1)
+        if key == _KEY_INPUT_COMPONENTS:
+            size = buf[pos]
+            pos += 1
+            if size >= 0x80:
+                size, pos = _varint(buf, pos - 1)
+            reaction_input.components.append(_component(buf, pos, pos + size))
+            pos += size
+        else:
+            pos = _skip(buf, pos, key)
+    return reaction_input
+
+
+def _input_entry(buf, pos, end):
+    name = ''
+    reaction_input = None
+    while pos < end:
+        key = buf[pos]
+        pos += 1
+        if key >= 0x80:
+            key, pos = _varint(buf, pos - 1)
+        if key == _KEY_MAP_KEY:
+            size = buf[pos]
+            pos += 1
+            if size >= 0x80:
+                size, pos = _varint(buf, pos - 1)
+            name = buf[pos:pos + size].decode('utf-8')
+            pos += size
+        elif key == _KEY_MAP_VALUE:
+            size = buf[pos]
+            pos += 1
+            if size >= 0x80:
+                size, pos = _varint(buf, pos - 1)
+            reaction_input = _input(buf, pos, pos + size)
+            pos += size
+        else:
+            pos = _skip(buf, pos, key)
+    return name, reaction_input or LightInput()
+
+
+def _percentage(buf, pos, end):
+    percentage = LightPercentage()
+    while pos < end:
+        key = buf[pos]
+        pos += 1
+        if key >= 0x80:
+            key, pos = _varint(buf, pos - 1)
+        if key == _KEY_PERCENTAGE_VALUE:
+            percentage.value = _unpack_float(buf, pos)[0]
+            pos += 4
+        else:
+            pos = _skip(buf, pos, key)
+    return percentage
+
+
+def _measurement(buf, pos, end):
+    measurement = LightMeasurement()
+    while pos < end:
+        key = buf[pos]
+        pos += 1
+        if key >= 0x80:
+            key, pos = _varint(buf, pos - 1)
+        if key == _KEY_MEASUREMENT_TYPE:
+            measurement.type, pos = _varint(buf, pos)
+        elif key == _KEY_MEASUREMENT_PERCENTAGE:
+            size = buf[pos]
+            pos += 1
+            if size >= 0x80:
+                size, pos = _varint(buf, pos - 1)
+            measurement.percentage = _percentage(buf, pos, pos + size)
+            pos += size
+        else:
+            pos = _skip(buf, pos, key)
+    return measurement
+
+
+def _product(buf, pos, end):
+    product = LightCompound()
+    while pos < end:
+        key = buf[pos]
+        pos += 1
+        if key >= 0x80:
+            key, pos = _varint(buf, pos - 1)
+        if key == _KEY_PRODUCT_IDENTIFIERS:
+            size = buf[pos]
+            pos += 1
+            if size >= 0x80:
+                size, pos = _varint(buf, pos - 1)
+            product.identifiers.append(_identifier(buf, pos, pos + size))
+            pos += size
+        elif key == _KEY_PRODUCT_MEASUREMENTS:
+            size = buf[pos]
+            pos += 1
+            if size >= 0x80:
+                size, pos = _varint(buf, pos - 1)
+            product.measurements.append(_measurement(buf, pos, pos + size))
+            pos += size
+        elif key == _KEY_PRODUCT_ROLE:
+            product.reaction_role, pos = _varint(buf, pos)
+        else:
+            pos = _skip(buf, pos, key)
+    return product
+
+
+def _outcome(buf, pos, end):
+    outcome = LightOutcome()
+    while pos < end:
+        key = buf[pos]
+        pos += 1
+        if key >= 0x80:
+            key, pos = _varint(buf, pos - 1)
+        if key == _KEY_OUTCOME_PRODUCTS:
+            size = buf[pos]
+            pos += 1
+            if size >= 0x80:
+                size, pos = _varint(buf, pos - 1)
+            outcome.products.append(_product(buf, pos, pos + size))
+            pos += size
+        else:
+            pos = _skip(buf, pos, key)
+    return outcome
+
+
+def _temperature(buf, pos, end):
+    temperature = LightTemperature()
+    while pos < end:
+        key = buf[pos]
+        pos += 1
+        if key >= 0x80:
+            key, pos = _varint(buf, pos - 1)
+        if key == _KEY_TEMPERATURE_VALUE:
+            temperature.value = _unpack_float(buf, pos)[0]
+            pos += 4
+        elif key == _KEY_TEMPERATURE_UNITS:
+            temperature.units, pos = _varint(buf, pos)
+        else:
+            pos = _skip(buf, pos, key)
+    return temperature
+
+
+def _conditions(buf, pos, end):
+    setpoint = LightTemperature()
+    while pos < end:
+        key = buf[pos]
+        pos += 1
+        if key >= 0x80:
+            key, pos = _varint(buf, pos - 1)
+        if key == _KEY_CONDITIONS_TEMPERATURE:
+            size = buf[pos]
+            pos += 1
+            if size >= 0x80:
+                size, pos = _varint(buf, pos - 1)
+            inner, stop = pos, pos + size
+            while inner < stop:
+                key = buf[inner]
+                inner += 1
+                if key >= 0x80:
+                    key, inner = _varint(buf, inner - 1)
+                if key == _KEY_TEMPERATURE_SETPOINT:
+                    size, inner = _varint(buf, inner)
+                    setpoint = _temperature(buf, inner, inner + size)
+                    inner += size
+                else:
+                    inner = _skip(buf, inner, key)
+            pos = stop
+        else:
+            pos = _skip(buf, pos, key)
+    return LightConditions(LightTemperatureConditions(setpoint))
+
+
+def decode_reaction(buf, pos=0, end=None):
+    """Decode the fields ingestion uses from a serialized Reaction.
+
+    `buf` can be anything that indexes to ints and slices to bytes (bytes,
+    mmap); `pos`/`end` select the Reaction inside it, so a record in a
+    memory-mapped file is decoded in place.
+    """
+    reaction = LightReaction()
+    if end is None:
+        end = len(buf)
+    while pos < end:
+        key = buf[pos]
+        pos += 1
+        if key >= 0x80:
+            key, pos = _varint(buf, pos - 1)
+        if key == _KEY_REACTION_INPUTS:
+            size = buf[pos]
+            pos += 1
+            if size >= 0x80:
+                size, pos = _varint(buf, pos - 1)
+            name, reaction_input = _input_entry(buf, pos, pos + size)
+            reaction.inputs[name] = reaction_input
+            pos += size
+        elif key == _KEY_REACTION_OUTCOMES:
+            size = buf[pos]
+            pos += 1
+            if size >= 0x80:
+                size, pos = _varint(buf, pos - 1)
+            reaction.outcomes.append(_outcome(buf, pos, pos + size))
+            pos += size
+        elif key == _KEY_REACTION_CONDITIONS:
+            size = buf[pos]
+            pos += 1
+            if size >= 0x80:
+                size, pos = _varint(buf, pos - 1)
+            reaction.conditions = _conditions(buf, pos, pos + size)
+            pos += size
+        elif key == _KEY_REACTION_ID:
+            size = buf[pos]
+            pos += 1
+            if size >= 0x80:
+                size, pos = _varint(buf, pos - 1)
+            reaction.reaction_id = buf[pos:pos + size].decode('utf-8')
+            pos += size
+        else:
+            pos = _skip(buf, pos, key)
+    if pos != end:
+        raise ValueError("Truncated Reaction message")
+    return reaction
+
+
+def read_reaction_id(buf, pos=0, end=None):
+    """Just the reaction_id of a serialized Reaction ("" if it has none)."""
+    if end is None:
+        end = len(buf)
+    reaction_id = ""
+    while pos < end:
+        key = buf[pos]
+        pos += 1
+        if key >= 0x80:
+            key, pos = _varint(buf, pos - 1)
+        if key == _KEY_REACTION_ID:
+            size, pos = _varint(buf, pos)
+            reaction_id = buf[pos:pos + size].decode('utf-8')
+            pos += size
+        else:
+            pos = _skip(buf, pos, key)
+    return reaction_id
+
+
+def iter_light_reactions(path, limit=None):
+    """Like ord_reader.iter_reactions, but yields LightReactions."""
+    raw_reactions = iter_reaction_bytes(path, limit=limit)
+    with closing(raw_reactions):
+        while True:
+            with PROFILER.stage('decompress'):
+                raw = next(raw_reactions, None)
+            if raw is None:
+                return
+            with PROFILER.stage('parse'):
+                reaction = decode_reaction(raw)
+            yield reaction
+
+
+def reaction_stream(path, limit=None, full=False):
+    """Reactions from a dataset: LightReactions, or full ord_schema Reactions if `full`."""
+    if full:
+        from ord_reader import iter_reactions
+        return iter_reactions(path, limit=limit)
+    return iter_light_reactions(path, limit=limit)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Aho-Corasick multi-pattern matcher used by the ORD search scripts.
+
+The automaton is built once from the full pattern list, after which every
+pattern occurring in a string is found in a single pass over that string,
+no matter how many patterns there are.
+"""
+
+from collections import deque
+
+
+class PatternMatcher:
+    """Find which of a fixed set of substrings occur in a piece of text."""
+
+    def __init__(self, patterns, ignore_case=False):
+        self.patterns = list(patterns)
+        self.ignore_case = ignore_case
+        # Trie as parallel lists: transitions, failure links, and the indices
+        # of patterns that end at (or are suffixes ending at) each node.
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for index, pattern in enumerate(self.patterns):
+            self._add(self._fold(pattern), index)
+        self._build_failure_links()
+
+    def _fold(self, text):
+        return text.lower() if self.ignore_case else text
+
+    def _add(self, pattern, index):
+        if not pattern:
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = nxt
+        self._out[node] = self._out[node] + (index,)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, text):
+        """Return the indices of all patterns found in `text`, in pattern order."""
+        goto, fail, out = self._goto, self._fail, self._out
+        hits = set()
+        node = 0
+        for ch in self._fold(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                hits.update(out[node])
+        return sorted(hits)
+
+    def find_patterns(self, text):
+        """Return the patterns (not indices) found in `text`."""
+        return [self.patterns[i] for i in self.find(text)]
+
+
+def load_patterns(path):
+    """Read one pattern per line, skipping blank lines and '#' comments."""
+    patterns = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                patterns.append(line)
+    return patterns
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""Incremental ORD import pipeline with memoized stage artifacts.
+
+The import that fetch_real_ord_data.py does in one go, split into a
+small DAG of stages:
+
+    fetch -> parse -> map -> dedup -> write -> index
+
+  fetch   make sure the dataset shard is downloaded and verified
+  parse   stream the shard and keep the reactions that can match --target
+          (a byte-level prefilter; no protobuf parsing), stored as a
+          .pb.gz Dataset of their raw bytes
+  map     parse those reactions and map them to our schema
+  dedup   report or merge near-duplicate routes (dedup.py)
+  write   write synthesis files under public/data/<category>/
+  index   update index.json
+
+Every stage's output is cached under .pipeline_cache/<stage>/ keyed by a
+hash of its parameters, the digests of its inputs' outputs, and its code
+version (the source of the functions it runs). A re-run therefore redoes
+only the stages whose inputs or code changed: editing map_reaction reruns
+map and whatever it changes downstream, but not fetch or parse. Stages
+whose output lives outside the cache (fetch, write, index) also check that
+it is still intact on disk.
+
+Usage:
+    python pipeline.py [--stage map] [--force [STAGE ...]]
+    python pipeline.py --target strychnine --category alkaloids --limit 20
+"""
+
+import os
+import json
+import gzip
+import hashlib
+import inspect
+import argparse
+from contextlib import closing
+
+from ord_reader import iter_reaction_bytes, iter_reactions, DATASET_REACTIONS_FIELD, WIRE_LENGTH_DELIMITED
+from ord_downloader import Downloader, sha256_file
+from index_store import INDEX_FILE, IndexStore, atomic_write_bytes, public_path
+from dedup import add_dedup_arguments, dedup_routes
+from instrumentation import stage as timed_stage, count, add_profile_arguments, start_profiling, finish_profiling
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(SCRIPT_DIR, '.pipeline_cache')
+DATASET_ID = "ord_dataset-01dbb772c5e249108f0b191ed17a2c0c"
+DEFAULT_CATEGORY = 'imported'
+DEFAULT_LIMIT = 100
+STAGE_NAMES = ('fetch', 'parse', 'map', 'dedup', 'write', 'index')
+# Map a few extra reactions so dedup and bad records still leave `limit`
+MAP_SLACK = 5
+# Bump to invalidate every cached artifact (e.g. after changing the cache layout)
+PIPELINE_VERSION = 1
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        b = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+
+def _sha256_json(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _matches_target(synthesis, target):
+    if not target:
+        return True
+    target = target.lower()
+    meta = synthesis['meta']
+    product = synthesis['sequence'][0]['product_smiles']
+    return target in meta['molecule_name'].lower() or target in product.lower()
+
+
+# -- stages -------------------------------------------------------------------
+# Each run_* gets (context, inputs) and returns a JSON-serializable output.
+
+def run_fetch(ctx, inputs):
+    path = Downloader().fetch(ctx.args.dataset, ctx.args.dataset_dir)
+    return {"path": path, "sha256": sha256_file(path), "size": os.path.getsize(path)}
+
+
+def fetch_intact(output):
+    return os.path.exists(output['path']) and os.path.getsize(output['path']) == output['size']
+
+
+def run_parse(ctx, inputs):
+    needle = ctx.args.target.lower().encode('utf-8') if ctx.args.target else None
+    artifact = ctx.artifact_path('.pb.gz')
+    kept = 0
+    with gzip.open(artifact, 'wb', compresslevel=1) as out:
+        for raw in iter_reaction_bytes(inputs['fetch']['path']):
+            if needle is not None and needle not in raw.lower():
+                count('reactions_dropped')
+                continue
+            out.write(_varint((DATASET_REACTIONS_FIELD << 3) | WIRE_LENGTH_DELIMITED) + _varint(len(raw)) + raw)
+            kept += 1
+    return {"path": artifact, "reactions": kept, "sha256": sha256_file(artifact)}
+
+
+def run_map(ctx, inputs):
+    from fetch_real_ord_data import map_reaction
+
+    wanted = ctx.args.limit + MAP_SLACK
+    mapped = []
+    with closing(iter_reactions(inputs['parse']['path'])) as stream:
+        for reaction in stream:
+            synthesis = map_reaction(reaction)
+            if synthesis is None or not _matches_target(synthesis, ctx.args.target):
+                count('reactions_dropped')
+                continue
+            count('reactions_kept')
+            mapped.append(synthesis)
+            if len(mapped) >= wanted:
+                break
+    return {"routes": mapped}
+
+
+def run_dedup(ctx, inputs):
+    return {"routes": dedup_routes(inputs['map']['routes'], ctx.args.dedup, ctx.args.dedup_threshold)}
+
+
+def run_write(ctx, inputs):
+    category = ctx.args.category
+    store = IndexStore()
+    entries = []
+    files = {}
+    for i, rxn in enumerate(inputs['dedup']['routes'][:ctx.args.limit]):
+        relative_path = f"/data/{category}/ord-{i+1}.json"
+        # Keep fetch_real_ord_data.py's ids for the default category
+        prefix = 'ord-real' if category == DEFAULT_CATEGORY else f"ord-{category}"
+        rxn = dict(rxn, meta=dict(rxn['meta'], id=f"{prefix}-{i+1}"))
+        stats = store.write_synthesis(relative_path, rxn)
+        files[relative_path] = store.manifest['files'][relative_path]['sha256']
+        entries.append({
+            "id": rxn['meta']['id'],
+            "molecule_name": rxn['meta']['molecule_name'],
+            "class": "ORD Real Data",
+            "author": "ORD",
+            "year": 2024,
+            "path": relative_path,
+            **stats
+        })
+    # Only the manifest changes here; index.json is the index stage's job
+    store.save()
+    print(f"  {store.files_written} files written, {store.files_skipped} unchanged")
+    return {"entries": entries, "files": files}
+
+
+def write_intact(output):
+    for relative_path, digest in output['files'].items():
+        path = public_path(relative_path)
+        if not os.path.exists(path) or sha256_file(path) != digest:
+            return False
+    return True
+
+
+def run_index(ctx, inputs):
+    store = IndexStore()
+    store.replace_under(f"/data/{ctx.args.category}/", inputs['write']['entries'])
+    changed = store.save()
+    print(f"  index.json {'updated' if changed else 'unchanged'}")
+    return {"index_sha256": sha256_file(INDEX_FILE)}
+
+
+def index_intact(output):
+    return os.path.exists(INDEX_FILE) and sha256_file(INDEX_FILE) == output['index_sha256']
+
+
+class Stage:
+    def __init__(self, name, deps, run, params=(), code=None, intact=None):
+        self.name = name
+        self.deps = deps
+        self.run = run
+        self.params = params          # argparse attributes that change the output
+        self.code = code              # returns the other functions the output depends on
+        self.intact = intact          # checks that output kept outside the cache still exists
+
+    def code_version(self):
+        # `code` is resolved lazily so `--stage fetch` works without ord_schema
+        functions = (self.run,) + (self.code() if self.code else ())
+        digest = hashlib.sha256(str(PIPELINE_VERSION).encode('ascii'))
+        for fn in functions:
+            try:
+                digest.update(inspect.getsource(fn).encode('utf-8'))
+            except (OSError, TypeError):
+                digest.update(getattr(fn, '__qualname__', repr(fn)).encode('utf-8'))
+        return digest.hexdigest()
+
+
+def _map_code():
+    from fetch_real_ord_data import map_reaction, map_reaction_record
+    from reaction_record import ReactionRecord
+    return (map_reaction, map_reaction_record, ReactionRecord, _matches_target)
+
+
+def _dedup_code():
+    import dedup
+    return (dedup.route_shingles, dedup.minhash, dedup.find_clusters, dedup.dedup_routes)
+
+
+def build_stages():
+    return [
+        Stage('fetch', [], run_fetch, params=('dataset',), intact=fetch_intact),
+        Stage('parse', ['fetch'], run_parse, params=('target',)),
+        Stage('map', ['parse'], run_map, params=('target', 'limit'), code=_map_code),
+        Stage('dedup', ['map'], run_dedup, params=('dedup', 'dedup_threshold'), code=_dedup_code),
+        Stage('write', ['dedup'], run_write, params=('category', 'limit'), intact=write_intact),
+        Stage('index', ['write'], run_index, params=('category',), intact=index_intact),
+    ]
+
+
+class Context:
+    def __init__(self, args, cache_dir):
+        self.args = args
+        self.cache_dir = cache_dir
+        self.current_key = None
+        self.current_stage = None
+
+    def stage_dir(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def artifact_path(self, suffix):
+        directory = self.stage_dir(self.current_stage)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, f"{self.current_key}{suffix}")
+
+
+def run_pipeline(args, cache_dir=CACHE_DIR):
+    """Run the stages up to args.stage, reusing cached outputs. Returns {stage: output}."""
+    stages = build_stages()
+    last = STAGE_NAMES.index(args.stage) if args.stage else len(stages) - 1
+    forced = set(STAGE_NAMES) if args.force == [] else set(args.force or ())
+
+    ctx = Context(args, cache_dir)
+    outputs = {}
+    for stage in stages[:last + 1]:
+        name = stage.name
+        key = _sha256_json({
+            "stage": name,
+            "code": stage.code_version(),
+            "params": {p: getattr(args, p) for p in stage.params},
+            "inputs": {dep: _sha256_json(outputs[dep]) for dep in stage.deps},
+        })
+        record_path = os.path.join(ctx.stage_dir(name), f"{key}.json")
+
+        cached = None
+        if name not in forced and os.path.exists(record_path):
+            with open(record_path, 'r') as f:
+                cached = json.load(f)
+            if stage.intact is not None and not stage.intact(cached):
+                cached = None
+
+        if cached is not None:
+            print(f"[{name}] cached")
+            outputs[name] = cached
+            continue
+
+        print(f"[{name}] running...")
+        ctx.current_stage, ctx.current_key = name, key
+        with timed_stage(name):
+            output = stage.run(ctx, {dep: outputs[dep] for dep in stage.deps})
+        atomic_write_bytes(record_path, json.dumps(output).encode('utf-8'))
+        outputs[name] = output
+    return outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental ORD import pipeline with cached stages.")
+    parser.add_argument("--stage", choices=STAGE_NAMES, help="Run up to and including this stage")
+    parser.add_argument("--force", nargs="*", choices=STAGE_NAMES, metavar="STAGE",
+                        help="Recompute these stages even if cached (all stages if none are named)")
+    parser.add_argument("--target", help="Only import reactions whose product name or SMILES contains this")
+    parser.add_argument("--category", default=DEFAULT_CATEGORY,
+                        help="Write under public/data/<category>/ (default: imported)")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT, help="Maximum routes to write")
+    parser.add_argument("--dataset", default=DATASET_ID, help="ORD dataset id to import")
+    parser.add_argument("--dataset-dir", default=SCRIPT_DIR, help="Where the dataset shard is kept")
+    add_dedup_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    start_profiling(args)
+
+    run_pipeline(args)
+    finish_profiling(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Cached, rate-limited PubChem name -> SMILES resolver.
+
+Planned in SYNTHESIS_IMPORT_STRATEGY.md (Phase 2). Lookups run on asyncio:
+
+  - a token bucket keeps us under PubChem's 5 requests/second limit,
+  - concurrent lookups of the same name share a single request,
+  - name -> CID lookups are one request per name (PubChem has no batch
+    form for names), but CID -> SMILES lookups are batched into a single
+    POST for every CID that is waiting at the same time,
+  - results live in a SQLite cache, including misses (negative caching),
+    so names PubChem doesn't know are not asked about again until the
+    negative entry expires.
+
+HTTP is plain urllib run in worker threads, so there are no extra
+dependencies. `base_url` can point at a local stand-in server, which is
+what test_pubchem_client.py does.
+
+Usage:
+    python pubchem_client.py "Taxol" "Corey lactone" ...
+    python pubchem_client.py --names-file intermediates.txt
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import asyncio
+import argparse
+import http.client
+import urllib.error
+import urllib.parse
+import urllib.request
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_FILE = os.path.join(SCRIPT_DIR, '.pubchem_cache.sqlite')
+BASE_URL = "https://pubchem.ncbi.nlm.nih.gov/rest/pug"
+REQUESTS_PER_SECOND = 5
+MAX_BATCH_SIZE = 100
+BATCH_WINDOW = 0.05
+NEGATIVE_TTL = 30 * 24 * 3600
+TIMEOUT = 30
+RETRIES = 3
+# Names the curated data uses for "unknown"
+PLACEHOLDER_NAMES = {'', '???', 'n/a', 'unknown'}
+
+
+def normalize_name(name):
+    return ' '.join(name.split()).casefold()
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ResolverCache:
+    """SQLite-backed name -> (cid, smiles) cache with negative entries."""
+
+    def __init__(self, path=CACHE_FILE, negative_ttl=NEGATIVE_TTL):
+        self.db = sqlite3.connect(path)
+        self.negative_ttl = negative_ttl
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS names ("
+            " key TEXT PRIMARY KEY, name TEXT, cid INTEGER, smiles TEXT,"
+            " found INTEGER NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        self.db.commit()
+
+    def get(self, key):
+        """Return (hit, smiles). A fresh negative entry is a hit with smiles None."""
+        row = self.db.execute("SELECT smiles, found, fetched_at FROM names WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return False, None
+        smiles, found, fetched_at = row
+        if not found and time.time() - fetched_at > self.negative_ttl:
+            return False, None
+        return True, smiles
+
+    def put(self, key, name, cid, smiles):
+        self.db.execute(
+            "INSERT OR REPLACE INTO names (key, name, cid, smiles, found, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, name, cid, smiles, int(smiles is not None), time.time()),
+        )
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+
+class PubChemClient:
+    def __init__(self, cache=None, base_url=BASE_URL, rate=REQUESTS_PER_SECOND,
+                 max_batch_size=MAX_BATCH_SIZE, batch_window=BATCH_WINDOW):
+        self.cache = cache if cache is not None else ResolverCache()
+        self.base_url = base_url.rstrip('/')
+        self.bucket = TokenBucket(rate)
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.requests_made = 0
+        self._inflight = {}
+        self._pending_cids = {}
+        self._flush_task = None
+        self._batch_tasks = set()
+
+    # -- HTTP ------------------------------------------------------------
+
+    def _http_sync(self, url, data):
+        request = urllib.request.Request(url, data=data)
+        if data is not None:
+            request.add_header('Content-Type', 'application/x-www-form-urlencoded')
+        try:
+            with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None  # PUGREST.NotFound
+            raise
+
+    async def _http(self, url, data=None):
+        for attempt in range(RETRIES):
+            await self.bucket.acquire()
+            self.requests_made += 1
+            try:
+                return await asyncio.to_thread(self._http_sync, url, data)
+            except urllib.error.HTTPError as e:
+                # 503 is PubChem's "server busy"; back off and retry
+                if e.code != 503 or attempt == RETRIES - 1:
+                    raise
+            except (urllib.error.URLError, http.client.HTTPException, ConnectionError):
+                # Includes connections dropped mid-request (RemoteDisconnected)
+                # or mid-body (IncompleteRead)
+                if attempt == RETRIES - 1:
+                    raise
+            await asyncio.sleep((2 ** attempt) * 0.5 + random.random() * 0.1)
+
+    # -- CID -> SMILES batching -------------------------------------------
+
+    async def _smiles_for_cid(self, cid):
+        loop = asyncio.get_running_loop()
+        future = self._pending_cids.get(cid)
+        if future is None:
+            future = loop.create_future()
+            self._pending_cids[cid] = future
+            if len(self._pending_cids) >= self.max_batch_size:
+                self._flush_now()
+            elif self._flush_task is None:
+                self._flush_task = loop.create_task(self._flush_later())
+        return await future
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.batch_window)
+        self._flush_task = None
+        self._flush_now()
+
+    def _flush_now(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        batch, self._pending_cids = self._pending_cids, {}
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._fetch_batch(batch))
+            # Hold a reference so the task isn't garbage collected mid-flight
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _fetch_batch(self, batch):
+        url = f"{self.base_url}/compound/cid/property/IsomericSMILES/JSON"
+        body = urllib.parse.urlencode({'cid': ','.join(str(cid) for cid in batch)}).encode('ascii')
+        try:
+            payload = await self._http(url, body)
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        found = {}
+        for props in (payload or {}).get('PropertyTable', {}).get('Properties', []):
+            # PubChem renamed IsomericSMILES to SMILES; accept either
+            smiles = props.get('SMILES') or props.get('IsomericSMILES') or props.get('CanonicalSMILES')
+            found[props.get('CID')] = smiles
+        for cid, future in batch.items():
+            if not future.done():
+                future.set_result(found.get(cid))
+
+    # -- name lookup ----------------------------------------------------------
+
+    async def _lookup(self, key, name):
+        url = f"{self.base_url}/compound/name/{urllib.parse.quote(name, safe='')}/cids/JSON"
+        payload = await self._http(url)
+        cids = (payload or {}).get('IdentifierList', {}).get('CID', [])
+        cid = cids[0] if cids and cids[0] else None
+        smiles = await self._smiles_for_cid(cid) if cid else None
+        self.cache.put(key, name, cid, smiles)
+        return smiles
+
+    async def resolve(self, name):
+        """Return the SMILES for a compound name, or None if PubChem doesn't know it."""
+        key = normalize_name(name)
+        if key in PLACEHOLDER_NAMES:
+            return None
+        hit, smiles = self.cache.get(key)
+        if hit:
+            return smiles
+        # Coalesce: everyone asking for the same name awaits one lookup
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._lookup(key, name.strip()))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await task
+
+    async def resolve_many(self, names):
+        """Resolve a list of names concurrently. Returns {name: smiles or None}."""
+        unique = list(dict.fromkeys(names))
+        results = await asyncio.gather(*(self.resolve(n) for n in unique), return_exceptions=True)
+        resolved = {}
+        for name, result in zip(unique, results):
+            if isinstance(result, Exception):
+                print(f"Lookup failed for {name!r}: {result}", file=sys.stderr)
+                result = None
+            resolved[name] = result
+        return resolved
+
+
+def resolve_names(names, base_url=BASE_URL, cache_file=CACHE_FILE):
+    """Synchronous convenience wrapper around PubChemClient.resolve_many."""
+    cache = ResolverCache(cache_file)
+    try:
+        client = PubChemClient(cache, base_url=base_url)
+        return asyncio.run(client.resolve_many(names))
+    finally:
+        cache.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resolve compound names to SMILES via PubChem.")
+    parser.add_argument("names", nargs="*")
+    parser.add_argument("--names-file", help="File with one compound name per line")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--cache", default=CACHE_FILE)
+    args = parser.parse_args()
+
+    names = list(args.names)
+    if args.names_file:
+        with open(args.names_file, 'r', encoding='utf-8') as f:
+            names.extend(line.strip() for line in f if line.strip())
+    if not names:
+        parser.error("no names given")
+
+    print(json.dumps(resolve_names(names, args.base_url, args.cache), indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Compact in-memory form of a reaction imported from ORD.
+
+The importers used to hold every mapped reaction as its schema.json dict:
+three containers and ~20 keys per reaction, plus a fresh copy of each
+string every reaction shares ("ORD Contributor", "Imported from Open
+Reaction Database", "Standard Conditions", the same solvent and reagent
+names again and again). ReactionRecord keeps only the fields that vary,
+in __slots__, and interns the repetitive ones, so a million records
+naming "THF" point at one string.
+
+The schema dict is built by `to_synthesis()` when a record is written
+(or looked at by dedup) and can be dropped straight after.
+"""
+
+import sys
+
+# The reagents column only ever shows the first few names
+REAGENT_LIMIT = 3
+
+
+def intern_text(value):
+    return sys.intern(value) if value else value
+
+
+class ReactionRecord:
+    __slots__ = ('reaction_id', 'molecule_name', 'product_smiles', 'measured_yield',
+                 'reagents', 'conditions', 'reactant_smiles')
+
+    def __init__(self, reaction_id, molecule_name, product_smiles, measured_yield,
+                 reagent_names, reactant_smiles, conditions):
+        self.reaction_id = reaction_id
+        self.molecule_name = intern_text(molecule_name)
+        self.product_smiles = intern_text(product_smiles)
+        self.measured_yield = intern_text(measured_yield)
+        self.reagents = intern_text(", ".join(reagent_names[:REAGENT_LIMIT]))
+        self.conditions = intern_text(conditions)
+        self.reactant_smiles = intern_text(reactant_smiles[0]) if reactant_smiles else ""
+
+    def __repr__(self):
+        return f"ReactionRecord({self.reaction_id!r}, {self.molecule_name!r})"
+
+    def to_synthesis(self):
+        """The schema.json dict for this reaction (a new dict on every call)."""
+        return {
+            "$schema": "../schema.json",
+            "meta": {
+                "id": self.reaction_id,
+                "molecule_name": self.molecule_name,
+                "class": "ORD Import",
+                "author": "ORD Contributor",
+                "year": 2020,
+                "source_url": f"https://open-reaction-database.org/client/id/{self.reaction_id}"
+            },
+            "sequence": [
+                {
+                    "step_id": 1,
+                    "reaction_type": "Synthesis",
+                    "reagents": self.reagents,
+                    "conditions": self.conditions,
+                    "yield": self.measured_yield,
+                    "reactant_smiles": self.reactant_smiles,
+                    "product_smiles": self.product_smiles,
+                    "notes": "Imported from Open Reaction Database"
+                }
+            ]
+        }
+
+
+def as_synthesis(route):
+    """A schema dict for either a ReactionRecord or an already-built dict."""
+    return route.to_synthesis() if isinstance(route, ReactionRecord) else route
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""Numeric yields/conditions and library-wide route statistics.
+
+Yields and conditions are stored as display strings ("96%", "87% (2
+steps)", "reflux, 2h", "-78 °C", "N/A", "???"). The parsers here pull out
+numbers:
+
+  parse_yield       percent, and how many steps it covers
+  parse_conditions  temperature (°C), time (h), reflux
+  parse_solvent     the first known solvent named in reagents/conditions
+
+ord_step_values reads the same fields straight from an ORD Reaction's
+measurements instead of from text.
+
+Every step of every synthesis in index.json is then loaded into flat
+NumPy arrays (one element per step, with a route number per step) and the
+aggregates are computed on whole arrays:
+
+  - overall route yield, the product of the step yields (only for routes
+    where every step has one),
+  - per-class and per-reaction_type distributions,
+  - step-count histograms.
+
+The result is written to public/data/stats.json for the UI to load in one
+fetch.
+
+Requires numpy (see requirements.txt).
+
+Usage:
+    python route_analytics.py [--ord DATASET.pb.gz ...]
+"""
+
+import os
+import re
+import json
+import argparse
+import unicodedata
+from contextlib import closing
+
+import numpy as np
+
+from index_store import DATA_DIR, INDEX_FILE, atomic_write_bytes, public_path
+
+STATS_FILE = os.path.join(DATA_DIR, 'stats.json')
+STATS_VERSION = 1
+ROOM_TEMPERATURE_C = 25.0
+OVERNIGHT_H = 16.0
+YIELD_BINS = np.linspace(0.0, 100.0, 11)
+DECIMALS = 2
+
+YIELD_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*(?:-\s*(\d+(?:\.\d+)?)\s*)?%')
+YIELD_STEPS_PATTERN = re.compile(r'(\d+)\s*steps?\b', re.IGNORECASE)
+QUANTITATIVE_PATTERN = re.compile(r'\bquant', re.IGNORECASE)
+TEMPERATURE_PATTERN = re.compile(r'(-?\d+(?:\.\d+)?)\s*(?:°|deg\.?\s*)\s*([CFK])\b')
+# (?!\w) rather than \b: "r.t." ends in a non-word character, so \b after it
+# would need a letter or digit to follow
+ROOM_TEMPERATURE_PATTERN = re.compile(r'\b(?:rt|r\.t\.|room\s+temp(?:erature)?|ambient)(?!\w)', re.IGNORECASE)
+REFLUX_PATTERN = re.compile(r'\breflux', re.IGNORECASE)
+TIME_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*(h|hrs?|hours?|min|mins|minutes?|d|days?)\b', re.IGNORECASE)
+OVERNIGHT_PATTERN = re.compile(r'\bovernight\b', re.IGNORECASE)
+SOLVENT_SPLIT_PATTERN = re.compile(r'[,;/+]|\bin\b')
+HOURS_PER_UNIT = {'h': 1.0, 'hr': 1.0, 'hrs': 1.0, 'hour': 1.0, 'hours': 1.0,
+                  'min': 1 / 60, 'mins': 1 / 60, 'minute': 1 / 60, 'minutes': 1 / 60,
+                  'd': 24.0, 'day': 24.0, 'days': 24.0}
+
+# Spelling as written (lowercase, subscripts folded) -> one name per solvent
+SOLVENTS = {
+    'thf': 'THF', 'tetrahydrofuran': 'THF',
+    'dcm': 'DCM', 'ch2cl2': 'DCM', 'dichloromethane': 'DCM',
+    'chcl3': 'CHCl3', 'chloroform': 'CHCl3',
+    'meoh': 'MeOH', 'methanol': 'MeOH',
+    'etoh': 'EtOH', 'ethanol': 'EtOH',
+    'dmf': 'DMF', 'dmso': 'DMSO',
+    'mecn': 'MeCN', 'acetonitrile': 'MeCN', 'ch3cn': 'MeCN',
+    'et2o': 'Et2O', 'ether': 'Et2O', 'diethyl ether': 'Et2O',
+    'etoac': 'EtOAc', 'ethyl acetate': 'EtOAc',
+    'toluene': 'toluene', 'phme': 'toluene', 'benzene': 'benzene',
+    'h2o': 'water', 'water': 'water',
+    'acetone': 'acetone', 'dioxane': 'dioxane', '1,4-dioxane': 'dioxane',
+    'hexane': 'hexane', 'hexanes': 'hexane', 'pyridine': 'pyridine',
+    'acoh': 'AcOH', 'acetic acid': 'AcOH',
+}
+
+
+def _fold(text):
+    # NFKC turns subscripts into digits (CH₂Cl₂ -> CH2Cl2); it leaves U+2212 alone
+    return unicodedata.normalize('NFKC', text).replace('−', '-').replace('–', '-')
+
+
+# -- parsing ---------------------------------------------------------------
+
+def parse_yield(text):
+    """(percent or None, number of steps the figure covers)."""
+    if not isinstance(text, str):
+        return None, 1
+    text = _fold(text)
+    steps_match = YIELD_STEPS_PATTERN.search(text)
+    steps = max(int(steps_match.group(1)), 1) if steps_match else 1
+    match = YIELD_PATTERN.search(text)
+    if match:
+        low = float(match.group(1))
+        high = float(match.group(2)) if match.group(2) else low
+        return (low + high) / 2, steps
+    if QUANTITATIVE_PATTERN.search(text):
+        return 100.0, steps
+    return None, 1
+
+
+def parse_conditions(text):
+    """{"temperature_c", "time_h", "reflux"} from a conditions string; unknowns are None."""
+    values = {"temperature_c": None, "time_h": None, "reflux": False}
+    if not isinstance(text, str):
+        return values
+    text = _fold(text)
+    match = TEMPERATURE_PATTERN.search(text)
+    if match:
+        value, unit = float(match.group(1)), match.group(2)
+        if unit == 'F':
+            value = (value - 32) * 5 / 9
+        elif unit == 'K':
+            value -= 273.15
+        values['temperature_c'] = value
+    elif ROOM_TEMPERATURE_PATTERN.search(text):
+        values['temperature_c'] = ROOM_TEMPERATURE_C
+    match = TIME_PATTERN.search(text)
+    if match:
+        values['time_h'] = float(match.group(1)) * HOURS_PER_UNIT[match.group(2).lower()]
+    elif OVERNIGHT_PATTERN.search(text):
+        values['time_h'] = OVERNIGHT_H
+    values['reflux'] = bool(REFLUX_PATTERN.search(text))
+    return values
+
+
+def parse_solvent(*texts):
+    """The first known solvent named in any of `texts`, or None."""
+    for text in texts:
+        if not isinstance(text, str):
+            continue
+        for part in SOLVENT_SPLIT_PATTERN.split(_fold(text)):
+            solvent = SOLVENTS.get(part.strip().lower())
+            if solvent:
+                return solvent
+    return None
+
+
+def parse_step(step):
+    """Numeric fields of one synthesis step."""
+    percent, steps = parse_yield(step.get('yield'))
+    values = parse_conditions(step.get('conditions'))
+    values.update(yield_percent=percent, yield_steps=steps,
+                  solvent=parse_solvent(step.get('reagents'), step.get('conditions')))
+    return values
+
+
+def _ord_yield(outcome, reaction_pb2):
+    """The outcome's yield percentage, taken from a desired product when one has it."""
+    for product in sorted(outcome.products, key=lambda product: not product.is_desired_product):
+        for measurement in product.measurements:
+            if measurement.type == reaction_pb2.ProductMeasurement.YIELD and measurement.HasField('percentage'):
+                return measurement.percentage.value
+    return None
+
+
+def ord_step_values(reaction):
+    """Same fields as parse_step, from an ORD Reaction's measurements rather than text.
+
+    A yield outside 0-100% (a mass or an amount entered as a percentage) is
+    left out and flagged with 'yield_rejected'.
+    """
+    from ord_schema.proto import reaction_pb2
+
+    values = {"yield_percent": None, "yield_steps": 1, "temperature_c": None,
+              "time_h": None, "reflux": False, "solvent": None, "yield_rejected": False}
+    for outcome in reaction.outcomes:
+        if values['yield_percent'] is None and not values['yield_rejected']:
+            percent = _ord_yield(outcome, reaction_pb2)
+            if percent is not None and 0 <= percent <= 100:
+                values['yield_percent'] = percent
+            elif percent is not None:
+                values['yield_rejected'] = True
+        if outcome.HasField('reaction_time') and values['time_h'] is None:
+            time = outcome.reaction_time
+            hours = {reaction_pb2.Time.HOUR: 1.0, reaction_pb2.Time.MINUTE: 1 / 60,
+                     reaction_pb2.Time.SECOND: 1 / 3600, reaction_pb2.Time.DAY: 24.0}.get(time.units)
+            if hours is not None:
+                values['time_h'] = time.value * hours
+
+    temperature = reaction.conditions.temperature
+    if temperature.HasField('setpoint'):
+        setpoint = temperature.setpoint
+        if setpoint.units == reaction_pb2.Temperature.FAHRENHEIT:
+            values['temperature_c'] = (setpoint.value - 32) * 5 / 9
+        elif setpoint.units == reaction_pb2.Temperature.KELVIN:
+            values['temperature_c'] = setpoint.value - 273.15
+        else:
+            values['temperature_c'] = setpoint.value
+    values['reflux'] = reaction.conditions.reflux
+
+    for key in reaction.inputs:
+        for component in reaction.inputs[key].components:
+            if component.reaction_role != reaction_pb2.ReactionRole.SOLVENT:
+                continue
+            for identifier in component.identifiers:
+                if identifier.type == reaction_pb2.CompoundIdentifier.NAME:
+                    values['solvent'] = SOLVENTS.get(_fold(identifier.value).strip().lower(), identifier.value)
+                    break
+            if values['solvent']:
+                return values
+    return values
+
+
+# -- corpus arrays -----------------------------------------------------------
+
+def _codes(labels):
+    """Integer codes for `labels` plus the sorted vocabulary they index."""
+    vocabulary = sorted(set(labels))
+    lookup = {label: i for i, label in enumerate(vocabulary)}
+    return np.array([lookup[label] for label in labels], dtype=np.int32), vocabulary
+
+
+class CorpusArrays:
+    """Every step of every route as parallel NumPy arrays."""
+
+    def __init__(self, routes):
+        """`routes` is a list of (route id, class, [parsed step dicts with 'reaction_type'])."""
+        self.route_ids = [route_id for route_id, _, _ in routes]
+        self.route_class, self.classes = _codes([route_class or 'Unclassified' for _, route_class, _ in routes])
+        steps = [(i, step) for i, (_, _, route_steps) in enumerate(routes) for step in route_steps]
+
+        def column(key, dtype=np.float64):
+            return np.array([np.nan if s[key] is None else s[key] for _, s in steps], dtype=dtype)
+
+        self.route = np.array([i for i, _ in steps], dtype=np.int32)
+        self.yield_percent = column('yield_percent')
+        self.yield_steps = np.array([s['yield_steps'] for _, s in steps], dtype=np.int32)
+        self.temperature_c = column('temperature_c')
+        self.time_h = column('time_h')
+        self.reflux = np.array([s['reflux'] for _, s in steps], dtype=bool)
+        self.reaction_type, self.reaction_types = _codes([s['reaction_type'] or 'Unspecified' for _, s in steps])
+        self.step_count = np.bincount(self.route, minlength=len(routes)).astype(np.int32)
+
+    def overall_yields(self):
+        """Product of step yields per route (percent); NaN unless every step is covered."""
+        known = ~np.isnan(self.yield_percent)
+        fractions = np.clip(self.yield_percent[known] / 100.0, 0.0, 1.0)
+        with np.errstate(divide='ignore'):
+            log_sum = np.bincount(self.route[known], weights=np.log(fractions), minlength=len(self.route_ids))
+        covered = np.bincount(self.route[known], weights=self.yield_steps[known], minlength=len(self.route_ids))
+        complete = (covered >= self.step_count) & (self.step_count > 0)
+        return np.where(complete, np.exp(log_sum) * 100.0, np.nan)
+
+
+def route_steps(synthesis):
+    """parse_step() of every step of a synthesis, plus its reaction_type."""
+    steps = []
+    for step in synthesis.get('sequence') or ():
+        if isinstance(step, dict):
+            values = parse_step(step)
+            values['reaction_type'] = (step.get('reaction_type') or '').strip()
+            steps.append(values)
+    return steps
+
+
+def load_corpus(index_file=INDEX_FILE):
+    with open(index_file, 'r') as f:
+        index = json.load(f)
+    routes = []
+    for entry in index:
+        relative_path = entry.get('path')
+        if not relative_path or not os.path.exists(public_path(relative_path)):
+            continue
+        try:
+            with open(public_path(relative_path), 'r', encoding='utf-8') as f:
+                synthesis = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error reading {relative_path}: {e}")
+            continue
+        routes.append((entry['id'], entry.get('class'), route_steps(synthesis)))
+    return CorpusArrays(routes)
+
+
+def load_ord(pb_files):
+    from ord_reader import iter_reactions
+
+    routes = []
+    rejected = 0
+    for path in pb_files:
+        with closing(iter_reactions(path)) as stream:
+            for reaction in stream:
+                values = ord_step_values(reaction)
+                values['reaction_type'] = 'ORD Reaction'
+                rejected += values['yield_rejected']
+                routes.append((reaction.reaction_id, 'ORD', [values]))
+    if rejected:
+        print(f"Left out {rejected} ORD yields outside 0-100%")
+    return CorpusArrays(routes)
+
+
+# -- aggregates --------------------------------------------------------------
+
+def _round(value):
+    return round(float(value), DECIMALS)
+
+
+def summarize(values):
+    """count/mean/median/quartiles/min/max of the non-NaN values."""
+    values = values[~np.isnan(values)]
+    if values.size == 0:
+        return {"count": 0}
+    p25, median, p75 = np.percentile(values, [25, 50, 75])
+    return {
+        "count": int(values.size),
+        "mean": _round(values.mean()),
+        "median": _round(median),
+        "p25": _round(p25),
+        "p75": _round(p75),
+        "min": _round(values.min()),
+        "max": _round(values.max()),
+    }
+
+
+def yield_histogram(values):
+    """Counts per 10% bin, 0-10 ... 90-100."""
+    values = values[~np.isnan(values)]
+    counts, _ = np.histogram(np.clip(values, 0.0, 100.0), bins=YIELD_BINS)
+    return counts.tolist()
+
+
+def step_count_histogram(step_counts):
+    counts = np.bincount(step_counts) if step_counts.size else np.zeros(0, dtype=np.int64)
+    return {str(n): int(c) for n, c in enumerate(counts) if c}
+
+
+def compute_stats(corpus):
+    overall = corpus.overall_yields()
+    stats = {
+        "routes": len(corpus.route_ids),
+        "steps": int(corpus.route.size),
+        "step_count_histogram": step_count_histogram(corpus.step_count),
+        "overall_yield": dict(summarize(overall), histogram=yield_histogram(overall)),
+        "step_yield": dict(summarize(corpus.yield_percent), histogram=yield_histogram(corpus.yield_percent)),
+        "route_overall_yield": {route_id: _round(value)
+                                for route_id, value in zip(corpus.route_ids, overall) if not np.isnan(value)},
+        "by_class": {},
+        "by_reaction_type": {},
+    }
+    step_class = corpus.route_class[corpus.route] if corpus.route.size else corpus.route
+    for code, name in enumerate(corpus.classes):
+        routes = corpus.route_class == code
+        steps = step_class == code
+        stats['by_class'][name] = {
+            "routes": int(routes.sum()),
+            "step_count_histogram": step_count_histogram(corpus.step_count[routes]),
+            "overall_yield": summarize(overall[routes]),
+            "step_yield": summarize(corpus.yield_percent[steps]),
+        }
+    for code, name in enumerate(corpus.reaction_types):
+        steps = corpus.reaction_type == code
+        stats['by_reaction_type'][name] = {
+            "steps": int(steps.sum()),
+            "yield": summarize(corpus.yield_percent[steps]),
+            "temperature_c": summarize(corpus.temperature_c[steps]),
+            "time_h": summarize(corpus.time_h[steps]),
+            "reflux": int(corpus.reflux[steps].sum()),
+        }
+    return stats
+
+
+def write_stats(stats, stats_file=STATS_FILE):
+    atomic_write_bytes(stats_file, json.dumps(stats, indent=4, ensure_ascii=False).encode('utf-8'))
+
+
+def build_stats(index_file=INDEX_FILE, stats_file=STATS_FILE, ord_files=()):
+    """Write stats.json. Returns the stats dict."""
+    corpus = load_corpus(index_file)
+    stats = dict(version=STATS_VERSION, **compute_stats(corpus))
+    if ord_files:
+        stats['ord'] = compute_stats(load_ord(ord_files))
+    write_stats(stats, stats_file)
+    print(f"Stats for {stats['routes']} routes / {stats['steps']} steps "
+          f"({stats['overall_yield']['count']} with an overall yield) written to {stats_file}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute library-wide route statistics for the UI.")
+    parser.add_argument("--ord", nargs="*", default=[], metavar="DATASET",
+                        help="Also summarize these ORD .pb.gz files, from their measurements")
+    args = parser.parse_args()
+    build_stats(ord_files=args.ord)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""Reconstruct multi-step routes by chaining ORD reactions on shared molecules.
+
+ORD almost never fills in links between reactions, so each reaction is a
+one-step "sequence" on its own. This joins them: a reaction whose
+REACTANT is (canonically) the same molecule as another reaction's product
+follows it in a route.
+
+Pass 1 streams every shard once and builds a product -> reactant graph
+keyed by integer molecule ids. Only up to --max-producers reactions are
+kept per product molecule, and molecules used as a reactant in more than
+--max-fanout reactions (solvents, common reagents mis-tagged as
+reactants) are not followed, so memory scales with the number of unique
+molecules rather than reactions.
+
+Chains up to --depth steps are enumerated backwards from each product.
+Pass 2 re-streams the shards and maps only the reactions that appear in a
+chosen route, then writes them as schema.json files with a real
+`sequence` under public/data/ord_routes/ and updates index.json.
+
+Usage:
+    python route_builder.py [DATASET ...] [--depth 5] [--min-steps 2] [--max-routes 100]
+"""
+
+import os
+import argparse
+from contextlib import closing
+
+from ord_reader import iter_reactions, find_dataset_files
+from smiles_utils import canonical_smiles
+from index_store import DATA_DIR, IndexStore
+from fetch_real_ord_data import map_reaction
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ROUTES_PREFIX = '/data/ord_routes/'
+DEFAULT_DEPTH = 5
+DEFAULT_MIN_STEPS = 2
+DEFAULT_MAX_ROUTES = 100
+DEFAULT_MAX_PRODUCERS = 8
+DEFAULT_MAX_FANOUT = 1000
+
+
+class RouteGraph:
+    """Molecule-keyed reaction graph built in one streaming pass."""
+
+    def __init__(self, max_producers=DEFAULT_MAX_PRODUCERS):
+        self.max_producers = max_producers
+        self.molecule_ids = {}       # canonical SMILES -> id
+        self.molecule_smiles = []    # id -> SMILES as first seen
+        self.producers = {}          # product id -> [reaction ref, ...]
+        self.reactants = {}          # reaction ref -> tuple of reactant ids
+        self.reactant_uses = {}      # molecule id -> number of reactions using it
+        self.reactions_seen = 0
+
+    def molecule_id(self, smiles):
+        key = canonical_smiles(smiles)
+        if not key:
+            return None
+        mol_id = self.molecule_ids.get(key)
+        if mol_id is None:
+            mol_id = len(self.molecule_smiles)
+            self.molecule_ids[key] = mol_id
+            self.molecule_smiles.append(smiles)
+        return mol_id
+
+    def add_reaction(self, ref, reactant_smiles, product_smiles):
+        """Record a reaction; `ref` is any hashable handle used to find it again."""
+        self.reactions_seen += 1
+        reactant_ids = tuple(sorted({i for i in map(self.molecule_id, reactant_smiles) if i is not None}))
+        for mol_id in reactant_ids:
+            self.reactant_uses[mol_id] = self.reactant_uses.get(mol_id, 0) + 1
+        kept = False
+        for mol_id in {i for i in map(self.molecule_id, product_smiles) if i is not None}:
+            refs = self.producers.setdefault(mol_id, [])
+            if len(refs) < self.max_producers and mol_id not in reactant_ids:
+                refs.append(ref)
+                kept = True
+        if kept:
+            self.reactants[ref] = reactant_ids
+
+    def _main_reactant(self, reactant_ids):
+        # Without atom mapping, the largest reactant is the best guess at the substrate
+        return max(reactant_ids, key=lambda i: len(self.molecule_smiles[i]))
+
+    def chains(self, depth, min_steps, max_fanout=DEFAULT_MAX_FANOUT, targets=None, limit=None):
+        """Yield routes as lists of (reaction ref, input molecule id, output molecule id), first step first.
+
+        A chain branches only on reactants that some other reaction produces,
+        and is yielded once it can't be extended further back or reaches
+        `depth` steps. Targets default to every product, final products
+        (never used as a reactant) first.
+        """
+        if targets is None:
+            targets = sorted(self.producers, key=lambda m: self.reactant_uses.get(m, 0) > 0)
+        emitted = 0
+        for target in targets:
+            stack = [(target, [])]
+            while stack:
+                molecule, suffix = stack.pop()
+                finished = []
+                if len(suffix) >= depth:
+                    finished.append(suffix)
+                else:
+                    on_route = {step[2] for step in suffix} | {molecule}
+                    for ref in self.producers.get(molecule, ()):
+                        reactants = self.reactants.get(ref, ())
+                        upstream = [r for r in reactants
+                                    if r in self.producers and r not in on_route
+                                    and self.reactant_uses.get(r, 0) <= max_fanout]
+                        for reactant in upstream:
+                            stack.append((reactant, [(ref, reactant, molecule)] + suffix))
+                        if reactants and not upstream:
+                            finished.append([(ref, self._main_reactant(reactants), molecule)] + suffix)
+                for chain in finished:
+                    if len(chain) >= min_steps:
+                        yield chain
+                        emitted += 1
+                        if limit is not None and emitted >= limit:
+                            return
+
+
+def _role_smiles(reaction):
+    from ord_schema.proto import reaction_pb2
+    SMILES = reaction_pb2.CompoundIdentifier.SMILES
+    chaining_roles = (reaction_pb2.ReactionRole.REACTANT, reaction_pb2.ReactionRole.UNSPECIFIED)
+
+    reactants = []
+    for input_key in reaction.inputs:
+        for comp in reaction.inputs[input_key].components:
+            if comp.reaction_role in chaining_roles:
+                reactants.extend(i.value for i in comp.identifiers if i.type == SMILES)
+    products = []
+    for outcome in reaction.outcomes:
+        for product in outcome.products:
+            products.extend(i.value for i in product.identifiers if i.type == SMILES)
+    return reactants, products
+
+
+def build_graph(pb_files, max_producers=DEFAULT_MAX_PRODUCERS):
+    graph = RouteGraph(max_producers)
+    for shard_index, pb_file in enumerate(pb_files):
+        print(f"Indexing {os.path.basename(pb_file)}...")
+        with closing(iter_reactions(pb_file)) as stream:
+            for position, reaction in enumerate(stream):
+                reactants, products = _role_smiles(reaction)
+                graph.add_reaction((shard_index, position), reactants, products)
+    print(f"Graph: {graph.reactions_seen} reactions, {len(graph.molecule_smiles)} molecules, "
+          f"{len(graph.reactants)} reactions kept as producers")
+    return graph
+
+
+def load_mapped(pb_files, refs):
+    """Second pass: map only the reactions in `refs`. Returns {ref: mapped step}."""
+    wanted = {}
+    for shard_index, position in refs:
+        wanted.setdefault(shard_index, set()).add(position)
+    mapped = {}
+    for shard_index, positions in sorted(wanted.items()):
+        last = max(positions)
+        with closing(iter_reactions(pb_files[shard_index], limit=last + 1)) as stream:
+            for position, reaction in enumerate(stream):
+                if position in positions:
+                    mapped[(shard_index, position)] = map_reaction(reaction)
+    return mapped
+
+
+def route_to_synthesis(route_id, chain, graph, mapped):
+    """Build a schema.json document from a chain and its mapped reactions."""
+    sequence = []
+    for step_id, (ref, input_id, output_id) in enumerate(chain, start=1):
+        rxn = mapped.get(ref)
+        step = dict(rxn['sequence'][0]) if rxn else {
+            "reaction_type": "Synthesis", "reagents": "", "conditions": "Standard Conditions",
+            "yield": "N/A", "notes": "Imported from Open Reaction Database",
+        }
+        step['step_id'] = step_id
+        step['reactant_smiles'] = graph.molecule_smiles[input_id]
+        step['product_smiles'] = graph.molecule_smiles[output_id]
+        sequence.append({k: step[k] for k in ("step_id", "reaction_type", "reagents", "conditions",
+                                              "yield", "reactant_smiles", "product_smiles", "notes")})
+
+    final = mapped.get(chain[-1][0])
+    meta = dict(final['meta']) if final else {
+        "molecule_name": "Chemical Product", "author": "ORD Contributor", "year": 2020,
+    }
+    meta['id'] = route_id
+    meta['class'] = "ORD Route"
+    return {"$schema": "../schema.json", "meta": meta, "sequence": sequence}
+
+
+def build_routes(pb_files, depth=DEFAULT_DEPTH, min_steps=DEFAULT_MIN_STEPS, max_routes=DEFAULT_MAX_ROUTES,
+                 max_producers=DEFAULT_MAX_PRODUCERS, max_fanout=DEFAULT_MAX_FANOUT, target=None):
+    graph = build_graph(pb_files, max_producers)
+    targets = None
+    if target:
+        target_id = graph.molecule_ids.get(canonical_smiles(target))
+        targets = [target_id] if target_id is not None else []
+    chains = list(graph.chains(depth, min_steps, max_fanout, targets=targets, limit=max_routes))
+    print(f"Found {len(chains)} routes of {min_steps}-{depth} steps")
+    if not chains:
+        return []
+
+    mapped = load_mapped(pb_files, {ref for chain in chains for ref, _, _ in chain})
+
+    store = IndexStore()
+    entries = []
+    for n, chain in enumerate(chains, start=1):
+        route_id = f"ord-route-{n}"
+        synthesis = route_to_synthesis(route_id, chain, graph, mapped)
+        relative_path = f"{ROUTES_PREFIX}{route_id}.json"
+        stats = store.write_synthesis(relative_path, synthesis)
+        entries.append({
+            "id": route_id,
+            "molecule_name": synthesis['meta']['molecule_name'],
+            "class": "ORD Route",
+            "author": "ORD",
+            "year": 2024,
+            "path": relative_path,
+            **stats
+        })
+    store.replace_under(ROUTES_PREFIX, entries)
+    store.save()
+    print(f"Wrote {len(entries)} routes to {os.path.join(DATA_DIR, 'ord_routes')} "
+          f"({store.files_written} files written, {store.files_skipped} unchanged)")
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chain ORD reactions into multi-step routes.")
+    parser.add_argument("paths", nargs="*", default=[SCRIPT_DIR],
+                        help="Dataset files or directories (searched recursively)")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help="Maximum steps per route")
+    parser.add_argument("--min-steps", type=int, default=DEFAULT_MIN_STEPS)
+    parser.add_argument("--max-routes", type=int, default=DEFAULT_MAX_ROUTES)
+    parser.add_argument("--max-producers", type=int, default=DEFAULT_MAX_PRODUCERS,
+                        help="Reactions kept per product molecule")
+    parser.add_argument("--max-fanout", type=int, default=DEFAULT_MAX_FANOUT,
+                        help="Skip reactant molecules used by more than this many reactions")
+    parser.add_argument("--target", help="Only build routes ending in this product SMILES")
+    args = parser.parse_args()
+
+    build_routes(find_dataset_files(args.paths), args.depth, args.min_steps, args.max_routes,
+                 args.max_producers, args.max_fanout, args.target)
+
+
+if __name__ == "__main__":
+    main()
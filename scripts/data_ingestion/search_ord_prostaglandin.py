@@ -2,10 +2,13 @@
 """Search ORD datasets for prostaglandin-related reactions."""
 
 import os
-import glob
-import gzip
-from ord_schema import message_helpers
-from ord_schema.proto import dataset_pb2, reaction_pb2
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from ord_reader import find_dataset_files
+from ord_wire import reaction_stream, IDENTIFIER_NAME, IDENTIFIER_SMILES
+from pattern_matcher import PatternMatcher, load_patterns
+from ord_index import OrdIndex, NAME_COLUMNS, SMILES_COLUMNS
+from instrumentation import PROFILER, stage, count, add_profile_arguments, start_profiling, finish_profiling
 
 # Keywords to search for
 KEYWORDS = [
@@ -19,62 +22,173 @@ SMILES_PATTERNS = [
     'C=C(C#N)Cl',  # 2-chloroacrylonitrile
 ]
 
-def search_dataset(dataset_path):
-    """Search a single dataset for matching reactions."""
+# Compiled once from the lists above; rebuilt by set_patterns() when the
+# command line supplies keyword or pattern files.
+NAME_MATCHER = PatternMatcher(KEYWORDS, ignore_case=True)
+SMILES_MATCHER = PatternMatcher(SMILES_PATTERNS)
+
+def set_patterns(keywords, smiles_patterns):
+    """Replace the search keywords/patterns. Also used as the worker pool initializer."""
+    global KEYWORDS, SMILES_PATTERNS, NAME_MATCHER, SMILES_MATCHER
+    KEYWORDS = list(keywords)
+    SMILES_PATTERNS = list(smiles_patterns)
+    NAME_MATCHER = PatternMatcher(KEYWORDS, ignore_case=True)
+    SMILES_MATCHER = PatternMatcher(SMILES_PATTERNS)
+
+def search_dataset(dataset_path, limit=None, full=False):
+    """Search a single dataset (or its first `limit` reactions) for matching reactions.
+
+    Reactions are wire-decoded (ord_wire.py) unless `full` asks for
+    complete ord_schema messages.
+    """
     matches = []
 
     try:
-        dataset = message_helpers.load_message(dataset_path, dataset_pb2.Dataset)
+        for rxn in reaction_stream(dataset_path, limit=limit, full=full):
+            with stage('match'):
+                match_info = match_reaction(rxn)
+            if match_info:
+                count('reactions_kept')
+                matches.append(match_info)
     except Exception as e:
         print(f"  Error loading {dataset_path}: {e}")
-        return matches
-
-    for rxn in dataset.reactions:
-        found = False
-        match_info = {'reaction_id': rxn.reaction_id, 'matches': []}
-
-        # Search in product identifiers
-        for outcome in rxn.outcomes:
-            for product in outcome.products:
-                for ident in product.identifiers:
-                    # Check NAME type
-                    if ident.type == reaction_pb2.CompoundIdentifier.NAME:
-                        for kw in KEYWORDS:
-                            if kw.lower() in ident.value.lower():
-                                match_info['matches'].append(f"Product name: {ident.value}")
-                                found = True
-                    # Check SMILES type
-                    if ident.type == reaction_pb2.CompoundIdentifier.SMILES:
-                        for pattern in SMILES_PATTERNS:
-                            if pattern in ident.value:
-                                match_info['matches'].append(f"Product SMILES match: {ident.value[:50]}...")
-                                found = True
-
-        # Search in reactant identifiers
-        for input_key in rxn.inputs:
-            inp = rxn.inputs[input_key]
-            for comp in inp.components:
-                for ident in comp.identifiers:
-                    if ident.type == reaction_pb2.CompoundIdentifier.NAME:
-                        for kw in KEYWORDS:
-                            if kw.lower() in ident.value.lower():
-                                match_info['matches'].append(f"Reactant name: {ident.value}")
-                                found = True
-                    if ident.type == reaction_pb2.CompoundIdentifier.SMILES:
-                        for pattern in SMILES_PATTERNS:
-                            if pattern in ident.value:
-                                match_info['matches'].append(f"Reactant SMILES match: {ident.value[:50]}...")
-                                found = True
-
-        if found:
-            matches.append(match_info)
 
     return matches
 
+def match_identifiers(identifiers, label, matches):
+    """Append a match line for every keyword/pattern hit in `identifiers`."""
+    for ident in identifiers:
+        # Check NAME type
+        if ident.type == IDENTIFIER_NAME:
+            for _ in NAME_MATCHER.find(ident.value):
+                matches.append(f"{label} name: {ident.value}")
+        # Check SMILES type
+        elif ident.type == IDENTIFIER_SMILES:
+            for _ in SMILES_MATCHER.find(ident.value):
+                matches.append(f"{label} SMILES match: {ident.value[:50]}...")
+
+def match_reaction(rxn):
+    """Return match info for a reaction, or None if nothing matched."""
+    matches = []
+
+    # Search in product identifiers
+    for outcome in rxn.outcomes:
+        for product in outcome.products:
+            match_identifiers(product.identifiers, "Product", matches)
+
+    # Search in reactant identifiers
+    for input_key in rxn.inputs:
+        for comp in rxn.inputs[input_key].components:
+            match_identifiers(comp.identifiers, "Reactant", matches)
+
+    if matches:
+        return {'reaction_id': rxn.reaction_id, 'matches': matches}
+    return None
+
+def search_shard(dataset_path, full=False):
+    """Process-pool work unit: search one shard and return compact match records.
+
+    Records are (reaction_index, reaction_id, matches) tuples so only small,
+    cheaply pickled data crosses the process boundary. The instrumentation
+    recorded for this shard comes back too, for the parent to merge.
+    """
+    records = []
+    checkpoint = PROFILER.checkpoint()
+    try:
+        for index, rxn in enumerate(reaction_stream(dataset_path, full=full)):
+            with stage('match'):
+                match_info = match_reaction(rxn)
+            if match_info:
+                count('reactions_kept')
+                records.append((index, match_info['reaction_id'], tuple(match_info['matches'])))
+    except Exception as e:
+        return dataset_path, records, str(e), PROFILER.since(checkpoint)
+    return dataset_path, records, None, PROFILER.since(checkpoint)
+
+def parallel_search(pb_files, workers, full=False):
+    """Search shards across a process pool.
+
+    Returns {shard: [match_info, ...]} with matches in reaction order, so the
+    output is the same regardless of which worker finishes first.
+    """
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=set_patterns,
+                             initargs=(KEYWORDS, SMILES_PATTERNS)) as pool:
+        futures = [pool.submit(search_shard, pb_file, full) for pb_file in pb_files]
+        for done, future in enumerate(as_completed(futures), start=1):
+            pb_file, records, error, profile = future.result()
+            PROFILER.merge(profile)
+            results[pb_file] = records
+            status = f"error: {error}" if error else f"{len(records)} matches"
+            print(f"  [{done}/{len(pb_files)}] {os.path.basename(pb_file)}: {status}")
+
+    return {
+        pb_file: [{'reaction_id': reaction_id, 'matches': list(matches)}
+                  for _, reaction_id, matches in sorted(results[pb_file])]
+        for pb_file in pb_files
+    }
+
+def search_index(index):
+    """Answer the keyword/pattern search from a prebuilt ord_index.
+
+    Returns {dataset: [match_info, ...]} like parallel_search, without
+    touching the .pb.gz files. Each column is read once, with the compiled
+    matchers finding every keyword/pattern in a value at the same time.
+    """
+    found = {}
+    for label, role in (("Product", 'product'), ("Reactant", 'reactant')):
+        for row, value in index.column_values(NAME_COLUMNS[role]):
+            for _ in NAME_MATCHER.find(value):
+                found.setdefault(row, []).append(f"{label} name: {value}")
+        for row, value in index.column_values(SMILES_COLUMNS[role]):
+            for _ in SMILES_MATCHER.find(value):
+                found.setdefault(row, []).append(f"{label} SMILES match: {value[:50]}...")
+
+    results = {shard: [] for shard in index.shards}
+    for row in sorted(found):
+        shard = index.shards[index.shard[row]]
+        results[shard].append({'reaction_id': index.reaction_id(row), 'matches': found[row]})
+    return results
+
+def report_matches(pb_file, matches):
+    print(f"\nSearching: {os.path.basename(pb_file)}")
+    if matches:
+        print(f"  Found {len(matches)} matching reactions!")
+        for m in matches[:5]:  # Show first 5
+            print(f"    - {m['reaction_id']}")
+            for info in m['matches'][:2]:
+                print(f"      {info}")
+    else:
+        print("  No matches found")
+
 def main():
-    # Look for downloaded .pb.gz files in the scripts directory
+    # Default to downloaded .pb.gz files in the scripts directory
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    pb_files = glob.glob(os.path.join(script_dir, "*.pb.gz"))
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("paths", nargs="*", default=[script_dir],
+                        help="Dataset files or directories to search (directories are searched recursively)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes; 1 searches sequentially in this process")
+    parser.add_argument("--keywords-file",
+                        help="File with one name keyword per line (replaces the built-in KEYWORDS)")
+    parser.add_argument("--patterns-file",
+                        help="File with one SMILES substring per line (replaces the built-in SMILES_PATTERNS)")
+    parser.add_argument("--index",
+                        help="Search a prebuilt ord_index directory instead of parsing the datasets")
+    parser.add_argument("--full-parse", action="store_true",
+                        help="Parse complete ord_schema Reactions instead of wire-decoding only the searched fields")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    start_profiling(args)
+
+    if args.keywords_file or args.patterns_file:
+        set_patterns(
+            load_patterns(args.keywords_file) if args.keywords_file else KEYWORDS,
+            load_patterns(args.patterns_file) if args.patterns_file else SMILES_PATTERNS,
+        )
+
+    index = OrdIndex(args.index) if args.index else None
+    pb_files = index.shards if index else find_dataset_files(args.paths)
 
     print(f"Found {len(pb_files)} dataset files to search")
     print(f"Keywords: {KEYWORDS}")
@@ -83,18 +197,26 @@ def main():
 
     all_matches = []
 
-    for pb_file in pb_files:
-        print(f"\nSearching: {os.path.basename(pb_file)}")
-        matches = search_dataset(pb_file)
-        if matches:
-            print(f"  Found {len(matches)} matching reactions!")
-            for m in matches[:5]:  # Show first 5
-                print(f"    - {m['reaction_id']}")
-                for info in m['matches'][:2]:
-                    print(f"      {info}")
+    workers = min(args.workers, len(pb_files))
+    if index:
+        with stage('index_search'):
+            results = search_index(index)
+        for pb_file in pb_files:
+            report_matches(pb_file, results[pb_file])
+            all_matches.extend(results[pb_file])
+    elif workers > 1:
+        print(f"Searching with {workers} worker processes...")
+        with stage('search'):
+            results = parallel_search(pb_files, workers, args.full_parse)
+        for pb_file in pb_files:
+            report_matches(pb_file, results[pb_file])
+            all_matches.extend(results[pb_file])
+    else:
+        for pb_file in pb_files:
+            with stage('search'):
+                matches = search_dataset(pb_file, full=args.full_parse)
+            report_matches(pb_file, matches)
             all_matches.extend(matches)
-        else:
-            print("  No matches found")
 
     print("\n" + "=" * 60)
     print(f"TOTAL: {len(all_matches)} matching reactions found")
@@ -104,5 +226,7 @@ def main():
         for m in all_matches:
             print(f"  {m['reaction_id']}")
 
+    finish_profiling(args)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""Lightweight SMILES helpers that work without RDKit.
+
+These only look at SMILES text: tokenizing, and a rough molecular graph
+(atom elements, bonds between atoms, ring count) good enough for screening.
+They do not perceive aromaticity or validate valences.
+"""
+
+import re
+import functools
+
+try:
+    # Unparseable input just gives None; don't print RDKit's complaint about it
+    from rdkit import Chem, RDLogger
+    RDLogger.DisableLog('rdApp.*')
+except ImportError:
+    Chem = None
+
+# One token per atom, bond, branch, ring closure or dot
+TOKEN_PATTERN = re.compile(
+    r"(\[[^\]]*\]|Br|Cl|B|C|N|O|S|P|F|I|b|c|n|o|s|p|\*|\(|\)|\.|=|#|-|\+|\\|/|:|~|@|\?|>|\$|%\d{2}|\d)"
+)
+BRACKET_ELEMENT = re.compile(r"^\[\d*([A-Z][a-z]?|[a-z][a-z]?|\*)")
+BOND_TOKENS = {'-', '=', '#', '$', ':', '/', '\\', '~'}
+
+
+def tokenize(smiles):
+    """Split a SMILES string into tokens. Unrecognised characters raise ValueError."""
+    tokens = TOKEN_PATTERN.findall(smiles)
+    if sum(len(t) for t in tokens) != len(smiles):
+        raise ValueError(f"Unrecognised characters in SMILES: {smiles!r}")
+    return tokens
+
+
+def atom_element(token):
+    """Return the element symbol for an atom token ('c' -> 'C'), or None for non-atoms."""
+    if token.startswith('['):
+        match = BRACKET_ELEMENT.match(token)
+        symbol = match.group(1) if match else '*'
+    elif token[0].isalpha() or token == '*':
+        symbol = token
+    else:
+        return None
+    return symbol.capitalize()
+
+
+def parse_graph(smiles, strict=True):
+    """Return (elements, edges, ring_count) for a SMILES string.
+
+    `edges` are (atom_index, atom_index) pairs; bond orders are ignored.
+    With strict=False, SMILES fragments (substrings) can be parsed too:
+    unbalanced branches are tolerated and ring-closure digits are ignored,
+    since a digit in a fragment may close a ring opened before the fragment
+    starts ("N1.S1" in "C1CN1.S1CC1" bonds neither N to S nor anything
+    else the fragment can see). Fragments therefore report no ring bonds
+    and a ring count of 0.
+    """
+    elements = []
+    edges = []
+    ring_count = 0
+    open_rings = {}
+    branch_stack = []
+    prev = None
+    for token in tokenize(smiles):
+        element = atom_element(token)
+        if element is not None:
+            index = len(elements)
+            elements.append(element)
+            if prev is not None:
+                edges.append((prev, index))
+            prev = index
+        elif token == '(':
+            branch_stack.append(prev)
+        elif token == ')':
+            if branch_stack:
+                prev = branch_stack.pop()
+            elif strict:
+                raise ValueError(f"Unbalanced ')' in SMILES: {smiles!r}")
+            else:
+                prev = None
+        elif token == '.':
+            prev = None
+        elif token[0] == '%' or token.isdigit():
+            if not strict:
+                continue
+            if prev is None:
+                raise ValueError(f"Ring closure without an atom in SMILES: {smiles!r}")
+            if token in open_rings:
+                edges.append((open_rings.pop(token), prev))
+                ring_count += 1
+            else:
+                open_rings[token] = prev
+    if open_rings and strict:
+        raise ValueError(f"Unclosed ring in SMILES: {smiles!r}")
+    return elements, edges, ring_count
+
+
+def heavy_atom_count(smiles):
+    """Number of non-hydrogen atoms in a SMILES string. Unrecognised characters raise ValueError."""
+    return sum(1 for token in tokenize(smiles) if atom_element(token) not in (None, 'H'))
+
+
+def syntax_errors(smiles):
+    """Fast structural check of a SMILES string. Returns a list of problems (empty if none).
+
+    Checks for unrecognised characters, unbalanced square brackets and
+    branches, and unpaired ring closures. Bracket contents are not
+    interpreted, so the custom abbreviations our SmilesDrawer fork accepts
+    (`[OEt]`, `[TBDPS]`) pass.
+    """
+    if not smiles or not smiles.strip():
+        return ["empty SMILES"]
+    errors = []
+    tokens = TOKEN_PATTERN.findall(smiles)
+    if sum(len(t) for t in tokens) != len(smiles):
+        leftover = TOKEN_PATTERN.sub('', smiles)
+        if '[' in leftover or ']' in leftover:
+            errors.append("unbalanced square brackets")
+        other = sorted(set(leftover) - {'[', ']'})
+        if other:
+            errors.append(f"unrecognised characters {''.join(other)!r}")
+
+    depth = 0
+    open_rings = set()
+    has_atom = False
+    atoms = 0
+    for token in tokens:
+        if token == '[]':
+            errors.append("empty bracket atom")
+        elif token == '(':
+            if not has_atom:
+                errors.append("branch before any atom")
+            depth += 1
+        elif token == ')':
+            if depth == 0:
+                errors.append("unbalanced ')'")
+            else:
+                depth -= 1
+        elif token == '.':
+            has_atom = False
+        elif token[0] == '%' or token.isdigit():
+            if not has_atom:
+                errors.append(f"ring closure {token} before any atom")
+            open_rings ^= {token}
+        elif atom_element(token) is not None:
+            has_atom = True
+            atoms += 1
+    if not atoms:
+        errors.append("no atoms")
+    if depth:
+        errors.append(f"{depth} unclosed '('")
+    if open_rings:
+        errors.append(f"unclosed ring closure {', '.join(sorted(open_rings))}")
+    if tokens and tokens[-1] in BOND_TOKENS:
+        errors.append("ends with a bond")
+    return errors
+
+
+ATOM_MAP_PATTERN = re.compile(r"(\[[^\]:]*):\d+\]")
+CANONICAL_CACHE_SIZE = 1 << 16
+
+
+def normalize_smiles(smiles):
+    """Cheap text normalization: trim whitespace and drop atom-map numbers."""
+    return ATOM_MAP_PATTERN.sub(r"\1]", smiles.strip())
+
+
+def canonical_smiles(smiles):
+    """Canonical SMILES via RDKit when installed, else normalize_smiles().
+
+    Returns None when RDKit is installed and cannot parse the input.
+    """
+    normalized = normalize_smiles(smiles)
+    if Chem is None:
+        return normalized
+    mol = Chem.MolFromSmiles(normalized)
+    return Chem.MolToSmiles(mol) if mol is not None else None
+
+
+@functools.lru_cache(maxsize=CANONICAL_CACHE_SIZE)
+def cached_canonical_smiles(smiles):
+    """canonical_smiles() memoized, for passes that see the same molecules over and over."""
+    return canonical_smiles(smiles)
+
+
+def canonical_method():
+    """'rdkit' or 'normalized': which canonical form canonical_smiles() produces."""
+    return 'rdkit' if Chem is not None else 'normalized'
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""Fingerprint-screened substructure search over the ORD identifier index.
+
+Building computes one bit-vector fingerprint per unique compound SMILES in
+an ord_index and stores them as a packed NumPy array. A query is screened
+with vectorized bitwise tests (every query bit must be set in the compound)
+and only the survivors get the exact check.
+
+With RDKit installed, fingerprints are RDKit pattern fingerprints and the
+exact check is a real substructure match, so equivalent structures written
+differently are found. Without RDKit, fingerprints are hashed element
+counts, element-pair bonds and ring counts read from the SMILES text, and
+the exact check falls back to a SMILES substring test.
+
+Usage:
+    python substructure_search.py build [--index DIR]
+    python substructure_search.py query SMILES [--index DIR] [--role product]
+"""
+
+import os
+import sys
+import json
+import zlib
+import argparse
+from array import array
+
+import numpy as np
+
+from ord_index import OrdIndex, DEFAULT_INDEX_DIR, SMILES_COLUMNS
+from smiles_utils import parse_graph
+
+try:
+    from rdkit import Chem, RDLogger
+    RDLogger.DisableLog('rdApp.*')
+except ImportError:
+    Chem = None
+
+FINGERPRINT_DIR = 'fingerprints'
+DEFAULT_BITS = 1024
+# Compounds are screened in blocks so temporaries stay small on huge tables
+SCREEN_BLOCK_SIZE = 1 << 18
+ROLE_CODES = {'product': 0, 'reactant': 1}
+MAX_COUNT_FEATURE = 8
+
+
+def _text_features(smiles, strict=True):
+    """Features that any superstructure's SMILES is guaranteed to also produce."""
+    elements, edges, ring_count = parse_graph(smiles, strict=strict)
+    counts = {}
+    for element in elements:
+        counts[element] = counts.get(element, 0) + 1
+    features = []
+    for element, count in counts.items():
+        features.extend(f"E:{element}:{k}" for k in range(1, min(count, MAX_COUNT_FEATURE) + 1))
+    for a, b in edges:
+        pair = sorted((elements[a], elements[b]))
+        features.append(f"P:{pair[0]}-{pair[1]}")
+    features.extend(f"R:{k}" for k in range(1, min(ring_count, MAX_COUNT_FEATURE) + 1))
+    return features
+
+
+def fingerprint(smiles, bits, method, query=False):
+    """Return the fingerprint of `smiles` as a packed uint8 array, or None if it can't be parsed."""
+    fp = np.zeros(bits, dtype=bool)
+    if method == 'rdkit':
+        mol = Chem.MolFromSmarts(smiles) if query else Chem.MolFromSmiles(smiles)
+        if mol is None:
+            return None
+        on_bits = list(Chem.PatternFingerprint(mol, fpSize=bits).GetOnBits())
+        fp[on_bits] = True
+    else:
+        try:
+            # Queries may be SMILES fragments rather than whole molecules
+            features = _text_features(smiles, strict=not query)
+        except ValueError:
+            return None
+        for feature in features:
+            fp[zlib.crc32(feature.encode('utf-8')) % bits] = True
+    return np.packbits(fp)
+
+
+class _ExactMatcher:
+    def __init__(self, query, method):
+        self.query = query
+        self.pattern = Chem.MolFromSmarts(query) if method == 'rdkit' else None
+
+    def __call__(self, smiles):
+        if self.pattern is None:
+            return self.query in smiles
+        mol = Chem.MolFromSmiles(smiles)
+        return mol is not None and mol.HasSubstructMatch(self.pattern)
+
+
+def build_fingerprints(index_dir=DEFAULT_INDEX_DIR, bits=DEFAULT_BITS):
+    """Fingerprint every unique product/reactant SMILES in an ord_index."""
+    index = OrdIndex(index_dir)
+    method = 'rdkit' if Chem is not None else 'text'
+    out_dir = os.path.join(index_dir, FINGERPRINT_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+
+    compound_ids = {}
+    member_compounds, member_rows, member_roles = array('q'), array('q'), array('B')
+    for role, code in ROLE_CODES.items():
+        column = index.strings[SMILES_COLUMNS[role]]
+        for row in range(len(index)):
+            for smiles in column.values(row):
+                member_compounds.append(compound_ids.setdefault(smiles, len(compound_ids)))
+                member_rows.append(row)
+                member_roles.append(code)
+
+    smiles_list = list(compound_ids)
+    packed = np.zeros((len(smiles_list), bits // 8), dtype=np.uint8)
+    valid = np.ones(len(smiles_list), dtype=bool)
+    for compound_id, smiles in enumerate(smiles_list):
+        fp = fingerprint(smiles, bits, method)
+        if fp is None:
+            valid[compound_id] = False
+        else:
+            packed[compound_id] = fp
+
+    # CSR layout: compound i's reactions are member_rows[offsets[i]:offsets[i + 1]]
+    compounds = np.frombuffer(member_compounds, dtype=np.int64)
+    rows = np.frombuffer(member_rows, dtype=np.int64)
+    order = np.lexsort((rows, compounds))
+    offsets = np.searchsorted(compounds[order], np.arange(len(smiles_list) + 1))
+
+    np.save(os.path.join(out_dir, 'bits.npy'), packed)
+    np.save(os.path.join(out_dir, 'valid.npy'), valid)
+    np.save(os.path.join(out_dir, 'offsets.npy'), offsets.astype(np.int64))
+    np.save(os.path.join(out_dir, 'member_rows.npy'), rows[order].astype(np.uint32))
+    np.save(os.path.join(out_dir, 'member_roles.npy'), np.frombuffer(member_roles, dtype=np.uint8)[order])
+    with open(os.path.join(out_dir, 'smiles.txt'), 'w', encoding='utf-8', newline='\n') as f:
+        for smiles in smiles_list:
+            f.write(smiles.replace('\n', ' ') + '\n')
+    with open(os.path.join(out_dir, 'meta.json'), 'w') as f:
+        json.dump({"method": method, "bits": bits, "compounds": len(smiles_list)}, f, indent=4)
+
+    print(f"Fingerprinted {len(smiles_list)} compounds ({int((~valid).sum())} unparseable) "
+          f"with {method} fingerprints")
+
+
+class FingerprintStore:
+    """Loaded fingerprints for one ord_index directory."""
+
+    def __init__(self, index_dir=DEFAULT_INDEX_DIR):
+        fp_dir = os.path.join(index_dir, FINGERPRINT_DIR)
+        with open(os.path.join(fp_dir, 'meta.json'), 'r') as f:
+            self.meta = json.load(f)
+        if self.meta['method'] == 'rdkit' and Chem is None:
+            raise RuntimeError("Fingerprints were built with RDKit, which is not installed")
+        self.index = OrdIndex(index_dir)
+        self.bits = np.load(os.path.join(fp_dir, 'bits.npy'))
+        self.words = self.bits.view(np.uint64)
+        self.valid = np.load(os.path.join(fp_dir, 'valid.npy'))
+        self.offsets = np.load(os.path.join(fp_dir, 'offsets.npy'))
+        self.member_rows = np.load(os.path.join(fp_dir, 'member_rows.npy'))
+        self.member_roles = np.load(os.path.join(fp_dir, 'member_roles.npy'))
+        with open(os.path.join(fp_dir, 'smiles.txt'), 'r', encoding='utf-8', newline='\n') as f:
+            self.smiles = f.read().split('\n')[:-1]
+
+    def screen(self, query_fp):
+        """Return compound ids whose fingerprint contains every bit of `query_fp`."""
+        q = query_fp.view(np.uint64)
+        survivors = []
+        for start in range(0, len(self.words), SCREEN_BLOCK_SIZE):
+            block = self.words[start:start + SCREEN_BLOCK_SIZE]
+            hit = np.all((block & q) == q, axis=1) & self.valid[start:start + SCREEN_BLOCK_SIZE]
+            survivors.append(np.nonzero(hit)[0] + start)
+        return np.concatenate(survivors) if survivors else np.zeros(0, dtype=np.int64)
+
+    def search(self, query, role=None):
+        """Return (reaction_ids, stats) for reactions with a compound containing `query`."""
+        method = self.meta['method']
+        query_fp = fingerprint(query, self.bits.shape[1] * 8, method, query=True)
+        if query_fp is None:
+            raise ValueError(f"Could not parse query: {query!r}")
+        candidates = self.screen(query_fp)
+        exact = _ExactMatcher(query, method)
+        matched = [int(c) for c in candidates if exact(self.smiles[c])]
+
+        role_code = ROLE_CODES.get(role)
+        rows = set()
+        for compound_id in matched:
+            start, end = self.offsets[compound_id], self.offsets[compound_id + 1]
+            member_rows = self.member_rows[start:end]
+            if role_code is not None:
+                member_rows = member_rows[self.member_roles[start:end] == role_code]
+            rows.update(member_rows.tolist())
+
+        stats = {"compounds": len(self.smiles), "screened": len(candidates), "matched": len(matched)}
+        return [self.index.reaction_id(row) for row in sorted(rows)], stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fingerprint-screened substructure search over an ord_index.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help="Fingerprint every compound in the index")
+    build.add_argument('--index', default=DEFAULT_INDEX_DIR)
+    build.add_argument('--bits', type=int, default=DEFAULT_BITS, help="Fingerprint size (multiple of 64)")
+
+    query = sub.add_parser('query', help="Find reactions containing a substructure")
+    query.add_argument('smiles', help="Query SMILES (or SMARTS when RDKit is installed)")
+    query.add_argument('--index', default=DEFAULT_INDEX_DIR)
+    query.add_argument('--role', choices=sorted(ROLE_CODES), help="Only match products or reactants")
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        if args.bits % 64:
+            parser.error("--bits must be a multiple of 64")
+        build_fingerprints(args.index, args.bits)
+        return
+
+    store = FingerprintStore(args.index)
+    reaction_ids, stats = store.search(args.smiles, role=args.role)
+    for reaction_id in reaction_ids:
+        print(reaction_id)
+    print(f"{len(reaction_ids)} reactions; {stats['screened']} of {stats['compounds']} compounds "
+          f"passed the screen, {stats['matched']} matched exactly", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""Link curated target names to ORD reactions whose product is that molecule.
+
+The curated lists (generate_samples.REACTIONS_LIST, synthesis_targets/
+targets.json) use trade and common names ("Lipitor", "Taxol",
+"Prostaglandin F2a"); ORD product NAME identifiers use systematic names
+and variant spellings ("atorvastatin calcium", "PGF2α", "(S)-ibuprofen").
+Substring tests miss most of those, and comparing every target with every
+name is O(targets × names).
+
+Names on both sides are normalized first: accents stripped, Greek letters
+spelled as one letter (α, "alpha" -> a), parenthesized stereo
+descriptors ("(2R,3S)-", "(±)-") and salt/hydrate words dropped, and what
+is left lowercased and split into [a-z0-9] tokens. A salt word is kept
+after an "-yl" group ("ethyl acetate", "benzyl bromide"), and when it is
+all the name has ("zinc chloride"), since then it names the compound. For pharmaceuticals
+the generic name in the list's description ("Atorvastatin Calcium") is
+linked as well as the trade name.
+
+Every distinct normalized product name goes into a trigram index (over
+the name with spaces removed). A target with T trigrams, matched with at
+most k edits, shares at least T - 3k trigrams with any window of a name
+it matches, so it must contain at least one of the target's 3k + 1 rarest
+trigrams. Only the names in those few posting lists are counted, and
+only names whose length could still give a good enough score (below)
+are looked at in any list.
+
+A name is scored by the bounded edit distance between the target and the
+best run of whole consecutive tokens of the name, so "prostaglandin f2a"
+matches "prostaglandin F2α methyl ester" but "urea" doesn't match
+"thiourea". k grows with the target's length (MAX_EDITS caps it). A run
+covering only part of the name scores lower, in proportion to the square
+root of the share it covers, so "urea" itself ranks far above
+"1-benzoyl-3-[1-(3-aminobenzyl)piperid-4-yl]urea", which falls under
+MIN_SCORE.
+
+Usage:
+    python target_linker.py [DATASET ...] [--index DIR] [--target NAME ...] [--out links.json]
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import heapq
+import argparse
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from contextlib import closing
+
+from ord_reader import find_dataset_files
+from ord_wire import iter_light_reactions, IDENTIFIER_NAME
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+TARGETS_FILE = os.path.join(SCRIPT_DIR, 'synthesis_targets', 'targets.json')
+LINKS_VERSION = 1
+DEFAULT_LIMIT = 10
+# One edit allowed per this many characters of the target
+CHARS_PER_EDIT = 5
+MAX_EDITS = 3
+# Matches scoring lower than this (mostly derivatives named after the target) are dropped
+MIN_SCORE = 0.6
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+STEREO_PATTERN = re.compile(
+    r'\(\s*(?:[+\-±]|rac|\d*[RSEZ]|[RS]\*?)(?:\s*,\s*(?:[+\-]|\d*[RSEZ]\*?))*\s*\)-?')
+GREEK_LETTERS = {'α': ' alpha ', 'β': ' beta ', 'γ': ' gamma ', 'δ': ' delta ', 'ω': ' omega '}
+GREEK_PATTERN = re.compile(r'(?<=\d)(alpha|beta|gamma|delta|omega)\b|\b(alpha|beta|gamma|delta|omega)\b')
+# Counter-ions and solvates: "Atorvastatin Calcium" is atorvastatin
+SALT_WORDS = {
+    'salt', 'hydrate', 'monohydrate', 'dihydrate', 'trihydrate', 'hemihydrate', 'sesquihydrate',
+    'anhydrous', 'solvate', 'calcium', 'sodium', 'potassium', 'magnesium', 'lithium', 'zinc',
+    'hydrochloride', 'dihydrochloride', 'hcl', 'hydrobromide', 'hbr', 'citrate', 'mesylate',
+    'besylate', 'tosylate', 'maleate', 'fumarate', 'tartrate', 'bitartrate', 'succinate',
+    'sulfate', 'sulphate', 'phosphate', 'acetate', 'bromide', 'chloride', 'nitrate',
+}
+# Words in a REACTIONS_LIST description that aren't part of a drug name
+DESCRIPTION_WORDS = {'synthesis', 'process', 'industrial', 'total', 'biological', 'assembly'}
+
+
+def strip_salt_words(tokens):
+    """Drop counter-ion and solvate words, unless they name the compound themselves."""
+    kept = [token for i, token in enumerate(tokens)
+            if token not in SALT_WORDS or (i > 0 and tokens[i - 1].endswith('yl'))]
+    return kept or tokens
+
+
+def normalize_tokens(name):
+    """The tokens a name is compared by (see the module docstring)."""
+    text = STEREO_PATTERN.sub(' ', name)
+    for letter, spelled in GREEK_LETTERS.items():
+        text = text.replace(letter, spelled).replace(letter.upper(), spelled)
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    text = GREEK_PATTERN.sub(lambda m: (m.group(1) or m.group(2))[0], text)
+    return strip_salt_words(TOKEN_PATTERN.findall(text))
+
+
+def trigrams(key):
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+def edit_limit(key, trigram_count):
+    # Keep T - 3k >= 1 so the candidate filter above stays valid
+    return max(0, min(len(key) // CHARS_PER_EDIT, MAX_EDITS, (trigram_count - 1) // 3))
+
+
+def bounded_distance(a, b, limit):
+    """Levenshtein distance between a and b, or limit + 1 if it is larger.
+
+    Only the diagonal band |i - j| <= limit of the table is filled in, and
+    it stops as soon as a whole row is over the limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if a == b:
+        return 0
+    over = limit + 1
+    width = len(b)
+    previous = [j if j <= limit else over for j in range(width + 1)]
+    for i, ca in enumerate(a, 1):
+        current = [over] * (width + 1)
+        if i <= limit:
+            current[0] = i
+        row_best = current[0]
+        for j in range(max(1, i - limit), min(width, i + limit) + 1):
+            value = previous[j - 1] + (ca != b[j - 1])
+            if previous[j] < value:
+                value = previous[j] + 1
+            if current[j - 1] < value:
+                value = current[j - 1] + 1
+            current[j] = value
+            if value < row_best:
+                row_best = value
+        if row_best > limit:
+            return over
+        previous = current
+    return previous[width] if previous[width] <= limit else over
+
+
+def window_score(key, tokens, limit, distances):
+    """Score of the best run of whole consecutive `tokens` within `limit` edits of `key`.
+
+    (1 - edits / len(key)), scaled by the square root of the share of the
+    name the run covers; None if no run is close enough. `distances`
+    memoizes bounded_distance per run, since the same runs ("methyl",
+    "phenyl") turn up in name after name.
+    """
+    total = sum(len(token) for token in tokens)
+    # Shorter runs can't reach MIN_SCORE however few edits they need
+    low = max(len(key) - limit, math.ceil(MIN_SCORE ** 2 * total))
+    high = len(key) + limit
+    best = None
+    for start in range(len(tokens)):
+        window = ''
+        for end in range(start, len(tokens)):
+            window += tokens[end]
+            if len(window) > high:
+                break
+            if len(window) < low:
+                continue
+            distance = distances.get(window)
+            if distance is None:
+                distance = distances[window] = bounded_distance(key, window, limit)
+            if distance > limit:
+                continue
+            score = (1.0 - distance / len(key)) * (len(window) / total) ** 0.5
+            if best is None or score > best:
+                best = score
+    return best
+
+
+class NameIndex:
+    """Distinct normalized product names, their reactions, and a trigram index.
+
+    Names are numbered in order of normalized length once everything has
+    been added, so every posting list is sorted by length as well and the
+    names a target can't match for length are cut off with a bisect.
+    """
+
+    def __init__(self):
+        self._added = {}         # normalized key -> (product name as first seen, tokens, [(reaction_id, name), ...])
+        self.names = []          # name number -> product name as first seen
+        self.tokens = []         # name number -> normalized tokens
+        self.reactions = []      # name number -> [(reaction_id, product name in that reaction), ...]
+        self.lengths = array('I')  # name number -> normalized length (ascending)
+        self.postings = {}       # trigram -> array of name numbers (ascending)
+
+    def add(self, name, reaction_id):
+        tokens = normalize_tokens(name)
+        key = ''.join(tokens)
+        if not key:
+            return
+        added = self._added.get(key)
+        if added is None:
+            added = self._added[key] = (name, tokens, [])
+            self.postings = None
+        reactions = added[2]
+        if not reactions or reactions[-1][0] != reaction_id:
+            reactions.append((reaction_id, name))
+
+    def __len__(self):
+        return len(self._added)
+
+    def build(self):
+        """Number the names and build the trigram index (done on first use after adding)."""
+        self.names, self.tokens, self.reactions = [], [], []
+        self.lengths = array('I')
+        self.postings = {}
+        for number, key in enumerate(sorted(self._added, key=len)):
+            name, tokens, reactions = self._added[key]
+            self.names.append(name)
+            self.tokens.append(tokens)
+            self.reactions.append(reactions)
+            self.lengths.append(len(key))
+            for gram in trigrams(key):
+                postings = self.postings.get(gram)
+                if postings is None:
+                    postings = self.postings[gram] = array('I')
+                postings.append(number)
+
+    def candidates(self, key, limit):
+        """Name numbers that can be within `limit` edits of `key` and still reach MIN_SCORE."""
+        if self.postings is None:
+            self.build()
+        # A run of len(key) + limit characters or fewer only reaches
+        # MIN_SCORE in a name at most (len(key) + limit) / MIN_SCORE² long
+        first = bisect_left(self.lengths, len(key) - limit)
+        stop = bisect_right(self.lengths, int((len(key) + limit) / MIN_SCORE ** 2))
+        grams = trigrams(key)
+        if not grams:
+            return [n for n in range(first, stop) if ''.join(self.tokens[n]) == key]
+        lists = []
+        for gram in grams:
+            postings = self.postings.get(gram, ())
+            lists.append(postings[bisect_left(postings, first):bisect_left(postings, stop)])
+        # A match shares at least T - 3k trigrams, so it is in one of the
+        # 3k + 1 shortest lists; count the rest only for those names
+        lists.sort(key=len)
+        needed = len(grams) - 3 * limit
+        counts = Counter()
+        for postings in lists[:3 * limit + 1]:
+            counts.update(postings)
+        for postings in lists[3 * limit + 1:]:
+            for n in counts:
+                i = bisect_left(postings, n)
+                if i < len(postings) and postings[i] == n:
+                    counts[n] += 1
+        return [n for n, c in counts.items() if c >= needed]
+
+    def link(self, target, limit=DEFAULT_LIMIT):
+        """Ranked matches for one target name: [(score, name number), ...]."""
+        tokens = normalize_tokens(target)
+        key = ''.join(tokens)
+        if not key:
+            return []
+        edits = edit_limit(key, len(trigrams(key)))
+        scored = []
+        distances = {}
+        for number in self.candidates(key, edits):
+            score = window_score(key, self.tokens[number], edits, distances)
+            if score is not None and score >= MIN_SCORE:
+                scored.append((round(score, 4), -len(self.names[number]), number))
+        return [(score, number) for score, _, number in heapq.nlargest(limit, scored)]
+
+
+def curated_targets():
+    """{target: [names to link]} from REACTIONS_LIST and targets.json."""
+    from generate_samples import REACTIONS_LIST
+
+    targets = {}
+    for name, description, cls, _, _ in REACTIONS_LIST:
+        names = targets.setdefault(name, [name])
+        if cls == 'Pharmaceutical':
+            # "Atorvastatin Calcium", "Fluticasone/Salmeterol", "Sildenafil Citrate"
+            for part in re.split(r'[/,]', re.sub(r'\(.*?\)', ' ', description)):
+                words = [w for w in part.split() if w.lower() not in DESCRIPTION_WORDS]
+                if words and ' '.join(words) not in names:
+                    names.append(' '.join(words))
+    if os.path.exists(TARGETS_FILE):
+        with open(TARGETS_FILE, 'r', encoding='utf-8') as f:
+            for name, info in json.load(f).items():
+                names = targets.setdefault(name, [name])
+                for alias in (info or {}).get('aliases', ()):
+                    if alias not in names:
+                        names.append(alias)
+    return targets
+
+
+def index_from_datasets(pb_files):
+    index = NameIndex()
+    for pb_file in pb_files:
+        print(f"Reading product names from {os.path.basename(pb_file)}...", file=sys.stderr)
+        with closing(iter_light_reactions(pb_file)) as stream:
+            for reaction in stream:
+                for outcome in reaction.outcomes:
+                    for product in outcome.products:
+                        for ident in product.identifiers:
+                            if ident.type == IDENTIFIER_NAME:
+                                index.add(ident.value, reaction.reaction_id)
+    return index
+
+
+def index_from_ord_index(directory):
+    from ord_index import OrdIndex
+
+    ord_index = OrdIndex(directory)
+    index = NameIndex()
+    for row in range(len(ord_index)):
+        reaction_id = ord_index.reaction_id(row)
+        for name in ord_index.strings['product_name'].values(row):
+            index.add(name, reaction_id)
+    return index
+
+
+def link_targets(index, targets, limit=DEFAULT_LIMIT):
+    """{target: [{"reaction_id", "product_name", "score", "matched"}, ...]}, best first."""
+    links = {}
+    for target, names in targets.items():
+        best = {}
+        for alias in names:
+            for score, number in index.link(alias, limit):
+                if number not in best or score > best[number][0]:
+                    best[number] = (score, alias)
+        ranked = sorted(best.items(), key=lambda item: (-item[1][0], index.names[item[0]]))
+        results = []
+        for number, (score, alias) in ranked:
+            for reaction_id, product_name in index.reactions[number]:
+                results.append({"reaction_id": reaction_id, "product_name": product_name,
+                                "score": score, "matched": alias})
+                if len(results) >= limit:
+                    break
+            if len(results) >= limit:
+                break
+        links[target] = results
+    return links
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Link curated target names to ORD reactions by fuzzy product name.")
+    parser.add_argument("paths", nargs="*", default=[SCRIPT_DIR],
+                        help="Dataset files or directories (searched recursively)")
+    parser.add_argument("--index", help="Read product names from an ord_index.py index instead of the datasets")
+    parser.add_argument("--target", action="append", help="Link only these names (repeatable)")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT, help="Reactions to return per target")
+    parser.add_argument("--out", help="Write the links as JSON to this file instead of printing them")
+    args = parser.parse_args()
+
+    if args.index:
+        index = index_from_ord_index(args.index)
+    else:
+        index = index_from_datasets(find_dataset_files(args.paths))
+    index.build()
+    print(f"Indexed {len(index)} distinct product names ({len(index.postings)} trigrams)", file=sys.stderr)
+
+    targets = {name: [name] for name in args.target} if args.target else curated_targets()
+    links = link_targets(index, targets, args.limit)
+    linked = sum(1 for results in links.values() if results)
+    print(f"Linked {linked} of {len(targets)} targets", file=sys.stderr)
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({"version": LINKS_VERSION, "links": links}, f, indent=4, ensure_ascii=False)
+        return
+    for target, results in links.items():
+        if not results:
+            continue
+        print(target)
+        for result in results:
+            print(f"  {result['score']:.2f}  {result['reaction_id']}  {result['product_name']}")
+
+
+if __name__ == "__main__":
+    main()
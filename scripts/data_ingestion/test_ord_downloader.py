@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Tests for ord_downloader.py against a local fake ORD data server.
+
+Run with:
+    python -m unittest test_ord_downloader     (from scripts/data_ingestion)
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+import unittest
+import http.server
+
+from ord_downloader import Downloader, ChecksumMismatch
+
+BODIES = {
+    dataset_id: hashlib.sha256(dataset_id.encode('ascii')).digest() * 1000
+    for dataset_id in ('ord_dataset-aa01', 'ord_dataset-bb02', 'ord_dataset-cc03', 'ord_dataset-dd04')
+}
+IGNORES_RANGE = 'ord_dataset-bb02'
+HANGS_UP = 'ord_dataset-cc03'
+
+
+def digest(dataset_id):
+    return hashlib.sha256(BODIES[dataset_id]).hexdigest()
+
+
+class FakeORD(http.server.BaseHTTPRequestHandler):
+    """Serves /<shard>/<dataset_id>.pb.gz with Range support, logging every request."""
+
+    def do_GET(self):
+        dataset_id = os.path.basename(self.path)[:-len('.pb.gz')]
+        server = self.server
+        server.requests.append((dataset_id, self.headers.get('Range')))
+        attempts = server.attempts[dataset_id] = server.attempts.get(dataset_id, 0) + 1
+        body = BODIES.get(dataset_id)
+        if body is None:
+            self.send_error(404)
+            return
+
+        start = 0
+        requested = self.headers.get('Range')
+        if requested and dataset_id != IGNORES_RANGE:
+            start = int(requested[len('bytes='):].rstrip('-'))
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{len(body) - 1}/{len(body)}")
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body) - start))
+        self.end_headers()
+        if dataset_id == HANGS_UP and attempts == 1:
+            # Promise the whole file but hang up halfway through
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+class DownloaderTest(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FakeORD)
+        self.server.requests = []
+        self.server.attempts = {}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.tmp_dir = tempfile.mkdtemp()
+        self.manifest_file = os.path.join(self.tmp_dir, 'ord_manifest.json')
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        self.dest_dir = os.path.join(self.tmp_dir, 'dest')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def downloader(self, manifest=None):
+        if manifest is not None:
+            with open(self.manifest_file, 'w') as f:
+                json.dump(manifest, f)
+        return Downloader(self.manifest_file, self.cache_dir, self.base_url, timeout=5)
+
+    def write_partial(self, downloader, dataset_id, length):
+        part_path = downloader._partial_path(dataset_id)
+        os.makedirs(os.path.dirname(part_path), exist_ok=True)
+        with open(part_path, 'wb') as f:
+            f.write(BODIES[dataset_id][:length])
+        return part_path
+
+    def assertFetched(self, path, dataset_id):
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), BODIES[dataset_id])
+
+    def test_full_download_is_recorded(self):
+        downloader = self.downloader()
+        path = downloader.fetch('ord_dataset-aa01', self.dest_dir)
+
+        self.assertFetched(path, 'ord_dataset-aa01')
+        self.assertEqual(self.server.requests, [('ord_dataset-aa01', None)])
+        self.assertTrue(os.path.exists(downloader.object_path(digest('ord_dataset-aa01'))))
+        with open(self.manifest_file) as f:
+            recorded = json.load(f)['ord_dataset-aa01']
+        self.assertEqual(recorded, {'sha256': digest('ord_dataset-aa01'), 'size': len(BODIES['ord_dataset-aa01'])})
+
+    def test_resumes_partial_file(self):
+        downloader = self.downloader()
+        self.write_partial(downloader, 'ord_dataset-aa01', 1000)
+        path = downloader.fetch('ord_dataset-aa01', self.dest_dir)
+
+        self.assertFetched(path, 'ord_dataset-aa01')
+        self.assertEqual(self.server.requests, [('ord_dataset-aa01', 'bytes=1000-')])
+
+    def test_server_ignoring_range_restarts_file(self):
+        downloader = self.downloader()
+        self.write_partial(downloader, IGNORES_RANGE, 1000)
+        path = downloader.fetch(IGNORES_RANGE, self.dest_dir)
+
+        # The 200 carries the whole file, which replaces the partial one
+        self.assertFetched(path, IGNORES_RANGE)
+        self.assertEqual(self.server.requests, [(IGNORES_RANGE, 'bytes=1000-')])
+
+    def test_checksum_mismatch_discards_partial_file(self):
+        downloader = self.downloader({'ord_dataset-aa01': {'sha256': '0' * 64, 'size': len(BODIES['ord_dataset-aa01'])}})
+        with self.assertRaises(ChecksumMismatch):
+            downloader.fetch('ord_dataset-aa01', self.dest_dir)
+
+        self.assertFalse(os.path.exists(downloader._partial_path('ord_dataset-aa01')))
+        self.assertFalse(os.path.exists(os.path.join(self.dest_dir, 'ord_dataset-aa01.pb.gz')))
+
+    def test_connection_closed_early_is_resumed(self):
+        downloader = self.downloader()
+        path = downloader.fetch(HANGS_UP, self.dest_dir)
+
+        # The short first transfer isn't taken as the file; the retry picks up where it stopped
+        self.assertFetched(path, HANGS_UP)
+        half = len(BODIES[HANGS_UP]) // 2
+        self.assertEqual(self.server.requests, [(HANGS_UP, None), (HANGS_UP, f"bytes={half}-")])
+        with open(self.manifest_file) as f:
+            self.assertEqual(json.load(f)[HANGS_UP]['sha256'], digest(HANGS_UP))
+
+    def test_fetch_all_uses_filled_cache(self):
+        self.downloader().fetch_all(BODIES, self.dest_dir)
+        shutil.rmtree(self.dest_dir)
+        del self.server.requests[:]
+
+        results = self.downloader().fetch_all(BODIES, self.dest_dir)
+
+        self.assertEqual(self.server.requests, [])
+        for dataset_id, path in results.items():
+            self.assertFetched(path, dataset_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
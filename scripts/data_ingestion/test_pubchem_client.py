@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Tests for pubchem_client.py against a local fake PubChem server.
+
+Run with:
+    python -m unittest test_pubchem_client     (from scripts/data_ingestion)
+"""
+
+import os
+import json
+import shutil
+import asyncio
+import sqlite3
+import tempfile
+import threading
+import unittest
+import http.server
+import urllib.parse
+
+from pubchem_client import PubChemClient, ResolverCache
+
+CIDS = {'taxol': 36314, 'aspirin': 2244, 'flaky': 702, 'truncated': 887}
+SMILES = {36314: 'CC1=C2C(C(=O)C3(C)', 2244: 'CC(=O)OC1=CC=CC=C1C(=O)O', 702: 'CCO', 887: 'CO'}
+
+
+class FakePubChem(http.server.BaseHTTPRequestHandler):
+    """The two PUG REST endpoints the client uses, logging every request."""
+
+    def _send(self, code, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        # /rest/pug/compound/name/<name>/cids/JSON
+        name = urllib.parse.unquote(self.path.split('/')[5]).casefold()
+        server = self.server
+        server.requests.append(('GET', name))
+        attempts = server.attempts[name] = server.attempts.get(name, 0) + 1
+        if name == 'flaky' and attempts == 1:
+            # Hang up without a response: http.client.RemoteDisconnected
+            self.close_connection = True
+            return
+        if name == 'truncated' and attempts == 1:
+            # Promise more body than is sent: http.client.IncompleteRead
+            self.send_response(200)
+            self.send_header('Content-Length', '1000')
+            self.end_headers()
+            self.wfile.write(b'{"IdentifierList"')
+            self.close_connection = True
+            return
+        if name in CIDS:
+            self._send(200, {'IdentifierList': {'CID': [CIDS[name]]}})
+        else:
+            self._send(404, {'Fault': {'Code': 'PUGREST.NotFound'}})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length'])).decode('ascii')
+        cids = sorted(int(c) for c in urllib.parse.parse_qs(body)['cid'][0].split(','))
+        self.server.requests.append(('POST', cids))
+        self._send(200, {'PropertyTable': {'Properties': [{'CID': c, 'SMILES': SMILES[c]} for c in cids]}})
+
+    def log_message(self, *args):
+        pass
+
+
+class PubChemClientTest(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FakePubChem)
+        self.server.requests = []
+        self.server.attempts = {}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/rest/pug"
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.tmp_dir, 'cache.sqlite')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def resolve(self, names):
+        cache = ResolverCache(self.cache_file)
+        try:
+            client = PubChemClient(cache, base_url=self.base_url, rate=1000)
+            return asyncio.run(client.resolve_many(names)), client.requests_made
+        finally:
+            cache.close()
+
+    def requests(self, method):
+        return [arg for m, arg in self.server.requests if m == method]
+
+    def test_coalesces_batches_and_caches(self):
+        names = ['Taxol', 'taxol', '  TAXOL ', 'Aspirin', 'unobtainium', 'Unobtainium']
+        resolved, _ = self.resolve(names)
+
+        self.assertEqual(resolved['Taxol'], SMILES[36314])
+        self.assertEqual(resolved['  TAXOL '], SMILES[36314])
+        self.assertEqual(resolved['Aspirin'], SMILES[2244])
+        self.assertIsNone(resolved['unobtainium'])
+        # One GET per distinct name, and both CIDs in one POST
+        self.assertEqual(sorted(self.requests('GET')), ['aspirin', 'taxol', 'unobtainium'])
+        self.assertEqual(self.requests('POST'), [[2244, 36314]])
+
+        with sqlite3.connect(self.cache_file) as db:
+            row = db.execute("SELECT cid, smiles, found FROM names WHERE key = 'unobtainium'").fetchone()
+        self.assertEqual(row, (None, None, 0))
+
+        # Everything, including the miss, now comes from the cache
+        del self.server.requests[:]
+        rerun, requests_made = self.resolve(names)
+        self.assertEqual(rerun, resolved)
+        self.assertEqual(requests_made, 0)
+        self.assertEqual(self.server.requests, [])
+
+    def test_retries_dropped_connections(self):
+        resolved, requests_made = self.resolve(['flaky', 'truncated'])
+
+        self.assertEqual(resolved, {'flaky': SMILES[702], 'truncated': SMILES[887]})
+        self.assertEqual(sorted(self.requests('GET')), ['flaky', 'flaky', 'truncated', 'truncated'])
+        # The retried lookups may finish in separate CID batches
+        self.assertEqual(requests_made, len(self.server.requests))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""Validate every synthesis file against public/data/schema.json.
+
+Each file is checked against the schema and every `*_smiles` field of
+every step gets a fast syntax check (smiles_utils.syntax_errors: bracket,
+branch and ring-closure balance). Placeholder SMILES the importers write
+("???", a lone "C", or an empty reactant/product) are warnings; --strict
+turns warnings into failures. index.json entries pointing at missing
+files are errors too.
+
+The schema is compiled once per worker process and files are checked
+across a process pool. Results are cached in .validate_cache.json next to
+this script: a file whose size and mtime are unchanged is not read at
+all, and one that was touched but whose SHA-256 is unchanged is not
+re-validated. The cache is dropped whenever schema.json or the checks
+themselves change.
+
+Uses `jsonschema` when installed; otherwise a built-in validator for the
+keywords schema.json uses (type, properties, required, items, enum,
+additionalProperties).
+
+Usage:
+    python validate_corpus.py [--workers N] [--strict] [--no-cache]
+"""
+
+import os
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from index_store import DATA_DIR, atomic_write_bytes, find_synthesis_files
+from smiles_utils import syntax_errors
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SCHEMA_FILE = os.path.join(DATA_DIR, 'schema.json')
+CACHE_FILE = os.path.join(SCRIPT_DIR, '.validate_cache.json')
+# Bump when the checks change so cached results are not trusted
+VALIDATOR_VERSION = 1
+PLACEHOLDER_SMILES = {'???', 'C'}
+REQUIRED_SMILES_FIELDS = ('reactant_smiles', 'product_smiles')
+CHUNK_SIZE = 64
+
+JSON_TYPES = {
+    'object': dict,
+    'array': list,
+    'string': str,
+    'boolean': bool,
+    'null': type(None),
+}
+
+
+def _is_type(value, name):
+    if name == 'integer':
+        return isinstance(value, int) and not isinstance(value, bool)
+    if name == 'number':
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    return isinstance(value, JSON_TYPES.get(name, object))
+
+
+class SubsetValidator:
+    """Just enough of JSON Schema for schema.json, for when jsonschema isn't installed."""
+
+    def __init__(self, schema):
+        self.schema = schema
+
+    def iter_errors(self, instance):
+        return self._errors(self.schema, instance, '')
+
+    def _errors(self, schema, value, path):
+        expected = schema.get('type')
+        if expected is not None:
+            names = expected if isinstance(expected, list) else [expected]
+            if not any(_is_type(value, name) for name in names):
+                yield f"{path or '/'}: expected {' or '.join(names)}"
+                return
+        if 'enum' in schema and value not in schema['enum']:
+            yield f"{path or '/'}: {value!r} is not one of {schema['enum']}"
+        if isinstance(value, dict):
+            for key in schema.get('required', ()):
+                if key not in value:
+                    yield f"{path or '/'}: missing required property '{key}'"
+            properties = schema.get('properties', {})
+            for key, item in value.items():
+                if key in properties:
+                    yield from self._errors(properties[key], item, f"{path}/{key}")
+                elif schema.get('additionalProperties') is False:
+                    yield f"{path or '/'}: unexpected property '{key}'"
+        if isinstance(value, list) and isinstance(schema.get('items'), dict):
+            for i, item in enumerate(value):
+                yield from self._errors(schema['items'], item, f"{path}/{i}")
+
+
+def compile_schema(schema):
+    """Return an object with iter_errors(instance) yielding messages."""
+    try:
+        import jsonschema
+    except ImportError:
+        return SubsetValidator(schema)
+    validator = jsonschema.validators.validator_for(schema)(schema)
+
+    class _Adapter:
+        def iter_errors(self, instance):
+            for error in validator.iter_errors(instance):
+                path = '/' + '/'.join(str(p) for p in error.absolute_path)
+                yield f"{path}: {error.message}"
+    return _Adapter()
+
+
+# -- per-file checks (run in workers) ---------------------------------------
+
+VALIDATOR = None
+
+
+def _init_worker(schema):
+    global VALIDATOR
+    VALIDATOR = compile_schema(schema)
+
+
+def check_smiles_fields(synthesis):
+    """Return (errors, warnings) for the SMILES fields of every step."""
+    errors = []
+    warnings = []
+    sequence = synthesis.get('sequence') if isinstance(synthesis, dict) else None
+    for i, step in enumerate(sequence if isinstance(sequence, list) else ()):
+        if not isinstance(step, dict):
+            continue
+        label = f"step {step.get('step_id', i + 1)}"
+        for field, value in step.items():
+            if not field.endswith('_smiles') or not isinstance(value, str):
+                continue
+            text = value.strip()
+            if not text:
+                if field in REQUIRED_SMILES_FIELDS:
+                    warnings.append(f"{label} {field}: empty")
+                continue
+            if text in PLACEHOLDER_SMILES:
+                warnings.append(f"{label} {field}: placeholder {text!r}")
+                continue
+            for problem in syntax_errors(value):
+                errors.append(f"{label} {field}: {problem} in {value!r}")
+    return errors, warnings
+
+
+def validate_file(task):
+    """Worker unit. `task` is (path, cached sha256 or None). Returns a result dict."""
+    path, cached_sha = task
+    with open(path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    st = os.stat(path)
+    result = {"path": path, "sha256": digest, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if digest == cached_sha:
+        result["unchanged"] = True
+        return result
+    try:
+        synthesis = json.loads(data)
+    except ValueError as e:
+        result.update(errors=[f"invalid JSON: {e}"], warnings=[])
+        return result
+    errors = list(VALIDATOR.iter_errors(synthesis))
+    smiles_errors, warnings = check_smiles_fields(synthesis)
+    result.update(errors=errors + smiles_errors, warnings=warnings)
+    return result
+
+
+# -- driver -----------------------------------------------------------------
+
+def load_cache(cache_file, cache_key):
+    if cache_file and os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'r') as f:
+                cache = json.load(f)
+            if cache.get('key') == cache_key:
+                return cache
+        except (OSError, ValueError):
+            pass
+    return {"key": cache_key, "files": {}}
+
+
+def _stat_matches(path, record):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return record.get('size') == st.st_size and record.get('mtime_ns') == st.st_mtime_ns
+
+
+def check_index(data_dir=DATA_DIR):
+    """Errors for index.json entries whose file is missing."""
+    index_file = os.path.join(data_dir, 'index.json')
+    if not os.path.exists(index_file):
+        return [f"{index_file}: missing"]
+    with open(index_file, 'r') as f:
+        entries = json.load(f)
+    public_dir = os.path.dirname(os.path.abspath(data_dir))
+    return [f"index.json entry '{e.get('id')}': file {e['path']} does not exist"
+            for e in entries
+            if e.get('path') and not os.path.exists(os.path.join(public_dir, e['path'].lstrip('/')))]
+
+
+def validate_corpus(data_dir=DATA_DIR, schema_file=SCHEMA_FILE, workers=None, cache_file=CACHE_FILE):
+    """Validate every synthesis file. Returns {relative path: {"errors": [...], "warnings": [...]}}."""
+    with open(schema_file, 'rb') as f:
+        schema_bytes = f.read()
+    schema = json.loads(schema_bytes)
+    cache_key = f"{VALIDATOR_VERSION}:{hashlib.sha256(schema_bytes).hexdigest()}"
+    cache = load_cache(cache_file, cache_key)
+    cached_files = cache['files']
+
+    public_dir = os.path.dirname(os.path.abspath(data_dir))
+    paths = find_synthesis_files(data_dir)
+    results = {}
+    tasks = []
+    for path in paths:
+        relative = '/' + os.path.relpath(path, public_dir).replace(os.sep, '/')
+        record = cached_files.get(relative)
+        if record and _stat_matches(path, record):
+            results[relative] = record
+        else:
+            tasks.append((path, record['sha256'] if record else None))
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(tasks) > CHUNK_SIZE:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(schema,)) as pool:
+            checked = list(pool.map(validate_file, tasks, chunksize=CHUNK_SIZE))
+    else:
+        _init_worker(schema)
+        checked = [validate_file(task) for task in tasks]
+
+    revalidated = 0
+    for result in checked:
+        relative = '/' + os.path.relpath(result.pop('path'), public_dir).replace(os.sep, '/')
+        if result.pop('unchanged', False):
+            # Touched but identical: keep the old findings, refresh the stat fingerprint
+            result['errors'] = cached_files[relative]['errors']
+            result['warnings'] = cached_files[relative]['warnings']
+        else:
+            revalidated += 1
+        results[relative] = result
+
+    if cache_file:
+        cache['files'] = results
+        atomic_write_bytes(cache_file, json.dumps(cache).encode('utf-8'))
+    print(f"Checked {len(paths)} files: {revalidated} validated, {len(paths) - revalidated} unchanged since last run")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate synthesis files against schema.json and check SMILES.")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--schema", default=SCHEMA_FILE)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--strict", action="store_true", help="Fail on warnings (placeholder SMILES) too")
+    parser.add_argument("--no-cache", action="store_true", help="Validate everything and don't write the cache")
+    parser.add_argument("--quiet", action="store_true", help="Only print the summary")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = validate_corpus(args.data_dir, args.schema, args.workers, None if args.no_cache else CACHE_FILE)
+    index_errors = check_index(args.data_dir)
+
+    error_count = len(index_errors)
+    warning_count = 0
+    for message in index_errors:
+        print(f"ERROR {message}")
+    for relative, result in sorted(results.items()):
+        error_count += len(result['errors'])
+        warning_count += len(result['warnings'])
+        if args.quiet:
+            continue
+        for message in result['errors']:
+            print(f"ERROR {relative}: {message}")
+        for message in result['warnings']:
+            print(f"WARNING {relative}: {message}")
+
+    print(f"{len(results)} files, {error_count} errors, {warning_count} warnings "
+          f"({time.perf_counter() - start:.2f}s)")
+    if error_count or (args.strict and warning_count):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
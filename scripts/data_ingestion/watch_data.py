@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+"""Keep index.json and the derived data up to date while files are edited.
+
+Contributors add and edit synthesis files under public/data/<class>/ by
+hand. Instead of re-running calculate_steps.js and every builder (each of
+which rescans the whole library), this watches public/data and, for each
+burst of changes, updates only what the changed files affect:
+
+  index.json            the changed files' entries: step_count for files
+                        already listed, a new entry (from the file's meta)
+                        for new files, removal for deleted ones
+  search/               build_search_index, from the entries held in memory
+                        and its in-memory term cache (only changed files are
+                        re-tokenized; only shards whose bytes change are written)
+  stats.json            route_analytics, from parsed steps held in memory
+  molecules/            the changed files' compact routes and the table
+  packs/manifest.json   changed files are dropped from it (by IndexStore.save),
+                        so the client fetches them directly until
+                        build_bundles.py is re-run
+
+Derived outputs are only maintained if they have already been built once
+(search/manifest.json, stats.json, ... exist). On start everything is
+brought up to date in one pass, so edits made while nothing was watching
+are picked up too.
+
+Changes are seen through inotify (Linux, via ctypes) or, where that isn't
+available or with --poll, by comparing file sizes and mtimes every
+--interval seconds. Events are collected until nothing has changed for
+--debounce seconds, so an editor's save (temp file, rename, chmod) or a
+`git checkout` is handled as one update.
+
+Usage:
+    python watch_data.py [--poll] [--interval 1.0] [--debounce 0.2]
+    python watch_data.py --once
+"""
+
+import os
+import json
+import time
+import errno
+import select
+import struct
+import argparse
+
+from index_store import (DATA_DIR, PUBLIC_DIR, INDEX_FILE, NON_SYNTHESIS_DIRS, NON_SYNTHESIS_FILES,
+                         IndexStore, atomic_write_bytes, find_synthesis_files, public_path)
+
+DEBOUNCE_S = 0.2
+# Apply a batch after this long even if changes keep coming
+MAX_DELAY_S = 2.0
+POLL_INTERVAL_S = 1.0
+# Index fields taken from a new file's meta, in index.json's order
+ENTRY_FIELDS = ('molecule_name', 'class', 'author', 'year')
+
+# inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+EVENT_HEADER = struct.Struct('iIII')
+READ_SIZE = 64 * 1024
+
+
+def _is_output(path):
+    """True for paths the watcher itself writes (or temp files), which must not trigger updates."""
+    relative = os.path.relpath(path, DATA_DIR)
+    parts = relative.split(os.sep)
+    if parts[0] in NON_SYNTHESIS_DIRS:
+        return True
+    if len(parts) == 1 and parts[0] in NON_SYNTHESIS_FILES and parts[0] != 'index.json':
+        return True
+    return any(part.startswith('.') for part in parts)
+
+
+def _read_bytes(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def relative_data_path(path):
+    """/data/<class>/x.json for a filesystem path under public/data."""
+    return '/' + os.path.relpath(path, PUBLIC_DIR).replace(os.sep, '/')
+
+
+# -- watchers ----------------------------------------------------------------
+# read(timeout) waits up to `timeout` seconds (None: until something happens)
+# and returns the set of changed paths. A directory in the set means
+# "anything under here may have changed".
+
+class InotifyWatcher:
+    def __init__(self, root=DATA_DIR):
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._libc = libc
+        self._fd = libc.inotify_init1(IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {}
+        self.root = root
+        self._add_tree(root)
+
+    def _add_tree(self, top):
+        for directory, dirs, _ in os.walk(top):
+            dirs[:] = [d for d in dirs if not _is_output(os.path.join(directory, d))]
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+            if wd >= 0:
+                self._dirs[wd] = directory
+
+    def read(self, timeout=None):
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        data = os.read(self._fd, READ_SIZE)
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost; recheck everything
+                changed.add(self.root)
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if _is_output(path):
+                continue
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._add_tree(path)
+                changed.add(path)
+            elif not mask & IN_CREATE:
+                # A new file's contents arrive with its IN_CLOSE_WRITE
+                changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    def __init__(self, root=DATA_DIR, interval=POLL_INTERVAL_S):
+        self.root = root
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for path in find_synthesis_files(self.root) + [INDEX_FILE]:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (st.st_size, st.st_mtime_ns)
+        return snapshot
+
+    def read(self, timeout=None):
+        while True:
+            time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+            snapshot = self._scan()
+            changed = {path for path in snapshot.keys() | self._snapshot.keys()
+                       if snapshot.get(path) != self._snapshot.get(path)}
+            self._snapshot = snapshot
+            if changed or timeout is not None:
+                return changed
+
+    def close(self):
+        pass
+
+
+def open_watcher(poll=False, interval=POLL_INTERVAL_S):
+    if not poll:
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}); polling every {interval}s")
+    return PollingWatcher(interval=interval)
+
+
+# -- derived outputs ---------------------------------------------------------
+# Each keeps what it needs in memory; update() takes {relative path: parsed
+# synthesis or None if deleted} and flush() writes the output.
+
+class SearchOutput:
+    name = 'search'
+
+    def __init__(self):
+        import build_search_index
+        self.module = build_search_index
+        self.cache = build_search_index.load_cache()
+
+    @staticmethod
+    def enabled():
+        return os.path.exists(os.path.join(DATA_DIR, 'search', 'manifest.json'))
+
+    def update(self, syntheses):
+        pass  # build_search_index notices changed files by their fingerprints
+
+    def flush(self, store):
+        self.module.build_search_index(entries=list(store.entries.values()), cache=self.cache)
+
+
+class StatsOutput:
+    name = 'stats'
+
+    def __init__(self):
+        import route_analytics
+        self.module = route_analytics
+        self.steps = {}     # relative path -> route_steps()
+        # --ord sections come from a separate, slow pass; keep what's there
+        with open(route_analytics.STATS_FILE, 'r', encoding='utf-8') as f:
+            self.ord = json.load(f).get('ord')
+
+    @staticmethod
+    def enabled():
+        return os.path.exists(os.path.join(DATA_DIR, 'stats.json'))
+
+    def update(self, syntheses):
+        for relative_path, synthesis in syntheses.items():
+            if synthesis is None:
+                self.steps.pop(relative_path, None)
+            else:
+                self.steps[relative_path] = self.module.route_steps(synthesis)
+
+    def flush(self, store):
+        ra = self.module
+        routes = [(entry['id'], entry.get('class'), self.steps[entry['path']])
+                  for entry in store.entries.values() if entry.get('path') in self.steps]
+        stats = dict(version=ra.STATS_VERSION, **ra.compute_stats(ra.CorpusArrays(routes)))
+        if self.ord is not None:
+            stats['ord'] = self.ord
+        ra.write_stats(stats)
+
+
+class MoleculeOutput:
+    name = 'molecules'
+
+    def __init__(self):
+        import build_molecule_table
+        self.module = build_molecule_table
+        self.table = build_molecule_table.MoleculeTable()
+        self.molecules = {}   # relative path -> molecule ids the route uses
+        with open(os.path.join(build_molecule_table.MOLECULES_DIR, 'manifest.json'), 'r') as f:
+            self.routes = json.load(f).get('routes', {})
+        self.compact = bool(self.routes)
+
+    @staticmethod
+    def enabled():
+        return os.path.exists(os.path.join(DATA_DIR, 'molecules', 'manifest.json'))
+
+    def update(self, syntheses):
+        bmt = self.module
+        for relative_path, synthesis in syntheses.items():
+            if synthesis is None:
+                self.molecules.pop(relative_path, None)
+                if self.routes.pop(relative_path, None) is not None:
+                    path = bmt.compact_route_path(relative_path)
+                    if os.path.exists(path):
+                        os.remove(path)
+                continue
+            route = bmt.compact_route(synthesis, self.table)
+            # The ids the compact route uses, which is what build_molecule_table puts in the table
+            self.molecules[relative_path] = {value for step in route['sequence'] if isinstance(step, dict)
+                                             for key, value in step.items() if key.endswith(bmt.MOLECULE_SUFFIX)}
+            if self.compact:
+                path = bmt.compact_route_path(relative_path)
+                data = bmt.route_bytes(route)
+                if _read_bytes(path) != data:
+                    atomic_write_bytes(path, data)
+                self.routes[relative_path] = bmt.route_entry(relative_path, _read_bytes(public_path(relative_path)))
+
+    def flush(self, store):
+        used = set().union(*self.molecules.values()) if self.molecules else set()
+        molecules = {mol_id: self.table.molecules[mol_id] for mol_id in used}
+        self.module.write_table(molecules, self.table.canonical, dict(sorted(self.routes.items())))
+
+
+OUTPUTS = (SearchOutput, StatsOutput, MoleculeOutput)
+
+
+# -- updates -----------------------------------------------------------------
+
+def load_synthesis(relative_path):
+    with open(public_path(relative_path), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def new_entry(relative_path, synthesis):
+    meta = synthesis.get('meta') or {}
+    stem = os.path.splitext(os.path.basename(relative_path))[0]
+    entry = {"id": meta.get('id') or stem.replace('_', '-')}
+    for field in ENTRY_FIELDS:
+        if field in meta:
+            entry[field] = meta[field]
+    entry['path'] = relative_path
+    return entry
+
+
+class Updater:
+    def __init__(self):
+        self.store = None
+        self.outputs = []
+
+    def catch_up(self):
+        """Reload index.json and bring everything up to date with the files on disk."""
+        self.store = IndexStore()
+        self.outputs = []
+        for output in OUTPUTS:
+            if not output.enabled():
+                continue
+            try:
+                self.outputs.append(output())
+            except ImportError as e:
+                print(f"Not updating {output.name}: {e}")
+        paths = {e['path'] for e in self.store.entries.values() if e.get('path')}
+        paths.update(relative_data_path(p) for p in find_synthesis_files())
+        return self.update(sorted(paths), remove_missing=False)
+
+    def changed_paths(self, paths):
+        """Relative synthesis paths for a batch of watcher paths, or None if index.json changed."""
+        relative = set()
+        known = {e['path'] for e in self.store.entries.values() if e.get('path')}
+        for path in paths:
+            if path == INDEX_FILE:
+                if self.store.index_changed_on_disk():
+                    return None
+                continue
+            if os.path.isdir(path) or not path.endswith('.json'):
+                # A directory appeared or went away: recheck what's under it
+                prefix = relative_data_path(path).rstrip('/') + '/'
+                relative.update(p for p in known if p.startswith(prefix))
+                if os.path.isdir(path):
+                    relative.update(relative_data_path(p) for p in find_synthesis_files(path))
+                continue
+            top_level = os.path.dirname(path) == DATA_DIR
+            if not _is_output(path) and not (top_level and os.path.basename(path) in NON_SYNTHESIS_FILES):
+                relative.add(relative_data_path(path))
+        return sorted(relative)
+
+    def apply(self, paths):
+        started = time.perf_counter()
+        relative = self.changed_paths(paths)
+        if relative is None:
+            print("index.json was edited; reloading")
+            count = self.catch_up()
+        elif relative:
+            count = self.update(relative)
+        else:
+            return
+        print(f"Updated {count} file{'s' if count != 1 else ''} in "
+              f"{(time.perf_counter() - started) * 1000:.1f} ms")
+
+    def update(self, relative_paths, remove_missing=True):
+        """Update for these synthesis paths. Returns how many were looked at.
+
+        Entries whose file is missing are removed only when the file went
+        away while watching (`remove_missing`); on start they are left for
+        validate_corpus.py to report, as calculate_steps.js did.
+        """
+        store = self.store
+        by_path = {e.get('path'): e for e in store.entries.values()}
+        syntheses = {}
+        for relative_path in relative_paths:
+            if not os.path.exists(public_path(relative_path)):
+                if remove_missing:
+                    syntheses[relative_path] = None
+                else:
+                    print(f"  file not found: {relative_path}")
+                continue
+            try:
+                syntheses[relative_path] = load_synthesis(relative_path)
+            except (OSError, ValueError) as e:
+                # Likely saved half way; the next save triggers another update
+                print(f"Error reading {relative_path}: {e}")
+
+        # Deletions first, so a rename can reuse the id it had
+        for relative_path, synthesis in syntheses.items():
+            if synthesis is None:
+                store.remove_where(lambda e: e.get('path') == relative_path)
+                store.forget(relative_path)
+                print(f"  removed {relative_path}")
+        for relative_path, synthesis in syntheses.items():
+            if synthesis is None:
+                continue
+            stats = store.file_stats(relative_path)
+            entry = by_path.get(relative_path)
+            if entry is not None:
+                entry.update(stats)
+                continue
+            entry = new_entry(relative_path, synthesis)
+            existing = store.entries.get(entry['id'])
+            if existing is not None and os.path.exists(public_path(existing.get('path', ''))):
+                print(f"  {relative_path}: id {entry['id']!r} is already used by {existing['path']}; not indexed")
+                continue
+            store.upsert(entry, stats)
+            print(f"  added {relative_path} as {entry['id']}")
+
+        for output in self.outputs:
+            output.update(syntheses)
+        store.save()
+        for output in self.outputs:
+            output.flush(store)
+        return len(syntheses)
+
+
+def watch(updater, watcher, debounce=DEBOUNCE_S):
+    while True:
+        changed = watcher.read(None)
+        started = time.monotonic()
+        while time.monotonic() - started < MAX_DELAY_S:
+            more = watcher.read(debounce)
+            if not more:
+                break
+            changed |= more
+        updater.apply(changed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch public/data and keep index.json and derived files current.")
+    parser.add_argument("--poll", action="store_true", help="Poll for changes instead of using inotify")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL_S, help="Polling interval in seconds")
+    parser.add_argument("--debounce", type=float, default=DEBOUNCE_S,
+                        help="Wait for this many quiet seconds before updating")
+    parser.add_argument("--once", action="store_true", help="Bring everything up to date and exit")
+    args = parser.parse_args()
+
+    updater = Updater()
+    started = time.perf_counter()
+    count = updater.catch_up()
+    print(f"Checked {count} files in {(time.perf_counter() - started) * 1000:.1f} ms; "
+          f"maintaining index.json{''.join(', ' + o.name for o in updater.outputs)}")
+    if args.once:
+        return
+
+    watcher = open_watcher(args.poll, args.interval)
+    print(f"Watching {DATA_DIR} ({'polling' if isinstance(watcher, PollingWatcher) else 'inotify'}); Ctrl-C to stop")
+    try:
+        watch(updater, watcher, args.debounce)
+    except KeyboardInterrupt:
+        print("Stopped")
+    finally:
+        watcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,20 @@ import { StrictMode } from 'react'
 import { createRoot } from 'react-dom/client'
 import './index.css'
 import App from './App.jsx'
+import { DataManager } from './utils/DataManager'
 
 createRoot(document.getElementById('root')).render(
   <StrictMode>
     <App />
   </StrictMode>,
 )
+
+// Once the service worker controls the page, pull every synthesis pack
+// through it so the whole library is available offline.
+if ('serviceWorker' in navigator) {
+  const prefetch = () => {
+    DataManager.prefetchAllPacks().catch((error) => console.warn('Pack prefetch failed', error));
+  };
+  if (navigator.serviceWorker.controller) prefetch();
+  else navigator.serviceWorker.addEventListener('controllerchange', prefetch, { once: true });
+}
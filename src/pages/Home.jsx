@@ -8,6 +8,8 @@ const Home = () => {
     const [searchTerm, setSearchTerm] = useState('');
     const [minSteps, setMinSteps] = useState('');
     const [maxSteps, setMaxSteps] = useState('');
+    // Search index results for searchTerm ({matches, indexed}); null means filter index.json directly
+    const [searchMatches, setSearchMatches] = useState(null);
 
     useEffect(() => {
         const loadData = async () => {
@@ -17,9 +19,24 @@ const Home = () => {
         loadData();
     }, []);
 
+    useEffect(() => {
+        let cancelled = false;
+        if (!searchTerm.trim()) {
+            setSearchMatches(null);
+            return undefined;
+        }
+        DataManager.search(searchTerm).then((result) => {
+            if (!cancelled) setSearchMatches(result);
+        });
+        return () => { cancelled = true; };
+    }, [searchTerm]);
+
     const filteredSyntheses = syntheses.filter(s => {
-        const matchesSearch = s.molecule_name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-            s.author.toLowerCase().includes(searchTerm.toLowerCase());
+        // Entries added after the index was built aren't in it; match those by substring
+        const matchesSearch = searchMatches && searchMatches.indexed.has(s.id)
+            ? searchMatches.matches.has(s.id)
+            : s.molecule_name.toLowerCase().includes(searchTerm.toLowerCase()) ||
+                s.author.toLowerCase().includes(searchTerm.toLowerCase());
 
         const steps = s.step_count || 1; // Default to 1 if not calculated yet
         const matchesMinString = minSteps === '' || steps >= parseInt(minSteps);
@@ -4,6 +4,215 @@
  */
 
 const DATA_ROOT = '/data';
+const PACK_MANIFEST = `${DATA_ROOT}/packs/manifest.json`;
+const SEARCH_MANIFEST = `${DATA_ROOT}/search/manifest.json`;
+const MOLECULE_MANIFEST = `${DATA_ROOT}/molecules/manifest.json`;
+// Must match the runtimeCaching cacheName for packs in vite.config.js
+const PACK_CACHE = 'synthesis-packs';
+
+let packManifestPromise = null;
+let searchManifestPromise = null;
+let moleculeManifestPromise = null;
+let moleculeTablePromise = null;
+const searchFiles = new Map();
+
+/**
+ * Loads the pack manifest written by scripts/data_ingestion/build_bundles.py.
+ * Resolves to null when no packs have been built.
+ */
+function loadPackManifest() {
+  if (!packManifestPromise) {
+    packManifestPromise = fetch(PACK_MANIFEST)
+      .then((response) => (response.ok ? response.json() : null))
+      .catch(() => null);
+  }
+  return packManifestPromise;
+}
+
+/**
+ * Gunzips one pack member and parses it as JSON.
+ * @param {ArrayBuffer} buffer - A complete gzip member.
+ */
+async function decodeMember(buffer) {
+  const stream = new Blob([buffer]).stream().pipeThrough(new DecompressionStream('gzip'));
+  return JSON.parse(await new Response(stream).text());
+}
+
+/**
+ * Fetches a single synthesis out of its pack with a byte-range request.
+ * Works whether or not the server honours Range (200 responses are sliced).
+ */
+async function getSynthesisFromPack(path) {
+  if (typeof DecompressionStream === 'undefined') return null;
+  const manifest = await loadPackManifest();
+  const entry = manifest?.entries?.[path];
+  if (!entry) return null;
+
+  const pack = manifest.packs[entry.pack];
+  const end = entry.offset + entry.length - 1;
+  const response = await fetch(pack.url, { headers: { Range: `bytes=${entry.offset}-${end}` } });
+  if (!response.ok) throw new Error(`Failed to fetch pack ${pack.url}`);
+
+  let buffer = await response.arrayBuffer();
+  if (response.status !== 206) {
+    buffer = buffer.slice(entry.offset, entry.offset + entry.length);
+  }
+  return decodeMember(buffer);
+}
+
+/**
+ * Loads the manifest written by scripts/data_ingestion/build_molecule_table.py.
+ * Resolves to null when no molecule table has been built.
+ */
+function loadMoleculeManifest() {
+  if (!moleculeManifestPromise) {
+    moleculeManifestPromise = fetch(MOLECULE_MANIFEST)
+      .then((response) => (response.ok ? response.json() : null))
+      .catch(() => null);
+  }
+  return moleculeManifestPromise;
+}
+
+/**
+ * Fetches the shared molecule table once.
+ * @returns {Promise<Object>} Molecule id -> SMILES as written.
+ */
+function loadMoleculeTable(url) {
+  if (!moleculeTablePromise) {
+    moleculeTablePromise = fetch(url).then((response) => {
+      if (!response.ok) throw new Error(`Failed to fetch ${url}`);
+      return response.json();
+    }).then((table) => table.molecules);
+    moleculeTablePromise.catch(() => { moleculeTablePromise = null; });
+  }
+  return moleculeTablePromise;
+}
+
+/**
+ * Turns every step's X_mol id back into an X_smiles field. Other fields
+ * pass through as is.
+ * @param {Object} route - A compact route.
+ * @param {Object} molecules - Molecule id -> SMILES.
+ */
+function expandCompactRoute(route, molecules) {
+  const sequence = (route.sequence || []).map((step) => {
+    const expanded = {};
+    for (const [key, value] of Object.entries(step)) {
+      if (key.endsWith('_mol')) expanded[`${key.slice(0, -4)}_smiles`] = molecules[value];
+      else expanded[key] = value;
+    }
+    return expanded;
+  });
+  return { ...route, sequence };
+}
+
+/**
+ * Fetches a compact route and expands it against the molecule table.
+ * Resolves to null when the path has no compact route (the build scripts
+ * drop routes whose source file has changed since they were written).
+ */
+async function getSynthesisFromCompact(path) {
+  const manifest = await loadMoleculeManifest();
+  const url = manifest?.routes?.[path]?.url;
+  if (!url) return null;
+  const [route, molecules] = await Promise.all([
+    fetch(url).then((response) => {
+      if (!response.ok) throw new Error(`Failed to fetch compact route ${url}`);
+      return response.json();
+    }),
+    loadMoleculeTable(manifest.table),
+  ]);
+  return expandCompactRoute(route, molecules);
+}
+
+/**
+ * Fetches a JSON file of the search index once and memoizes it.
+ * @param {string} url
+ */
+function loadSearchFile(url) {
+  if (!searchFiles.has(url)) {
+    searchFiles.set(url, fetch(url).then((response) => {
+      if (!response.ok) throw new Error(`Failed to fetch ${url}`);
+      return response.json();
+    }));
+  }
+  return searchFiles.get(url);
+}
+
+/**
+ * Loads the manifest written by scripts/data_ingestion/build_search_index.py.
+ * Resolves to null when no search index has been built.
+ */
+function loadSearchManifest() {
+  if (!searchManifestPromise) {
+    searchManifestPromise = fetch(SEARCH_MANIFEST)
+      .then((response) => (response.ok ? response.json() : null))
+      .catch(() => null);
+  }
+  return searchManifestPromise;
+}
+
+/**
+ * Same tokenizing as build_search_index.py: NFKD, drop accents, lowercase, [a-z0-9] runs.
+ * @param {string} text
+ */
+function searchTokens(text) {
+  return text.normalize('NFKD').replace(/[\u0300-\u036f]/g, '').toLowerCase().match(/[a-z0-9]+/g) || [];
+}
+
+/**
+ * Index terms that must all match for a query token: its trigrams, or a
+ * prefix term when the token is too short to have one.
+ * @param {string} token
+ * @param {number} prefixLength
+ */
+function queryTerms(token, prefixLength) {
+  if (token.length < 3) return [`^${token.slice(0, prefixLength)}`];
+  const terms = [];
+  for (let i = 0; i + 3 <= token.length; i++) terms.push(token.slice(i, i + 3));
+  return terms;
+}
+
+/**
+ * @param {Array<number>} gaps - Delta-encoded posting list.
+ * @returns {Set<number>} Document numbers.
+ */
+function decodePostings(gaps) {
+  const numbers = new Set();
+  let current = 0;
+  for (const gap of gaps) {
+    current += gap;
+    numbers.add(current);
+  }
+  return numbers;
+}
+
+/**
+ * Keeps the candidate documents that really contain every query token.
+ * Trigram intersection alone can over-match ("abcd" vs "abcx bcdy"), so
+ * each token is checked against the document's own tokens, fetching only
+ * the token chunks the candidates fall in.
+ * @param {Object} manifest - The search manifest.
+ * @param {Set<number>} numbers - Candidate document numbers.
+ * @param {Array<string>} tokens - Query tokens to check.
+ * @returns {Promise<Set<number>>}
+ */
+async function verifyCandidates(manifest, numbers, tokens) {
+  const { chunk_size: chunkSize, urls } = manifest.tokens;
+  const chunkNumbers = [...new Set([...numbers].map((n) => Math.floor(n / chunkSize)))];
+  const chunks = new Map(await Promise.all(
+    chunkNumbers.map(async (c) => [c, await loadSearchFile(urls[c])])
+  ));
+  return new Set([...numbers].filter((n) => {
+    const docTokens = chunks.get(Math.floor(n / chunkSize))[n % chunkSize].split(' ');
+    return tokens.every((token) => docTokens.some((docToken) => docToken.includes(token)));
+  }));
+}
+
+function shardKey(term) {
+  const c = term.replace(/^\^/, '').charAt(0);
+  return /^[a-z0-9]$/.test(c) ? c : '_';
+}
 
 export const DataManager = {
   /**
@@ -27,9 +236,23 @@ export const DataManager = {
    * @returns {Promise<Object|null>} The synthesis object or null if failed.
    */
   async getSynthesis(path) {
+    // Ensure path starts with /
+    const cleanPath = path.startsWith('/') ? path : `/${path}`;
+    try {
+      const packed = await getSynthesisFromPack(cleanPath);
+      if (packed) return packed;
+    } catch (error) {
+      console.warn(`DataManager: Pack lookup failed for ${cleanPath}, using per-file fetch`, error);
+    }
+
+    try {
+      const compact = await getSynthesisFromCompact(cleanPath);
+      if (compact) return compact;
+    } catch (error) {
+      console.warn(`DataManager: Compact route lookup failed for ${cleanPath}, using per-file fetch`, error);
+    }
+
     try {
-      // Ensure path starts with /
-      const cleanPath = path.startsWith('/') ? path : `/${path}`;
       const response = await fetch(cleanPath);
       if (!response.ok) throw new Error(`Failed to fetch synthesis at ${cleanPath}`);
       return await response.json();
@@ -37,5 +260,84 @@ export const DataManager = {
       console.error(`DataManager: Error fetching synthesis at ${path}`, error);
       return null;
     }
+  },
+
+  /**
+   * Fetches the precomputed library statistics (overall route yields,
+   * per-class and per-reaction-type distributions, step-count histograms)
+   * written by scripts/data_ingestion/route_analytics.py.
+   * @returns {Promise<Object|null>} The stats, or null when not built.
+   */
+  async getStats() {
+    try {
+      const response = await fetch(`${DATA_ROOT}/stats.json`);
+      return response.ok ? await response.json() : null;
+    } catch (error) {
+      console.warn('DataManager: Error fetching stats', error);
+      return null;
+    }
+  },
+
+  /**
+   * Searches the prebuilt search index, downloading only the shards the
+   * query's terms live in.
+   * @param {string} query
+   * @returns {Promise<{matches: Set<string>, indexed: Set<string>}|null>}
+   *   Matching synthesis ids, and every id the index covers (entries added
+   *   since it was built are not in it; callers should filter those, or
+   *   everything when null is returned, from index.json instead).
+   */
+  async search(query) {
+    const manifest = await loadSearchManifest();
+    if (!manifest) return null;
+    const tokens = [...new Set(searchTokens(query))];
+    const terms = [...new Set(tokens.flatMap((token) => queryTerms(token, manifest.prefix_length)))];
+    try {
+      const docIds = await loadSearchFile(manifest.docs);
+      const indexed = new Set(docIds);
+      if (terms.length === 0) return { matches: indexed, indexed };
+
+      let matches = null;
+      for (const term of terms) {
+        const shard = manifest.shards[shardKey(term)];
+        const gaps = shard ? (await loadSearchFile(shard.url))[term] : undefined;
+        if (!gaps) return { matches: new Set(), indexed };
+        const numbers = decodePostings(gaps);
+        matches = matches ? new Set([...matches].filter((n) => numbers.has(n))) : numbers;
+        if (matches.size === 0) break;
+      }
+      // Prefix terms and a lone trigram are exact; longer tokens need checking
+      const longTokens = tokens.filter((token) => token.length > 3);
+      if (longTokens.length > 0 && matches.size > 0) {
+        matches = await verifyCandidates(manifest, matches, longTokens);
+      }
+      return { matches: new Set([...matches].map((n) => docIds[n])), indexed };
+    } catch (error) {
+      console.warn('DataManager: Search index lookup failed', error);
+      return null;
+    }
+  },
+
+  /**
+   * Fetches every pack in full, one request each, so the service worker
+   * caches the whole library for offline use, and evicts cached packs a
+   * rebuild has replaced. Called from main.jsx once the worker controls
+   * the page; afterwards range requests for single routes are answered
+   * from the cache.
+   * @returns {Promise<number>} Number of packs fetched (0 if none are built).
+   */
+  async prefetchAllPacks() {
+    const manifest = await loadPackManifest();
+    if (!manifest) return 0;
+    const responses = await Promise.all(manifest.packs.map((pack) => fetch(pack.url)));
+
+    if (typeof caches !== 'undefined') {
+      const current = new Set(manifest.packs.map((pack) => new URL(pack.url, location.origin).href));
+      const cache = await caches.open(PACK_CACHE);
+      for (const request of await cache.keys()) {
+        if (!current.has(request.url)) await cache.delete(request);
+      }
+    }
+    return responses.filter((response) => response.ok).length;
   }
 };
@@ -28,7 +28,22 @@ export default defineConfig({
         ]
       },
       workbox: {
-        globPatterns: ['**/*.{js,css,html,ico,png,svg,json}']
+        globPatterns: ['**/*.{js,css,html,ico,png,svg,json}'],
+        runtimeCaching: [
+          {
+            // Synthesis packs (scripts/data_ingestion/build_bundles.py): cached
+            // whole by DataManager.prefetchAllPacks, then single routes are
+            // sliced out of the cached copy with byte-range requests. Pack
+            // names include a content hash, so cache-first is safe.
+            urlPattern: ({ url }) => url.pathname.startsWith('/data/packs/') && url.pathname.endsWith('.pack'),
+            handler: 'CacheFirst',
+            options: {
+              cacheName: 'synthesis-packs',
+              cacheableResponse: { statuses: [200] },
+              rangeRequests: true
+            }
+          }
+        ]
       }
     })
   ],